@@ -0,0 +1,223 @@
+"""
+Bulk user creation benchmark for the users function, against moto
+
+Creates users in a moto Cognito User Pool through `lambda_handler`, once as
+one single-user POST per user and once per worker count as bulk POSTs, and
+reports wall time and users per second for each. moto answers in-process in
+well under a millisecond, so a per-call Cognito latency and a per-request API
+Gateway round trip are added to make the comparison meaningful; a share of
+Cognito calls can be throttled to exercise the retries.
+
+Usage:
+    pip install "moto[cognitoidp]"
+    python benchmarks/bulk_users.py
+    python benchmarks/bulk_users.py --users 500 --workers 1 4 16 --call-latency 40 --output bulk_users.json
+    python benchmarks/bulk_users.py --throttle-rate 0.05
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+try:
+    from moto import mock_aws
+except ImportError:
+    try:
+        # moto before 5.0 has one decorator per service
+        from moto import mock_cognitoidp as mock_aws
+    except ImportError:
+        mock_aws = None
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+REGION = 'us-east-1'
+PASSWORD = 'Password123'
+# Same policy as the User Pool in template.yaml
+POOL_PASSWORD_POLICY = {
+    'MinimumLength': 8,
+    'RequireLowercase': True,
+    'RequireNumbers': True,
+    'RequireSymbols': False,
+    'RequireUppercase': True
+}
+
+
+class CognitoConditions:
+    """
+    Adds latency and throttling to every Cognito call of a boto3 client
+
+    moto serves calls in-process, so without this the benchmark would only
+    measure Python overhead. Throttled calls fail with TooManyRequestsException
+    before reaching moto, like a real throttle.
+    """
+
+    def __init__(self, latency_ms, throttle_rate, seed=0):
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self.throttles = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def attach(self, client):
+        client.meta.events.register('before-call.cognito-idp.*', self._before_call)
+
+    def _before_call(self, **kwargs):
+        from botocore.exceptions import ClientError
+        with self._lock:
+            self.calls += 1
+            throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self.throttles += 1
+        time.sleep(self.latency_ms / 1000.0)
+        if throttled:
+            raise ClientError(
+                {'Error': {'Code': 'TooManyRequestsException', 'Message': 'Too many requests'}},
+                kwargs.get('model').name if kwargs.get('model') else 'Unknown'
+            )
+
+
+def _users(count, run_id):
+    return [{'email': f'user{index}-{run_id}@example.com', 'password': PASSWORD, 'name': f'User {index}'}
+            for index in range(count)]
+
+
+def _post(app, body):
+    return app.lambda_handler({'httpMethod': 'POST', 'path': '/users', 'body': json.dumps(body)}, None)
+
+
+def run_sequential(app, users, request_overhead_ms):
+    """Create users with one single-user POST each, as clients do without the bulk endpoint"""
+    created = 0
+    start = time.perf_counter()
+    for user in users:
+        time.sleep(request_overhead_ms / 1000.0)
+        if _post(app, user)['statusCode'] == 201:
+            created += 1
+    return created, time.perf_counter() - start, len(users)
+
+
+def run_bulk(app, users, batch_size, request_overhead_ms):
+    """Create users with bulk POSTs of at most `batch_size` users"""
+    created = 0
+    requests = 0
+    start = time.perf_counter()
+    for offset in range(0, len(users), batch_size):
+        time.sleep(request_overhead_ms / 1000.0)
+        requests += 1
+        body = json.loads(_post(app, users[offset:offset + batch_size])['body'])
+        created += body['succeeded']
+    return created, time.perf_counter() - start, requests
+
+
+def _report(mode, workers, users, created, seconds, requests, conditions, calls_before, throttles_before):
+    return {
+        "mode": mode,
+        "workers": workers,
+        "users": users,
+        "created": created,
+        "failed": users - created,
+        "api_requests": requests,
+        "cognito_calls": conditions.calls - calls_before,
+        "throttled_calls": conditions.throttles - throttles_before,
+        "seconds": round(seconds, 3),
+        "users_per_second": round(users / seconds, 1) if seconds else None
+    }
+
+
+def run(users=200, workers=(1, 4, 8, 16), call_latency_ms=30.0, request_overhead_ms=30.0, throttle_rate=0.0,
+        batch_size=None, seed=0):
+    """
+    Run the benchmark
+
+    Returns:
+        dict: The settings and one result per mode and worker count
+    """
+    import boto3
+
+    env = {
+        'USER_POOL_ID': '',
+        'AWS_DEFAULT_REGION': REGION,
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'USER_CACHE_BACKEND': 'memory',
+        'CREATE_RETRY_BASE_SECONDS': '0.05'
+    }
+    with mock_aws(), patch.dict(os.environ, env):
+        client = boto3.client('cognito-idp', region_name=REGION)
+        pool_id = client.create_user_pool(
+            PoolName='benchmark',
+            UsernameAttributes=['email'],
+            Policies={'PasswordPolicy': POOL_PASSWORD_POLICY}
+        )['UserPool']['Id']
+        os.environ['USER_POOL_ID'] = pool_id
+
+        sys.path[:0] = [ROOT, os.path.join(ROOT, 'shared')]
+        from users import app
+
+        conditions = CognitoConditions(call_latency_ms, throttle_rate, seed)
+        conditions.attach(client)
+        batch_size = batch_size or app.BULK_MAX_USERS
+        run_ids = (uuid.uuid4().hex[:8] for _ in itertools.count())
+        results = []
+
+        with patch.object(app, 'cognito', client):
+            calls, throttles = conditions.calls, conditions.throttles
+            created, seconds, requests = run_sequential(app, _users(users, next(run_ids)), request_overhead_ms)
+            results.append(_report('single', 1, users, created, seconds, requests, conditions, calls, throttles))
+
+            for count in workers:
+                calls, throttles = conditions.calls, conditions.throttles
+                with patch.object(app, 'CREATE_WORKERS', count):
+                    created, seconds, requests = run_bulk(app, _users(users, next(run_ids)), batch_size,
+                                                          request_overhead_ms)
+                results.append(_report('bulk', count, users, created, seconds, requests, conditions, calls,
+                                       throttles))
+
+    return {
+        "python": sys.version.split()[0],
+        "users": users,
+        "call_latency_ms": call_latency_ms,
+        "request_overhead_ms": request_overhead_ms,
+        "throttle_rate": throttle_rate,
+        "batch_size": batch_size,
+        "results": results
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bulk user creation against moto")
+    parser.add_argument('--users', type=int, default=200, help="users created per mode (default: 200)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16],
+                        help="CREATE_WORKERS values to run the bulk mode with (default: 1 4 8 16)")
+    parser.add_argument('--call-latency', type=float, default=30.0,
+                        help="milliseconds added to every Cognito call (default: 30)")
+    parser.add_argument('--request-overhead', type=float, default=30.0,
+                        help="milliseconds added to every API request for the API Gateway round trip (default: 30)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help="share of Cognito calls that are throttled (default: 0)")
+    parser.add_argument('--batch-size', type=int, help="users per bulk POST (default: BULK_MAX_USERS)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the throttled calls (default: 0)")
+    parser.add_argument('--output', help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    if mock_aws is None:
+        print('moto is not installed: pip install "moto[cognitoidp]"', file=sys.stderr)
+        return 2
+
+    report = run(args.users, args.workers, args.call_latency, args.request_overhead, args.throttle_rate,
+                 args.batch_size, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Cold-start benchmark for the website_to_text function
+
+Every run starts a fresh interpreter, loads app.py the way the Lambda runtime
+does (as a top-level module from the function directory) and reports:
+
+- the module import breakdown from `python -X importtime`
+- the time from interpreter start to the first handled event
+
+Usage:
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --runs 10 --prewarm --output cold_start.json
+    python benchmarks/cold_start.py --event event.json --max-first-event-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTION_DIR = os.path.join(ROOT, 'website_to_text')
+# Where Lambda mounts the shared layer, /opt/python, is this directory locally
+LAYER_DIR = os.path.join(ROOT, 'shared')
+
+# A request that fails validation touches neither the network nor AWS
+DEFAULT_EVENT = {"body": "{}"}
+
+# Runs inside the child interpreter; prints one JSON line with its timings
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.{handler}(json.loads(sys.argv[1]), None)
+if app.{handler}.__name__ == 'stream_handler':
+    response = list(response)
+handled = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "handler_ms": (handled - imported) * 1000,
+    "status": response.get("statusCode") if isinstance(response, dict) else None
+}}))
+"""
+
+
+def _child_env(prewarm):
+    env = dict(os.environ)
+    env['PREWARM_ON_INIT'] = 'true' if prewarm else 'false'
+    env['METRICS_ENABLED'] = 'false'
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [LAYER_DIR, env.get('PYTHONPATH')]))
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    return env
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output
+
+    Args:
+        stderr (str): The interpreter's stderr
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) tuples in import order
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        depth = (len(parts[2]) - len(parts[2].lstrip()) - 1) // 2
+        modules.append((parts[2].strip(), int(parts[0]), int(parts[1]), depth))
+    return modules
+
+
+def measure_imports(prewarm, top):
+    """
+    Measure the import of app.py with `-X importtime`
+
+    Args:
+        prewarm (bool): Run with PREWARM_ON_INIT enabled
+        top (int): Number of heaviest direct imports to report
+
+    Returns:
+        dict: Total import time of app.py and its heaviest direct imports, in milliseconds
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=FUNCTION_DIR, env=_child_env(prewarm), capture_output=True, text=True, check=True
+    )
+    # importtime lists children before their parent, so app's direct imports are the
+    # depth 1 entries between the previous top-level import and app itself
+    app_us, children, direct = 0, [], []
+    for module in parse_importtime(result.stderr):
+        if module[3] == 1:
+            children.append(module)
+        elif module[3] == 0:
+            if module[0] == 'app':
+                app_us, direct = module[2], children
+            children = []
+    direct = sorted(direct, key=lambda m: m[2], reverse=True)
+    return {
+        "app_import_ms": round(app_us / 1000, 1),
+        "heaviest_imports_ms": {name: round(cumulative / 1000, 1) for name, _, cumulative, _ in direct[:top]}
+    }
+
+
+def measure_first_event(event, handler, prewarm):
+    """
+    Time one cold start up to the end of the first handled event
+
+    Args:
+        event (dict): The event passed to the handler
+        handler (str): 'lambda_handler' or 'stream_handler'
+        prewarm (bool): Run with PREWARM_ON_INIT enabled
+
+    Returns:
+        dict: Interpreter start, import and handler times in milliseconds
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT.format(handler=handler), json.dumps(event)],
+        cwd=FUNCTION_DIR, env=_child_env(prewarm), capture_output=True, text=True, check=True
+    )
+    total_ms = (time.perf_counter() - started) * 1000
+    child = json.loads(result.stdout.strip().splitlines()[-1])
+    child["first_event_ms"] = total_ms
+    child["interpreter_ms"] = total_ms - child["import_ms"] - child["handler_ms"]
+    return child
+
+
+def _summarize(samples, key):
+    values = [sample[key] for sample in samples]
+    return {
+        "median": round(statistics.median(values), 1),
+        "min": round(min(values), 1),
+        "max": round(max(values), 1)
+    }
+
+
+def run(runs=5, event=None, handler='lambda_handler', prewarm=False, top=10):
+    """
+    Run the benchmark
+
+    Args:
+        runs (int): Number of fresh interpreters to start
+        event (dict, optional): Event for the first invocation, DEFAULT_EVENT if omitted
+        handler (str): Handler to invoke
+        prewarm (bool): Run with PREWARM_ON_INIT enabled
+        top (int): Number of heaviest direct imports to report
+
+    Returns:
+        dict: The benchmark report
+    """
+    event = event or DEFAULT_EVENT
+    samples = [measure_first_event(event, handler, prewarm) for _ in range(runs)]
+    return {
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "handler": handler,
+        "prewarm": prewarm,
+        "imports": measure_imports(prewarm, top),
+        "first_event_ms": _summarize(samples, "first_event_ms"),
+        "import_ms": _summarize(samples, "import_ms"),
+        "handler_ms": _summarize(samples, "handler_ms"),
+        "interpreter_ms": _summarize(samples, "interpreter_ms"),
+        "status": samples[-1]["status"]
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure website_to_text cold-start time")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters to start (default: 5)")
+    parser.add_argument('--event', help="JSON file with the event for the first invocation")
+    parser.add_argument('--handler', default='lambda_handler', choices=['lambda_handler', 'stream_handler'])
+    parser.add_argument('--prewarm', action='store_true', help="enable PREWARM_ON_INIT in the child")
+    parser.add_argument('--top', type=int, default=10, help="heaviest direct imports to list (default: 10)")
+    parser.add_argument('--output', help="also write the report to this JSON file")
+    parser.add_argument('--max-first-event-ms', type=float,
+                        help="exit with status 1 if the median time to the first event is above this")
+    args = parser.parse_args(argv)
+
+    event = None
+    if args.event:
+        with open(args.event) as f:
+            event = json.load(f)
+
+    report = run(args.runs, event, args.handler, args.prewarm, args.top)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_first_event_ms is not None and report["first_event_ms"]["median"] > args.max_first_event_ms:
+        print(f"Median time to first event {report['first_event_ms']['median']} ms is above "
+              f"{args.max_first_event_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,410 @@
+"""
+Offline replay benchmark for the website_to_text pipeline
+
+Replays recorded HTML pages through `lambda_handler` without touching the
+network or AWS: pages are served by a local HTTP stand-in and Bedrock is
+replaced by a stub client that answers after a sampled latency. Each
+configuration (concurrency level x Bedrock latency distribution) reports:
+
+- request latency percentiles and throughput
+- mean time per pipeline stage, from the handler's own `timings`
+- peak traced Python memory and the process's peak RSS
+
+Usage:
+    python benchmarks/replay.py
+    python benchmarks/replay.py --concurrency 1 8 32 --bedrock-latency lognormal:800:0.5 --output replay.json
+    python benchmarks/replay.py --compare replay.json --max-regression 0.2
+    python benchmarks/replay.py --record https://example.com/a https://example.com/b
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then left out of the report
+    resource = None
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTION_DIR = os.path.join(ROOT, 'website_to_text')
+LAYER_DIR = os.path.join(ROOT, 'shared')
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+USER_AGENT = 'Mozilla/5.0 (compatible; website-to-text/1.0)'
+
+
+class LatencyDistribution:
+    """
+    Latency samples in milliseconds, parsed from a spec string
+
+    - `constant:MS`
+    - `uniform:LOW_MS:HIGH_MS`
+    - `lognormal:MEDIAN_MS:SIGMA`, with a long right tail like real services
+    """
+
+    def __init__(self, spec, seed=None):
+        self.spec = spec
+        kind, *params = spec.split(':')
+        try:
+            params = [float(param) for param in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        expected = {'constant': 1, 'uniform': 2, 'lognormal': 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        self.kind = kind
+        self.params = params
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Draw one latency in milliseconds"""
+        with self._lock:
+            if self.kind == 'constant':
+                return self.params[0]
+            if self.kind == 'uniform':
+                return self._random.uniform(*self.params)
+            return self._random.lognormvariate(math.log(self.params[0]), self.params[1])
+
+
+class _Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class StubBedrock:
+    """
+    Stand-in for the bedrock-runtime client
+
+    `invoke_model` sleeps for a sampled latency, then answers in the Nova or
+    Titan response format with token counts estimated from the request size.
+    """
+
+    def __init__(self, latency, summary_words=120):
+        self.latency = latency
+        self.summary = " ".join(["summary"] * summary_words)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency.sample() / 1000.0)
+        input_tokens = len(body) // 4
+        if "nova" in modelId.lower():
+            payload = {
+                "output": {"message": {"content": [{"text": self.summary}]}},
+                "usage": {"inputTokens": input_tokens, "outputTokens": len(self.summary) // 4}
+            }
+        else:
+            payload = {
+                "inputTextTokenCount": input_tokens,
+                "results": [{"outputText": self.summary, "tokenCount": len(self.summary) // 4}]
+            }
+        return {"body": _Body(json.dumps(payload).encode('utf-8'))}
+
+
+def load_corpus(directory):
+    """
+    Read the recorded pages of a corpus
+
+    Args:
+        directory (str): Directory of .html files
+
+    Returns:
+        dict: URL path to page bytes, e.g. '/release-notes.html'
+    """
+    pages = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.html'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                pages['/' + name] = f.read()
+    if not pages:
+        raise ValueError(f"No .html fixtures found in {directory}")
+    return pages
+
+
+def start_site(pages, latency):
+    """
+    Serve a corpus from a local HTTP server on a free port
+
+    Args:
+        pages (dict): URL path to page bytes
+        latency (LatencyDistribution): Delay before each response
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() when done
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency.sample() / 1000.0)
+            page = pages.get(self.path.split('?')[0])
+            if page is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_app(warm_caches):
+    """
+    Import app.py the way the Lambda runtime does, configured for replay
+
+    Unless `warm_caches` is set, the content, summary and near-duplicate
+    caches are disabled so every request runs the whole pipeline.
+    """
+    os.environ['METRICS_ENABLED'] = 'false'
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    if not warm_caches:
+        os.environ['CONTENT_CACHE_BACKEND'] = 'none'
+        os.environ['SUMMARY_CACHE_BACKEND'] = 'none'
+        os.environ['DEDUP_ENABLED'] = 'false'
+    for path in (LAYER_DIR, FUNCTION_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import app
+    return app
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _latency_summary(values):
+    return {
+        "p50": round(percentile(values, 0.50), 1),
+        "p95": round(percentile(values, 0.95), 1),
+        "p99": round(percentile(values, 0.99), 1),
+        "mean": round(statistics.mean(values), 1),
+        "max": round(max(values), 1)
+    }
+
+
+def run_config(app, base_url, paths, concurrency, latency, requests, model=None, trace_memory=True):
+    """
+    Replay the corpus through lambda_handler at one concurrency level
+
+    Args:
+        app (module): The loaded app module
+        base_url (str): Root URL of the local site
+        paths (list): Page paths to request, used round robin
+        concurrency (int): Requests in flight at once
+        latency (LatencyDistribution): Bedrock latency
+        requests (int): Requests to send
+        model (str, optional): Model to request; routed when omitted
+        trace_memory (bool, optional): Measure peak Python memory with tracemalloc, which slows requests down
+
+    Returns:
+        dict: The configuration's report
+    """
+    stub = StubBedrock(latency)
+    app.bedrock_limiter.reset()
+
+    def one(index):
+        body = {"url": f"{base_url}{paths[index % len(paths)]}", "timings": True}
+        if model:
+            body["model"] = model
+        started = time.perf_counter()
+        response = app.lambda_handler({"body": json.dumps(body)}, None)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, response["statusCode"], json.loads(response["body"]).get("timings", {})
+
+    with patch.object(app.client_cache, 'get', return_value=stub):
+        # One unmeasured request per page loads the extraction libraries and opens connections
+        for index in range(len(paths)):
+            one(index)
+        stub.calls = 0
+
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - started
+        if trace_memory:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    latencies = [elapsed for elapsed, _, _ in results]
+    stages = {}
+    for _, _, timings in results:
+        for stage, ms in timings.get("stages_ms", {}).items():
+            stages.setdefault(stage, []).append(ms)
+
+    report = {
+        "concurrency": concurrency,
+        "bedrock_latency": latency.spec,
+        "requests": requests,
+        "errors": sum(1 for _, status, _ in results if status != 200),
+        "bedrock_calls": stub.calls,
+        "throughput_rps": round(requests / wall, 2),
+        "latency_ms": _latency_summary(latencies),
+        "stages_ms": {stage: round(statistics.mean(values), 1) for stage, values in sorted(stages.items())}
+    }
+    if trace_memory:
+        report["peak_traced_mb"] = round(traced_peak / (1024 * 1024), 1)
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux; it only grows over the process lifetime
+        report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(corpus=FIXTURES_DIR, concurrency=(1, 4, 16), bedrock_latency=('lognormal:300:0.4',),
+        fetch_latency='constant:20', requests=40, warm_caches=False, model=None, seed=0, trace_memory=True):
+    """
+    Run every configuration of the benchmark
+
+    Returns:
+        dict: The benchmark report
+    """
+    pages = load_corpus(corpus)
+    app = load_app(warm_caches)
+    server = start_site(pages, LatencyDistribution(fetch_latency, seed))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        configs = [
+            run_config(app, base_url, list(pages), level, LatencyDistribution(spec, seed), requests, model,
+                       trace_memory)
+            for spec in bedrock_latency for level in concurrency
+        ]
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "corpus": {"pages": len(pages), "bytes": sum(len(page) for page in pages.values())},
+        "fetch_latency": fetch_latency,
+        "warm_caches": warm_caches,
+        "configs": configs
+    }
+
+
+def compare(report, baseline, max_regression=None):
+    """
+    Compare a report with a baseline report, configuration by configuration
+
+    Args:
+        report (dict): The new report
+        baseline (dict): A report from an earlier run
+        max_regression (float, optional): Largest allowed relative p95 increase, e.g. 0.2
+
+    Returns:
+        tuple: Lines describing the differences, and whether any p95 regressed past `max_regression`
+    """
+    previous = {(config["concurrency"], config["bedrock_latency"]): config for config in baseline["configs"]}
+    lines = []
+    regressed = False
+    for config in report["configs"]:
+        old = previous.get((config["concurrency"], config["bedrock_latency"]))
+        if old is None:
+            continue
+        changes = []
+        for name in ("p50", "p95", "p99"):
+            before, after = old["latency_ms"][name], config["latency_ms"][name]
+            change = (after - before) / before if before else 0.0
+            changes.append(f"{name} {before} -> {after} ms ({change:+.1%})")
+            if name == "p95" and max_regression is not None and change > max_regression:
+                regressed = True
+        lines.append(f"concurrency {config['concurrency']}, bedrock {config['bedrock_latency']}: "
+                     + ", ".join(changes))
+    return lines, regressed
+
+
+def record(urls, directory):
+    """Download pages into a corpus directory, named after their URL paths"""
+    import requests
+    os.makedirs(directory, exist_ok=True)
+    for url in urls:
+        response = requests.get(url, timeout=30, headers={'User-Agent': USER_AGENT})
+        response.raise_for_status()
+        name = url.split('://', 1)[-1].strip('/').replace('/', '_') or 'index'
+        path = os.path.join(directory, f"{name}.html")
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        print(f"Recorded {url} -> {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded pages through website_to_text offline")
+    parser.add_argument('--corpus', default=FIXTURES_DIR, help="directory of .html fixtures")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help="concurrency levels to run (default: 1 4 16)")
+    parser.add_argument('--bedrock-latency', nargs='+', default=['lognormal:300:0.4'],
+                        help="Bedrock latency distributions, e.g. constant:500 uniform:200:900 lognormal:300:0.4")
+    parser.add_argument('--fetch-latency', default='constant:20', help="page server latency distribution")
+    parser.add_argument('--requests', type=int, default=40, help="requests per configuration (default: 40)")
+    parser.add_argument('--model', help="model to request; routed by default")
+    parser.add_argument('--warm-caches', action='store_true', help="keep the content and summary caches enabled")
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help="skip tracemalloc, which adds overhead to every allocation")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the latency samples")
+    parser.add_argument('--output', help="also write the report to this JSON file")
+    parser.add_argument('--compare', help="baseline report to compare against")
+    parser.add_argument('--max-regression', type=float,
+                        help="with --compare, exit with status 1 if any p95 grew by more than this fraction")
+    parser.add_argument('--record', nargs='+', metavar='URL', help="download pages into --corpus and exit")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(args.record, args.corpus)
+        return 0
+
+    report = run(args.corpus, args.concurrency, args.bedrock_latency, args.fetch_latency, args.requests,
+                 args.warm_caches, args.model, args.seed, not args.no_trace_memory)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            lines, regressed = compare(report, json.load(f), args.max_regression)
+        for line in lines:
+            print(line, file=sys.stderr)
+        if regressed:
+            print(f"p95 latency regressed by more than {args.max_regression:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
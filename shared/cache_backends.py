@@ -0,0 +1,188 @@
+"""
+Cache storage backends shared by the website_to_text and users functions
+
+Deployed as the SharedLayer Lambda layer, so both functions import it as the
+top-level module `cache_backends`. Each function's cache.py builds its own
+cache on top of these stores.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """
+    In-process LRU store bounded by the serialized size of its entries
+
+    Values must be JSON-serializable. The least recently used entries are
+    evicted once the total size exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value):
+        size = len(json.dumps(value).encode('utf-8'))
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return False
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            item = self._entries.pop(key, None)
+            if item is not None:
+                self.size -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBackend:
+    """
+    Local-disk store, one JSON file per entry, bounded by total file size
+
+    On Lambda's /tmp, entries survive across warm invocations without being
+    held in memory. Every process on the host that points at the same
+    directory sees the same entries, so local runs and tests can also use it
+    as a stand-in for a cache shared between instances. Reads refresh a file's
+    modification time, and the oldest files are evicted first when
+    `max_bytes` is exceeded.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        data = json.dumps(value).encode('utf-8')
+        if len(data) > self.max_bytes:
+            self.delete(key)
+            return False
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict()
+        return True
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+            self.evictions = 0
+
+    def _files(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict(self):
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self._files())
+
+    def __len__(self):
+        return len(self._files())
+
+
+def create_backend(kind, max_bytes, directory):
+    """
+    Create a cache backend from configuration
+
+    Args:
+        kind (str): 'memory', 'disk' or 'none'
+        max_bytes (int): Eviction bound for the backend
+        directory (str): Directory used by the disk backend
+
+    Returns:
+        object: The backend, or None when caching is disabled
+
+    Raises:
+        ValueError: If the backend kind is unknown
+    """
+    kind = (kind or 'none').lower()
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return MemoryBackend(max_bytes)
+    if kind == 'disk':
+        return DiskBackend(directory, max_bytes)
+    raise ValueError(f"Unknown cache backend: {kind}")
@@ -2,6 +2,7 @@ import json
 import pytest
 import sys
 import os
+import time
 from unittest.mock import patch, MagicMock
 from botocore.exceptions import ClientError
 
@@ -11,6 +12,13 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # Mock boto3 client before importing app
 with patch('boto3.client') as mock_boto:
     from users import app
+    from users import cache
+
+@pytest.fixture(autouse=True)
+def reset_user_cache():
+    # The user cache survives between tests just like between warm invocations
+    app.user_cache.clear()
+    yield
 
 @pytest.fixture
 def mock_cognito():
@@ -286,4 +294,420 @@ def test_create_user_already_exists(mock_cognito):
         
         # Assert the error message
         assert 'error' in body
-        assert 'already exists' in body['error']
\ No newline at end of file
+        assert 'already exists' in body['error']
+
+def _cognito_user(username):
+    return {
+        'Username': username,
+        'Enabled': True,
+        'UserStatus': 'CONFIRMED',
+        'Attributes': [{'Name': 'email', 'Value': username}]
+    }
+
+def test_list_users_paginates_with_cursor(mock_cognito):
+    mock_cognito.list_users.side_effect = [
+        {'Users': [_cognito_user('user1@example.com')], 'PaginationToken': 'token-2'},
+        {'Users': [_cognito_user('user2@example.com')]}
+    ]
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        event = {
+            'httpMethod': 'GET',
+            'path': '/users',
+            'pathParameters': None,
+            'queryStringParameters': {'limit': '1'}
+        }
+        first = json.loads(app.lambda_handler(event, None)['body'])
+        
+        event['queryStringParameters'] = {'limit': '1', 'cursor': first['next_cursor']}
+        second = json.loads(app.lambda_handler(event, None)['body'])
+    
+    assert first['users'][0]['username'] == 'user1@example.com'
+    assert first['next_cursor'] and 'token-2' not in first['next_cursor']
+    assert second['users'][0]['username'] == 'user2@example.com'
+    assert second['next_cursor'] is None
+    mock_cognito.list_users.assert_called_with(UserPoolId='test-pool-id', Limit=1, PaginationToken='token-2')
+
+def test_list_users_rejects_invalid_limit_and_cursor(mock_cognito):
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        for query in ({'limit': '61'}, {'limit': 'ten'}, {'cursor': 'not-a-cursor'}):
+            event = {
+                'httpMethod': 'GET',
+                'path': '/users',
+                'pathParameters': None,
+                'queryStringParameters': query
+            }
+            response = app.lambda_handler(event, None)
+            
+            assert response['statusCode'] == 400
+    
+    mock_cognito.list_users.assert_not_called()
+
+def test_scan_users_streams_every_page(mock_cognito):
+    mock_cognito.list_users.side_effect = [
+        {'Users': [_cognito_user('user1@example.com'), _cognito_user('user2@example.com')], 'PaginationToken': 'token-2'},
+        {'Users': [_cognito_user('user3@example.com')]}
+    ]
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        event = {
+            'httpMethod': 'GET',
+            'path': '/users',
+            'pathParameters': None,
+            'queryStringParameters': {'all': 'true'}
+        }
+        response = app.lambda_handler(event, None)
+    
+    records = [json.loads(line) for line in response['body'].splitlines()]
+    assert response['headers']['Content-Type'] == 'application/x-ndjson'
+    assert [record['user']['username'] for record in records[:-1]] == [
+        'user1@example.com', 'user2@example.com', 'user3@example.com'
+    ]
+    assert records[-1] == {'done': True, 'count': 3}
+    assert mock_cognito.list_users.call_count == 2
+
+def test_scan_users_ends_with_cursor_at_size_cap(mock_cognito):
+    pages = {
+        None: {'Users': [_cognito_user('user1@example.com'), _cognito_user('user2@example.com')],
+               'PaginationToken': 'token-2'},
+        'token-2': {'Users': [_cognito_user('user3@example.com')], 'PaginationToken': 'token-3'},
+        'token-3': {'Users': [_cognito_user('user4@example.com')]}
+    }
+    mock_cognito.list_users.side_effect = lambda **params: pages[params.get('PaginationToken')]
+    
+    def scan(query):
+        event = {
+            'httpMethod': 'GET',
+            'path': '/users',
+            'pathParameters': None,
+            'queryStringParameters': query
+        }
+        return [json.loads(line) for line in app.lambda_handler(event, None)['body'].splitlines()]
+    
+    # Room for one page per response; a first page over the cap is still returned whole
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}), patch.object(app, 'SCAN_MAX_BYTES', 200):
+        first = scan({'all': 'true'})
+        second = scan({'all': 'true', 'cursor': first[-1]['next_cursor']})
+        third = scan({'all': 'true', 'cursor': second[-1]['next_cursor']})
+    
+    assert [record['user']['username'] for record in first[:-1]] == ['user1@example.com', 'user2@example.com']
+    assert first[-1]['done'] is False and first[-1]['count'] == 2
+    assert [record['user']['username'] for record in second[:-1]] == ['user3@example.com']
+    assert [record['user']['username'] for record in third[:-1]] == ['user4@example.com']
+    assert third[-1] == {'done': True, 'count': 1}
+
+def test_list_users_filters_and_projects_in_cognito(mock_cognito):
+    user = _cognito_user('user1@example.com')
+    user['Attributes'].append({'Name': 'name', 'Value': 'Test User 1'})
+    mock_cognito.list_users.return_value = {'Users': [user]}
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        event = {
+            'httpMethod': 'GET',
+            'path': '/users',
+            'pathParameters': None,
+            'queryStringParameters': {'email_prefix': 'user1', 'fields': 'username,email'}
+        }
+        response = app.lambda_handler(event, None)
+    
+    body = json.loads(response['body'])
+    assert body['users'] == [{'username': 'user1@example.com', 'attributes': {'email': 'user1@example.com'}}]
+    mock_cognito.list_users.assert_called_once_with(
+        UserPoolId='test-pool-id',
+        Limit=60,
+        Filter='email ^= "user1"',
+        AttributesToGet=['email']
+    )
+
+def test_list_users_rejects_invalid_filters(mock_cognito):
+    assert app.build_filter({'status': 'CONFIRMED'}) == 'cognito:user_status = "CONFIRMED"'
+    assert app.build_filter({'enabled': 'false'}) == 'status = "Disabled"'
+    assert app.build_filter({'name': 'Say "hi"'}) == 'name = "Say \\"hi\\""'
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        for query in ({'email': 'a@example.com', 'status': 'CONFIRMED'}, {'enabled': 'yes'},
+                      {'fields': 'email,bad field'}, {'fields': ','}):
+            event = {
+                'httpMethod': 'GET',
+                'path': '/users',
+                'pathParameters': None,
+                'queryStringParameters': query
+            }
+            response = app.lambda_handler(event, None)
+            
+            assert response['statusCode'] == 400
+    
+    mock_cognito.list_users.assert_not_called()
+
+def _get_user_event(username):
+    return {
+        'httpMethod': 'GET',
+        'path': f'/users/{username}',
+        'pathParameters': {'username': username}
+    }
+
+def test_get_user_served_from_cache(mock_cognito):
+    mock_cognito.admin_get_user.return_value = {
+        'Username': 'user1@example.com',
+        'Enabled': True,
+        'UserStatus': 'CONFIRMED',
+        'UserAttributes': [{'Name': 'email', 'Value': 'user1@example.com'}]
+    }
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        first = app.lambda_handler(_get_user_event('user1@example.com'), None)
+        second = app.lambda_handler(_get_user_event('user1@example.com'), None)
+    
+    assert first['headers']['X-Cache'] == 'MISS'
+    assert second['headers']['X-Cache'] == 'HIT'
+    assert json.loads(second['body']) == json.loads(first['body'])
+    mock_cognito.admin_get_user.assert_called_once()
+    assert app.user_cache.stats()['hit_rate'] == 0.5
+
+def test_lambda_handler_emits_user_cache_metrics(mock_cognito, capsys):
+    mock_cognito.admin_get_user.return_value = {
+        'Username': 'user1@example.com',
+        'Enabled': True,
+        'UserStatus': 'CONFIRMED',
+        'UserAttributes': [{'Name': 'email', 'Value': 'user1@example.com'}]
+    }
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}), patch.object(app, 'METRICS_ENABLED', True):
+        app.lambda_handler(_get_user_event('user1@example.com'), None)
+        app.lambda_handler(_get_user_event('user1@example.com'), None)
+    
+    lines = [line for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+    assert len(lines) == 2
+    record = json.loads(lines[-1])
+    directive = record['_aws']['CloudWatchMetrics'][0]
+    units = {metric['Name']: metric['Unit'] for metric in directive['Metrics']}
+    assert directive['Namespace'] == app.METRICS_NAMESPACE
+    assert record['Function'] == 'users'
+    assert record['user_cache_hits'] == 1
+    assert record['user_cache_hit_rate'] == 0.5
+    assert units['user_cache_hit_rate'] == 'None'
+    assert units['user_cache_bytes'] == 'Bytes'
+    assert units['user_cache_misses'] == 'Count'
+
+def test_get_user_not_found_cached_until_created(mock_cognito):
+    mock_cognito.admin_get_user.side_effect = ClientError(
+        error_response={'Error': {'Code': 'UserNotFoundException', 'Message': 'User does not exist'}},
+        operation_name='AdminGetUser'
+    )
+    mock_cognito.admin_create_user.return_value = {
+        'User': {'Username': 'new-sub', 'UserStatus': 'FORCE_CHANGE_PASSWORD', 'Attributes': []}
+    }
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        assert app.lambda_handler(_get_user_event('new@example.com'), None)['statusCode'] == 404
+        cached = app.lambda_handler(_get_user_event('new@example.com'), None)
+        assert cached['statusCode'] == 404
+        assert cached['headers']['X-Cache'] == 'HIT'
+        assert mock_cognito.admin_get_user.call_count == 1
+        
+        app.lambda_handler({
+            'httpMethod': 'POST',
+            'path': '/users',
+            'body': json.dumps({'email': 'new@example.com', 'password': 'Password123'})
+        }, None)
+        mock_cognito.admin_get_user.side_effect = None
+        mock_cognito.admin_get_user.return_value = {'Username': 'new-sub', 'UserAttributes': []}
+        response = app.lambda_handler(_get_user_event('new@example.com'), None)
+    
+    assert response['statusCode'] == 200
+    assert response['headers']['X-Cache'] == 'MISS'
+    assert app.user_cache.stats()['negative_hits'] == 1
+
+def test_create_user_drops_user_cached_before_password_was_set(mock_cognito):
+    mock_cognito.admin_create_user.return_value = {'User': {'Username': 'new-sub', 'UserStatus': 'FORCE_CHANGE_PASSWORD'}}
+    mock_cognito.admin_get_user.return_value = {'Username': 'new-sub', 'UserStatus': 'FORCE_CHANGE_PASSWORD',
+                                                'UserAttributes': []}
+    
+    def get_between_calls(**kwargs):
+        # Another request looks the user up after creation but before the password is set
+        assert app.lambda_handler(_get_user_event('new@example.com'), None)['statusCode'] == 200
+    
+    mock_cognito.admin_set_user_password.side_effect = get_between_calls
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        created = app.lambda_handler({
+            'httpMethod': 'POST',
+            'path': '/users',
+            'body': json.dumps({'email': 'new@example.com', 'password': 'Password123'})
+        }, None)
+        mock_cognito.admin_get_user.return_value = {'Username': 'new-sub', 'UserStatus': 'CONFIRMED',
+                                                    'UserAttributes': []}
+        response = app.lambda_handler(_get_user_event('new@example.com'), None)
+    
+    assert created['statusCode'] == 201
+    assert response['headers']['X-Cache'] == 'MISS'
+    assert json.loads(response['body'])['status'] == 'CONFIRMED'
+
+def test_user_cache_expires_and_evicts(tmp_path):
+    user_cache = cache.UserCache(cache.MemoryBackend(400), ttl=60, negative_ttl=0)
+    
+    user_cache.put('a', {'username': 'a', 'bio': 'x' * 60})
+    user_cache.put('b', {'username': 'b', 'bio': 'x' * 60})
+    user_cache.put('c', {'username': 'c', 'bio': 'x' * 60})
+    user_cache.put_not_found('d')
+    
+    assert user_cache.get('a') is None
+    assert user_cache.get('c')['user']['username'] == 'c'
+    assert user_cache.get('d') is None
+    assert user_cache.backend.evictions == 1
+    
+    with patch('time.time', return_value=time.time() + 61):
+        assert user_cache.get('c') is None
+    assert user_cache.stats()['expired'] == 1
+    
+    # Instances sharing a disk directory see each other's writes and invalidations
+    first = cache.UserCache(cache.create_backend('disk', 1024 * 1024, str(tmp_path)))
+    second = cache.UserCache(cache.create_backend('disk', 1024 * 1024, str(tmp_path)))
+    first.put('a', {'username': 'a'})
+    assert second.get('a')['user'] == {'username': 'a'}
+    second.invalidate('a')
+    assert first.get('a') is None
+
+def test_get_user_conditional_get_returns_304(mock_cognito):
+    mock_cognito.admin_get_user.return_value = {
+        'Username': 'user1@example.com',
+        'Enabled': True,
+        'UserStatus': 'CONFIRMED',
+        'UserLastModifiedDate': MagicMock(isoformat=lambda: '2023-01-03T00:00:00'),
+        'UserAttributes': [{'Name': 'email', 'Value': 'user1@example.com'}]
+    }
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        first = app.lambda_handler(_get_user_event('user1@example.com'), None)
+        etag = first['headers']['ETag']
+        
+        event = dict(_get_user_event('user1@example.com'), headers={'if-none-match': f'W/{etag}'})
+        cached = app.lambda_handler(event, None)
+        
+        app.user_cache.clear()
+        event['headers'] = {'If-None-Match': '"stale", ' + etag}
+        uncached = app.lambda_handler(event, None)
+        
+        # A changed attribute set changes the ETag
+        mock_cognito.admin_get_user.return_value['UserAttributes'].append({'Name': 'name', 'Value': 'Renamed'})
+        app.user_cache.clear()
+        changed = app.lambda_handler(event, None)
+    
+    assert etag.startswith('"') and etag.endswith('"')
+    assert (cached['statusCode'], cached['body'], cached['headers']['ETag']) == (304, '', etag)
+    assert uncached['statusCode'] == 304
+    assert changed['statusCode'] == 200
+    assert changed['headers']['ETag'] != etag
+
+def test_list_users_page_etag(mock_cognito):
+    mock_cognito.list_users.return_value = {'Users': [_cognito_user('user1@example.com')]}
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        event = {
+            'httpMethod': 'GET',
+            'path': '/users',
+            'pathParameters': None,
+            'queryStringParameters': None
+        }
+        first = app.lambda_handler(event, None)
+        event['headers'] = {'If-None-Match': first['headers']['ETag']}
+        second = app.lambda_handler(event, None)
+        
+        mock_cognito.list_users.return_value = {'Users': [_cognito_user('user2@example.com')]}
+        third = app.lambda_handler(event, None)
+    
+    assert first['statusCode'] == 200
+    assert second['statusCode'] == 304
+    assert second['body'] == ''
+    assert third['statusCode'] == 200
+
+def _throttled(operation):
+    return ClientError(
+        error_response={'Error': {'Code': 'TooManyRequestsException', 'Message': 'Too many requests'}},
+        operation_name=operation
+    )
+
+def test_bulk_create_users_reports_each_user(mock_cognito):
+    def admin_create_user(**kwargs):
+        if kwargs['Username'] == 'existing@example.com':
+            raise ClientError(
+                error_response={'Error': {'Code': 'UsernameExistsException', 'Message': 'User already exists'}},
+                operation_name='AdminCreateUser'
+            )
+        return {'User': {'Username': kwargs['Username'], 'UserStatus': 'FORCE_CHANGE_PASSWORD', 'Attributes': []}}
+    mock_cognito.admin_create_user.side_effect = admin_create_user
+    
+    users = [
+        {'email': 'new1@example.com', 'password': 'Password123'},
+        {'email': 'existing@example.com', 'password': 'Password123'},
+        {'email': 'nopassword@example.com'},
+        {'email': 'new2@example.com', 'password': 'Password123', 'name': 'New User'}
+    ]
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        response = app.lambda_handler({'httpMethod': 'POST', 'path': '/users', 'body': json.dumps(users)}, None)
+    
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert [(result['email'], result['statusCode']) for result in body['results']] == [
+        ('new1@example.com', 201),
+        ('existing@example.com', 409),
+        ('nopassword@example.com', 400),
+        ('new2@example.com', 201)
+    ]
+    assert (body['count'], body['succeeded'], body['failed']) == (4, 2, 2)
+    assert mock_cognito.admin_set_user_password.call_count == 2
+
+def test_bulk_create_users_retries_throttled_calls(mock_cognito):
+    mock_cognito.admin_create_user.side_effect = [
+        _throttled('AdminCreateUser'),
+        {'User': {'Username': 'new1@example.com', 'Attributes': []}}
+    ]
+    mock_cognito.admin_set_user_password.side_effect = [_throttled('AdminSetUserPassword'), {}]
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}), patch('users.app.time.sleep') as mock_sleep:
+        response = app.create_users([{'email': 'new1@example.com', 'password': 'Password123'}])
+    
+    assert json.loads(response['body'])['results'][0]['statusCode'] == 201
+    assert mock_sleep.call_count == 2
+    
+    # A call that stays throttled fails once the retries are used up
+    mock_cognito.admin_create_user.side_effect = _throttled('AdminCreateUser')
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}), patch('users.app.time.sleep'):
+        response = app.create_users([{'email': 'new2@example.com', 'password': 'Password123'}])
+    
+    assert json.loads(response['body'])['results'][0]['statusCode'] == 500
+    assert mock_cognito.admin_create_user.call_count == 2 + app.CREATE_MAX_RETRIES + 1
+
+def test_create_users_stops_retrying_at_the_deadline(mock_cognito):
+    mock_cognito.admin_create_user.side_effect = _throttled('AdminCreateUser')
+    context = MagicMock()
+    # One second is left once BULK_DEADLINE_MARGIN_SECONDS is kept back
+    context.get_remaining_time_in_millis.return_value = (app.BULK_DEADLINE_MARGIN_SECONDS + 1) * 1000
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}), patch('users.app.time.sleep') as mock_sleep, \
+            patch('users.app.random.random', return_value=1.0), patch.object(app, 'CREATE_RETRY_BASE_SECONDS', 0.4):
+        bulk = app.create_users([{'email': 'new1@example.com', 'password': 'Password123'}], context)
+        single = app.lambda_handler({
+            'httpMethod': 'POST',
+            'path': '/users',
+            'body': json.dumps({'email': 'new2@example.com', 'password': 'Password123'})
+        }, context)
+    
+    # The 0.4s and 0.8s waits fit in the second left, the 1.6s wait after them would not
+    assert json.loads(bulk['body'])['results'][0]['statusCode'] == 500
+    assert single['statusCode'] == 500
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [0.4, 0.8] * 2
+    assert mock_cognito.admin_create_user.call_count == 6
+
+def test_bulk_create_users_limits(mock_cognito):
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 500
+    
+    with patch.dict(os.environ, {'USER_POOL_ID': 'test-pool-id'}):
+        empty = app.create_users([])
+        too_many = app.create_users([{'email': 'a@example.com', 'password': 'Password123'}] * (app.BULK_MAX_USERS + 1))
+        late = app.create_users([{'email': 'a@example.com', 'password': 'Password123'}], context)
+    
+    assert empty['statusCode'] == 400
+    assert too_many['statusCode'] == 400
+    assert json.loads(late['body'])['results'][0]['statusCode'] == 503
+    mock_cognito.admin_create_user.assert_not_called()
@@ -1,17 +1,56 @@
+import gzip
 import json
 import pytest
 import sys
 import os
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 from botocore.exceptions import ClientError
 
 # Import the app module directly using the file path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from website_to_text import app
+from website_to_text import cache
+from website_to_text import chunking
+from website_to_text import crawler
+from website_to_text import deadline
+from website_to_text import fetcher
+from website_to_text import instrumentation
+from website_to_text import jobs
+from website_to_text import limiter
+from website_to_text import memory
+from website_to_text import payload
+from website_to_text import router
+from website_to_text import similarity
+from botocore.exceptions import ReadTimeoutError
+
+@pytest.fixture(autouse=True)
+def reset_warm_state():
+    # Module-level caches survive between tests just like between warm invocations
+    app.client_cache.clear()
+    app.profile_resolver.clear()
+    app.content_cache.clear()
+    app.summary_cache.clear()
+    app.similarity_index.clear()
+    app.job_queue.clear()
+    app.bedrock_limiter.reset()
+    yield
+
+def _page(html, etag=None, last_modified=None):
+    # Shape of a successful app.download_page result
+    return {
+        "not_modified": False,
+        "content": html.encode('utf-8'),
+        "etag": etag,
+        "last_modified": last_modified
+    }
 
 @pytest.fixture
 def mock_trafilatura():
-    with patch('trafilatura.fetch_url') as mock_fetch:
+    with patch('website_to_text.app.download_page') as mock_fetch:
         with patch('trafilatura.extract') as mock_extract:
             yield mock_fetch, mock_extract
 
@@ -26,7 +65,7 @@ def test_extract_content_success(mock_trafilatura):
     mock_fetch, mock_extract = mock_trafilatura
     
     # Mock successful content extraction
-    mock_fetch.return_value = "<html><body><h1>Test Content</h1><p>This is a test.</p></body></html>"
+    mock_fetch.return_value = _page("<html><body><h1>Test Content</h1><p>This is a test.</p></body></html>")
     mock_extract.return_value = "# Test Content\n\nThis is a test."
     
     # Call the function
@@ -34,7 +73,7 @@ def test_extract_content_success(mock_trafilatura):
     
     # Verify the result
     assert result == "# Test Content\n\nThis is a test."
-    mock_fetch.assert_called_once_with("https://example.com")
+    mock_fetch.assert_called_once_with("https://example.com", etag=None, last_modified=None, timeout=None)
     mock_extract.assert_called_once()
 
 def test_extract_content_invalid_url(mock_trafilatura):
@@ -59,14 +98,14 @@ def test_extract_content_fetch_failure(mock_trafilatura):
         app.extract_content("https://example.com")
     
     assert "Failed to download content" in str(excinfo.value)
-    mock_fetch.assert_called_once_with("https://example.com")
+    mock_fetch.assert_called_once_with("https://example.com", etag=None, last_modified=None, timeout=None)
     mock_extract.assert_not_called()
 
 def test_extract_content_extraction_failure(mock_trafilatura):
     mock_fetch, mock_extract = mock_trafilatura
     
     # Mock extraction failure
-    mock_fetch.return_value = "<html><body>Test</body></html>"
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
     mock_extract.return_value = None
     
     # Test with extraction failure
@@ -74,7 +113,7 @@ def test_extract_content_extraction_failure(mock_trafilatura):
         app.extract_content("https://example.com")
     
     assert "Failed to extract content" in str(excinfo.value)
-    mock_fetch.assert_called_once_with("https://example.com")
+    mock_fetch.assert_called_once_with("https://example.com", etag=None, last_modified=None, timeout=None)
     mock_extract.assert_called_once()
 
 def test_generate_summary_success(mock_bedrock_client):
@@ -118,7 +157,7 @@ def test_lambda_handler_success(mock_trafilatura, mock_bedrock_client):
     mock_fetch, mock_extract = mock_trafilatura
     
     # Mock successful content extraction
-    mock_fetch.return_value = "<html><body><h1>Test Content</h1><p>This is a test.</p></body></html>"
+    mock_fetch.return_value = _page("<html><body><h1>Test Content</h1><p>This is a test.</p></body></html>")
     mock_extract.return_value = "# Test Content\n\nThis is a test."
     
     # Mock successful Bedrock response
@@ -149,6 +188,7 @@ def test_lambda_handler_success(mock_trafilatura, mock_bedrock_client):
     assert body["extracted_content"] == "# Test Content\n\nThis is a test."
     assert body["summary"] == "This is a summary."
     assert body["model_used"] == "test-model"
+    assert body["cached"] is False
     assert "processing_time" in body
 
 def test_lambda_handler_missing_url():
@@ -191,4 +231,1897 @@ def test_lambda_handler_extraction_error(mock_trafilatura):
     assert response["statusCode"] == 400
     body = json.loads(response["body"])
     assert "error" in body
-    assert "Content extraction failed" in body["error"]
\ No newline at end of file
+    assert "Content extraction failed" in body["error"]
+
+def _nova_response(text):
+    mock_response = {
+        'body': MagicMock()
+    }
+    mock_response['body'].read.return_value = json.dumps({
+        "output": {"message": {"content": [{"text": text}]}}
+    })
+    return mock_response
+
+def test_generate_summary_reuses_client_and_profile(mock_bedrock_client):
+    mock_bedrock_client.list_inference_profiles.return_value = {
+        'inferenceProfiles': [
+            {'name': 'us-nova-pro', 'inferenceProfileArn': 'arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0'}
+        ]
+    }
+    mock_bedrock_client.invoke_model.side_effect = lambda **kwargs: _nova_response("Nova summary.")
+    
+    with patch.object(app.profile_resolver, 'configured_arn', ''):
+        first = app.generate_summary("Test content", "Summarize this", "amazon.nova-pro-v1:0")
+        second = app.generate_summary("Test content", "Summarize this", "amazon.nova-pro-v1:0")
+    
+    assert first == second == "Nova summary."
+    mock_bedrock_client.list_inference_profiles.assert_called_once()
+    call_kwargs = mock_bedrock_client.invoke_model.call_args[1]
+    assert call_kwargs['modelId'].endswith('inference-profile/us.amazon.nova-pro-v1:0')
+    
+    stats = app.profile_resolver.stats()
+    assert stats['profile_misses'] == 1
+    assert stats['profile_hits'] == 1
+    assert stats['profile_hit_rate'] == 0.5
+    assert stats['clients_reused'] >= 1
+
+def test_profile_resolver_negative_cache(mock_bedrock_client):
+    mock_bedrock_client.list_inference_profiles.return_value = {'inferenceProfiles': []}
+    mock_bedrock_client.create_inference_profile.side_effect = ClientError(
+        error_response={'Error': {'Code': 'AccessDeniedException', 'Message': 'Denied'}},
+        operation_name='CreateInferenceProfile'
+    )
+    
+    with patch.object(app.profile_resolver, 'configured_arn', ''):
+        for _ in range(2):
+            with pytest.raises(Exception) as excinfo:
+                app.generate_summary("Test content", "Summarize this", "amazon.nova-pro-v1:0")
+            assert "inference profile" in str(excinfo.value)
+    
+    # The failed lookup is remembered, so the management API is only hit once
+    mock_bedrock_client.list_inference_profiles.assert_called_once()
+    mock_bedrock_client.invoke_model.assert_not_called()
+    assert app.profile_resolver.stats()['profile_negative_hits'] == 1
+
+def test_profile_resolver_prewarm_swallows_errors(mock_bedrock_client):
+    mock_bedrock_client.list_inference_profiles.side_effect = Exception("No credentials")
+    
+    with patch.object(app.profile_resolver, 'configured_arn', ''):
+        app.profile_resolver.prewarm(["amazon.nova-pro-v1:0"])
+    
+    assert app.client_cache.created >= 1
+
+@pytest.mark.parametrize("timeout_seconds, budget, max_seconds", [
+    # The API function, whose lambda_handler caps the budget for API Gateway
+    (60, None, app.API_GATEWAY_DEADLINE_SECONDS),
+    # The job worker, which keeps its full timeout
+    (300, 300, None)
+])
+def test_prewarm_creates_only_the_client_requests_use(mock_bedrock_client, timeout_seconds, budget, max_seconds):
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = timeout_seconds * 1000
+    request_deadline = deadline.Deadline.from_context(context, app.DEADLINE_SAFETY_MARGIN,
+                                                      app.DEFAULT_DEADLINE_SECONDS, max_seconds)
+    
+    with patch.object(app.profile_resolver, 'configured_arn', 'arn:aws:bedrock:us-east-1:123:inference-profile/test'), \
+            patch.object(app, 'PREWARM_BUDGET_SECONDS', budget or app.PREWARM_BUDGET_SECONDS):
+        app.prewarm()
+        app.get_bedrock_client(request_deadline)
+    
+    assert app.client_cache.created == 1
+    assert app.client_cache.reused == 1
+
+def test_app_import_defers_heavy_dependencies():
+    # Load app.py the way the Lambda runtime does, in a fresh interpreter with the shared layer on the path
+    function_dir = os.path.join(os.path.dirname(__file__), '..', 'website_to_text')
+    layer_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+    script = (
+        "import json, sys, app; "
+        "print(json.dumps([m for m in ('trafilatura', 'lxml', 'boto3', 'requests') if m in sys.modules]))"
+    )
+    env = dict(os.environ, PREWARM_ON_INIT='false', PYTHONPATH=layer_dir)
+    
+    result = subprocess.run([sys.executable, '-c', script], cwd=function_dir, env=env,
+                            capture_output=True, text=True, check=True)
+    
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+def test_extract_content_conditional_get_not_modified(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    mock_fetch.return_value = _page("<html><body>Test</body></html>", etag='"v1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+    mock_extract.return_value = "# Cached Content"
+    assert app.extract_content("https://example.com/page") == "# Cached Content"
+    
+    # The second fetch revalidates and the origin answers 304
+    mock_fetch.return_value = {
+        "not_modified": True,
+        "content": None,
+        "etag": '"v1"',
+        "last_modified": 'Mon, 01 Jan 2024 00:00:00 GMT'
+    }
+    assert app.extract_content("https://example.com/page") == "# Cached Content"
+    
+    mock_fetch.assert_called_with("https://example.com/page", etag='"v1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT', timeout=None)
+    mock_extract.assert_called_once()
+    stats = app.content_cache.stats()
+    assert stats['misses'] == 1
+    assert stats['revalidated'] == 1
+    assert stats['entries'] == 1
+
+def test_extract_content_changed_page_is_reextracted(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    mock_fetch.return_value = _page("<html><body>Old</body></html>", etag='"v1"')
+    mock_extract.return_value = "# Old"
+    app.extract_content("https://example.com/page")
+    
+    mock_fetch.return_value = _page("<html><body>New</body></html>", etag='"v2"')
+    mock_extract.return_value = "# New"
+    assert app.extract_content("https://example.com/page") == "# New"
+    
+    assert app.content_cache.stats()['changed'] == 1
+    assert app.content_cache.get("https://example.com/page")['etag'] == '"v2"'
+
+def test_download_page_sends_validators():
+    not_modified = {
+        "status_code": 304,
+        "content": None,
+        "etag": None,
+        "last_modified": None,
+        "content_type": "",
+        "bytes": 0,
+        "truncated": False
+    }
+    with patch.object(app.page_fetcher, 'fetch', return_value=not_modified) as mock_fetch:
+        result = app.download_page("https://example.com", etag='"abc"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+    
+    assert result['not_modified'] is True
+    assert result['etag'] == '"abc"'
+    headers = mock_fetch.call_args[1]['headers']
+    assert headers['If-None-Match'] == '"abc"'
+    assert headers['If-Modified-Since'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+def test_memory_backend_evicts_by_size():
+    backend = cache.MemoryBackend(max_bytes=200)
+    backend.set("a", {"markdown": "x" * 80})
+    backend.set("b", {"markdown": "y" * 80})
+    backend.get("a")
+    backend.set("c", {"markdown": "z" * 80})
+    
+    # "b" was least recently used
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    assert backend.size <= 200
+    assert backend.evictions == 1
+
+def test_disk_backend_round_trip_and_eviction(tmp_path):
+    backend = cache.DiskBackend(str(tmp_path), max_bytes=200)
+    backend.set("https://example.com/1", {"markdown": "a" * 60})
+    assert backend.get("https://example.com/1") == {"markdown": "a" * 60}
+    
+    backend.set("https://example.com/2", {"markdown": "b" * 60})
+    os.utime(backend._path("https://example.com/1"), (0, 0))
+    backend.set("https://example.com/3", {"markdown": "c" * 60})
+    
+    assert backend.get("https://example.com/1") is None
+    assert len(backend) == 2
+
+def test_lambda_handler_serves_repeat_summary_from_cache(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content\n\nThis is a test."
+    
+    mock_response = {
+        'body': MagicMock()
+    }
+    mock_response['body'].read.return_value = json.dumps({
+        "results": [{"outputText": "This is a summary."}]
+    })
+    mock_bedrock_client.invoke_model.return_value = mock_response
+    
+    event = {
+        "body": json.dumps({
+            "url": "https://example.com",
+            "prompt": "Summarize this",
+            "model": "test-model"
+        })
+    }
+    
+    first = json.loads(app.lambda_handler(event, None)["body"])
+    second = json.loads(app.lambda_handler(event, None)["body"])
+    
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["summary"] == "This is a summary."
+    mock_bedrock_client.invoke_model.assert_called_once()
+    
+    # Clients can opt out of the cache
+    event["body"] = json.dumps({
+        "url": "https://example.com",
+        "prompt": "Summarize this",
+        "model": "test-model",
+        "cache": False
+    })
+    third = json.loads(app.lambda_handler(event, None)["body"])
+    assert third["cached"] is False
+    assert mock_bedrock_client.invoke_model.call_count == 2
+
+def test_summary_cache_key_and_ttl():
+    key = cache.SummaryCache.key("Some   content\n", "Summarize", "model-a", {"temperature": 0.7})
+    assert key == cache.SummaryCache.key("Some content", "Summarize ", "model-a", {"temperature": 0.7})
+    assert key != cache.SummaryCache.key("Some content", "Summarize", "model-b", {"temperature": 0.7})
+    assert key != cache.SummaryCache.key("Some content", "Summarize", "model-a", {"temperature": 0.2})
+    
+    summaries = cache.SummaryCache(cache.MemoryBackend(1024), ttl=60)
+    summaries.put(key, "A summary")
+    assert summaries.get(key) == "A summary"
+    
+    with patch('time.time', return_value=10 ** 12):
+        assert summaries.get(key) is None
+    assert summaries.stats()['expired'] == 1
+
+def test_lambda_handler_batch_reports_per_url_results(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    def fake_download(url, etag=None, last_modified=None, timeout=None):
+        if "broken" in url:
+            raise Exception("Connection refused")
+        return _page(f"<html><body>{url}</body></html>")
+    
+    mock_fetch.side_effect = fake_download
+    mock_extract.side_effect = lambda downloaded, **kwargs: f"# {downloaded.decode('utf-8')}"
+    
+    def fake_invoke(**kwargs):
+        mock_response = {
+            'body': MagicMock()
+        }
+        mock_response['body'].read.return_value = json.dumps({
+            "results": [{"outputText": "Summary of " + json.loads(kwargs['body'])['inputText'][-20:]}]
+        })
+        return mock_response
+    
+    mock_bedrock_client.invoke_model.side_effect = fake_invoke
+    
+    event = {
+        "body": json.dumps({
+            "urls": ["https://example.com/a", "https://broken.example.com", "not-a-url", "https://example.com/b"],
+            "prompt": "Summarize this",
+            "model": "test-model"
+        })
+    }
+    
+    response = app.lambda_handler(event, None)
+    
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["count"] == 4
+    assert body["succeeded"] == 2
+    assert body["failed"] == 2
+    
+    results = body["results"]
+    assert [result["url"] for result in results] == [
+        "https://example.com/a", "https://broken.example.com", "not-a-url", "https://example.com/b"
+    ]
+    assert results[0]["statusCode"] == 200
+    assert "com/a" in results[0]["summary"]
+    assert results[1]["statusCode"] == 400
+    assert "Connection refused" in results[1]["details"]
+    assert results[2]["statusCode"] == 400
+    assert "Invalid URL" in results[2]["details"]
+    assert results[3]["statusCode"] == 200
+    assert mock_bedrock_client.invoke_model.call_count == 2
+
+def test_lambda_handler_batch_summary_failure_is_isolated(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.side_effect = ["# Page one", "# Page two"]
+    mock_bedrock_client.invoke_model.side_effect = ClientError(
+        error_response={'Error': {'Code': 'ValidationException', 'Message': 'Input is too long'}},
+        operation_name='InvokeModel'
+    )
+    
+    event = {
+        "body": json.dumps({
+            "urls": ["https://example.com/a", "https://example.com/b"],
+            "model": "test-model"
+        })
+    }
+    
+    body = json.loads(app.lambda_handler(event, None)["body"])
+    
+    assert body["failed"] == 2
+    assert all(result["statusCode"] == 500 for result in body["results"])
+    assert "Bedrock API error" in body["results"][0]["details"]
+
+@pytest.mark.parametrize("urls", [[], "https://example.com", [1, 2]])
+def test_lambda_handler_batch_invalid_urls(urls):
+    event = {
+        "body": json.dumps({
+            "urls": urls
+        })
+    }
+    
+    response = app.lambda_handler(event, None)
+    
+    assert response["statusCode"] == 400
+    assert "urls must be" in json.loads(response["body"])["details"]
+
+def test_lambda_handler_batch_too_many_urls():
+    event = {
+        "body": json.dumps({
+            "urls": [f"https://example.com/{i}" for i in range(app.BATCH_MAX_URLS + 1)]
+        })
+    }
+    
+    response = app.lambda_handler(event, None)
+    
+    assert response["statusCode"] == 400
+    assert "at most" in json.loads(response["body"])["details"]
+
+def _stream(*chunks):
+    # Shape of an invoke_model_with_response_stream response
+    return {
+        'body': [{'chunk': {'bytes': json.dumps(chunk).encode('utf-8')}} for chunk in chunks]
+    }
+
+def test_generate_summary_stream_nova(mock_bedrock_client):
+    mock_bedrock_client.invoke_model_with_response_stream.return_value = _stream(
+        {"messageStart": {"role": "assistant"}},
+        {"contentBlockDelta": {"delta": {"text": "Hello"}, "contentBlockIndex": 0}},
+        {"contentBlockDelta": {"delta": {"text": " world"}, "contentBlockIndex": 0}},
+        {"contentBlockStop": {"contentBlockIndex": 0}},
+        {"messageStop": {"stopReason": "end_turn"}}
+    )
+    
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    deltas = list(app.generate_summary_stream("Test content", "Summarize this", model))
+    
+    assert deltas == ["Hello", " world"]
+    call_kwargs = mock_bedrock_client.invoke_model_with_response_stream.call_args[1]
+    assert call_kwargs['modelId'] == model
+    assert "messages" in json.loads(call_kwargs['body'])
+
+def test_generate_summary_stream_titan(mock_bedrock_client):
+    mock_bedrock_client.invoke_model_with_response_stream.return_value = _stream(
+        {"outputText": "Part one.", "index": 0},
+        {"outputText": " Part two.", "index": 0, "completionReason": "FINISH"}
+    )
+    
+    deltas = list(app.generate_summary_stream("Test content", "Summarize this", "amazon.titan-text-express-v1"))
+    
+    assert deltas == ["Part one.", " Part two."]
+
+def test_generate_summary_stream_error_event(mock_bedrock_client):
+    mock_bedrock_client.invoke_model_with_response_stream.return_value = {
+        'body': [{'throttlingException': {'message': 'Too many requests'}}]
+    }
+    
+    with pytest.raises(Exception) as excinfo:
+        list(app.generate_summary_stream("Test content", "Summarize this", "test-model"))
+    
+    assert "Too many requests" in str(excinfo.value)
+
+def test_stream_handler_emits_ndjson_records(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model_with_response_stream.side_effect = lambda **kwargs: _stream(
+        {"outputText": "Streamed", "index": 0},
+        {"outputText": " summary.", "index": 0}
+    )
+    
+    event = {
+        "body": json.dumps({
+            "url": "https://example.com",
+            "prompt": "Summarize this",
+            "model": "test-model"
+        })
+    }
+    
+    records = [json.loads(line) for line in app.stream_handler(event, None)]
+    
+    assert [record["type"] for record in records] == ["content", "delta", "delta", "done"]
+    assert records[0]["extracted_content"] == "# Test Content"
+    assert "".join(record["text"] for record in records if record["type"] == "delta") == "Streamed summary."
+    assert records[-1]["cached"] is False
+    
+    # The streamed summary feeds the summary cache for the next request
+    repeat = [json.loads(line) for line in app.stream_handler(event, None)]
+    assert repeat[1] == {"type": "delta", "text": "Streamed summary."}
+    assert repeat[-1]["cached"] is True
+    mock_bedrock_client.invoke_model_with_response_stream.assert_called_once()
+
+def test_stream_handler_missing_url():
+    records = [json.loads(line) for line in app.stream_handler({"body": "{}"}, None)]
+    
+    assert len(records) == 1
+    assert records[0]["type"] == "error"
+    assert records[0]["statusCode"] == 400
+
+def test_split_markdown_prefers_heading_boundaries():
+    markdown = "# One\n\n" + "a" * 50 + "\n\n## Two\n\n" + "b" * 50 + "\n\n## Three\n\n" + "c" * 50
+    
+    chunks = chunking.split_markdown(markdown, max_tokens=20)
+    
+    assert len(chunks) == 3
+    assert chunks[0].startswith("# One")
+    assert chunks[1].startswith("## Two")
+    assert chunks[2].startswith("## Three")
+    assert all(chunking.estimate_tokens(chunk) <= 20 for chunk in chunks)
+
+def test_split_markdown_packs_small_sections_and_splits_large_paragraphs():
+    small = "# A\n\nshort\n\n# B\n\nshort"
+    assert chunking.split_markdown(small, max_tokens=100) == [small]
+    
+    paragraph = "This is a sentence. " * 50
+    chunks = chunking.split_markdown(paragraph, max_tokens=25)
+    
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert "".join("".join(chunks).split()) == "".join(paragraph.split())
+
+def test_summarize_content_map_reduce_for_long_pages():
+    content = "\n\n".join(f"## Section {i}\n\n" + "word " * 150 for i in range(6))
+    calls = []
+    
+    def fake_generate(chunk, prompt, model=None, deadline=None, metrics=None):
+        calls.append((chunk, prompt))
+        return f"partial {len(calls)}"
+    
+    with patch.object(app, 'CHUNK_TOKEN_BUDGET', 500), \
+            patch.object(app, 'generate_summary', side_effect=fake_generate):
+        summary = app.summarize_content(content, "List the key points", "test-model")
+    
+    map_calls = [call for call in calls if call[1].startswith("The following is one part")]
+    reduce_calls = [call for call in calls if call[1].startswith("The following are summaries")]
+    assert len(map_calls) == 3
+    assert len(reduce_calls) == 1
+    assert "List the key points" in reduce_calls[0][1]
+    assert "Part 1:" in reduce_calls[0][0] and "Part 3:" in reduce_calls[0][0]
+    assert summary == f"partial {len(calls)}"
+
+def test_summarize_content_maps_every_chunk_at_once():
+    content = "\n\n".join(f"## Section {i}\n\n" + "word " * 150 for i in range(12))
+    # Every map call waits for all the others, which only succeeds if they run in one round
+    barrier = threading.Barrier(6, timeout=5)
+    
+    def fake_generate(chunk, prompt, model=None, deadline=None, metrics=None):
+        if prompt.startswith("The following is one part"):
+            barrier.wait()
+        return "partial"
+    
+    with patch.object(app, 'CHUNK_TOKEN_BUDGET', 500), \
+            patch.object(app, 'generate_summary', side_effect=fake_generate):
+        assert app.summarize_content(content, "Summarize", "test-model") == "partial"
+
+def test_summarize_content_short_page_is_single_call():
+    with patch.object(app, 'generate_summary', return_value="Short summary") as mock_generate:
+        assert app.summarize_content("Short page", "Summarize", "test-model") == "Short summary"
+    
+    mock_generate.assert_called_once_with("Short page", "Summarize", "test-model", None, None)
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    # Routes: /page (HTML with an ETag), /large (HTML over the byte cap), /slow (HTML whose body
+    # stalls after the headers), /binary (a PDF)
+    connections = set()
+    
+    def do_GET(self):
+        self.connections.add(self.client_address)
+        if self.path == '/slow':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', '100')
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(1)
+            return
+        if self.path == '/page':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = b"<html><body><p>Hello</p></body></html>"
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('ETag', '"v1"')
+        elif self.path == '/large':
+            body = b"<html><body>" + b"x" * 100000 + b"</body></html>"
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+        else:
+            body = b"%PDF-1.4" + b"\0" * 100000
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def local_site():
+    _SiteHandler.connections = set()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SiteHandler)
+    server.protocol_version = 'HTTP/1.1'
+    _SiteHandler.protocol_version = 'HTTP/1.1'
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_fetcher_reuses_connections_and_revalidates(local_site):
+    page_fetcher = fetcher.Fetcher(connect_timeout=2, read_timeout=5, max_bytes=10000)
+    
+    first = page_fetcher.fetch(f"{local_site}/page")
+    second = page_fetcher.fetch(f"{local_site}/page", headers={'If-None-Match': '"v1"'})
+    page_fetcher.close()
+    
+    assert first["status_code"] == 200
+    assert first["content"] == b"<html><body><p>Hello</p></body></html>"
+    assert first["etag"] == '"v1"'
+    assert second["status_code"] == 304
+    assert second["content"] is None
+    # Both requests went over the same keep-alive connection
+    assert len(_SiteHandler.connections) == 1
+
+def test_fetcher_stops_at_byte_cap(local_site):
+    page_fetcher = fetcher.Fetcher(connect_timeout=2, read_timeout=5, max_bytes=5000, chunk_size=1024)
+    
+    result = page_fetcher.fetch(f"{local_site}/large")
+    page_fetcher.close()
+    
+    assert result["truncated"] is True
+    assert result["bytes"] == 5000
+    assert len(result["content"]) == 5000
+
+def test_fetcher_rejects_non_html_before_reading(local_site):
+    page_fetcher = fetcher.Fetcher(connect_timeout=2, read_timeout=5, max_bytes=10000)
+    
+    with pytest.raises(ValueError) as excinfo:
+        page_fetcher.fetch(f"{local_site}/binary")
+    page_fetcher.close()
+    
+    assert "Unsupported content type: application/pdf" in str(excinfo.value)
+
+def test_fetcher_reports_read_timeouts(local_site):
+    page_fetcher = fetcher.Fetcher(connect_timeout=2, read_timeout=0.2, max_bytes=10000)
+    
+    with pytest.raises(fetcher.DownloadTimeout):
+        page_fetcher.fetch(f"{local_site}/slow")
+    page_fetcher.close()
+
+def test_extract_content_download_cut_short_by_deadline(local_site):
+    # Only 0.3s of the deadline is left for the download once Bedrock's reserve is kept back
+    request_deadline = deadline.Deadline(app.SUMMARY_RESERVE_SECONDS + 0.3)
+    
+    with pytest.raises(deadline.DeadlineExceeded):
+        app.extract_content(f"{local_site}/slow", request_deadline)
+    
+    # Without a deadline the full TIMEOUT_SECONDS applied, so the page itself was too slow
+    with patch.object(app, 'page_fetcher', fetcher.Fetcher(connect_timeout=2, read_timeout=0.2, max_bytes=10000)), \
+            patch.object(app, 'TIMEOUT_SECONDS', 0.2):
+        with pytest.raises(ValueError):
+            app.extract_content(f"{local_site}/slow", deadline.Deadline(60))
+
+def test_extract_content_through_local_site(local_site):
+    with patch('trafilatura.extract', return_value="Hello") as mock_extract:
+        assert app.extract_content(f"{local_site}/page") == "Hello"
+    
+    assert mock_extract.call_args[0][0] == b"<html><body><p>Hello</p></body></html>"
+
+class _Context:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+    
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+def test_deadline_budget():
+    request_deadline = deadline.Deadline.from_context(_Context(20000), safety_margin=1.0)
+    
+    assert 18.5 < request_deadline.remaining() <= 19.0
+    assert request_deadline.budget(30) <= 19.0
+    assert request_deadline.budget(5) == 5
+    assert 3.5 < request_deadline.budget(30, reserve=15) <= 4.0
+    assert request_deadline.budget(30, reserve=25) == 0
+    assert deadline.Deadline.from_context(None, fallback_seconds=60).remaining() > 58
+    assert deadline.Deadline(0).expired()
+    assert 26.5 < deadline.Deadline.from_context(_Context(60000), max_seconds=28).remaining() <= 27.0
+
+def test_lambda_handler_sizes_timeouts_from_deadline(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    
+    mock_response = {
+        'body': MagicMock()
+    }
+    mock_response['body'].read.return_value = json.dumps({
+        "results": [{"outputText": "This is a summary."}]
+    })
+    mock_bedrock_client.invoke_model.return_value = mock_response
+    
+    event = {
+        "body": json.dumps({
+            "url": "https://example.com",
+            "model": "test-model"
+        })
+    }
+    
+    with patch('boto3.client', return_value=mock_bedrock_client) as mock_client:
+        response = app.lambda_handler(event, _Context(21000))
+    
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["partial"] is False
+    # 20s left after the safety margin: the download keeps 15s back for Bedrock
+    assert 4.0 < mock_fetch.call_args[1]['timeout'] <= 5.0
+    config = mock_client.call_args[1]['config']
+    assert config.read_timeout == 10
+
+def test_lambda_handler_caps_deadline_at_api_gateway_timeout(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = {'body': MagicMock()}
+    mock_bedrock_client.invoke_model.return_value['body'].read.return_value = json.dumps({
+        "results": [{"outputText": "This is a summary."}]
+    })
+    
+    event = {
+        "httpMethod": "POST",
+        "body": json.dumps({
+            "url": "https://example.com",
+            "model": "test-model"
+        })
+    }
+    
+    with patch('boto3.client', return_value=mock_bedrock_client) as mock_client:
+        response = app.lambda_handler(event, _Context(60000))
+    
+    assert response["statusCode"] == 200
+    # 28s cap minus the safety margin leaves 27s: 12s for the download, a 20s Bedrock step
+    assert 11.0 < mock_fetch.call_args[1]['timeout'] <= 12.0
+    assert mock_client.call_args[1]['config'].read_timeout == 20
+
+def test_lambda_handler_returns_partial_result_on_bedrock_timeout(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.side_effect = ReadTimeoutError(endpoint_url="https://bedrock-runtime")
+    
+    event = {
+        "body": json.dumps({
+            "url": "https://example.com",
+            "model": "test-model"
+        })
+    }
+    
+    response = app.lambda_handler(event, _Context(30000))
+    
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["partial"] is True
+    assert body["summary"] is None
+    assert body["extracted_content"] == "# Test Content"
+    assert "time budget" in body["details"]
+
+def test_lambda_handler_skips_bedrock_when_too_little_time_left(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    
+    event = {
+        "body": json.dumps({
+            "url": "https://example.com",
+            "model": "test-model"
+        })
+    }
+    
+    with patch.object(app, 'SUMMARY_RESERVE_SECONDS', 0):
+        response = app.lambda_handler(event, _Context(4000))
+    
+    body = json.loads(response["body"])
+    assert body["partial"] is True
+    assert body["extracted_content"] == "# Test Content"
+    mock_bedrock_client.invoke_model.assert_not_called()
+
+def test_lambda_handler_deadline_exceeded_before_download(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    event = {
+        "body": json.dumps({
+            "url": "https://example.com"
+        })
+    }
+    
+    response = app.lambda_handler(event, _Context(10000))
+    
+    assert response["statusCode"] == 504
+    assert json.loads(response["body"])["error"] == "Deadline exceeded"
+    mock_fetch.assert_not_called()
+
+def test_lambda_handler_returns_timings_when_requested(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_response = {'body': MagicMock()}
+    mock_response['body'].read.return_value = json.dumps({
+        "inputTextTokenCount": 120,
+        "results": [{"outputText": "Summary.", "tokenCount": 30}]
+    })
+    mock_bedrock_client.invoke_model.return_value = mock_response
+    
+    event = {
+        "body": json.dumps({
+            "url": "https://example.com",
+            "model": "test-model",
+            "timings": True
+        })
+    }
+    
+    response = app.lambda_handler(event, None)
+    
+    timings = json.loads(response["body"])["timings"]
+    assert {"fetch", "extract", "bedrock"} <= set(timings["stages_ms"])
+    assert timings["bytes_downloaded"] == len("<html><body>Test</body></html>")
+    assert timings["content_length"] == len("# Test Content")
+    assert timings["input_tokens"] == 120
+    assert timings["output_tokens"] == 30
+
+def test_lambda_handler_omits_timings_by_default(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    
+    response = app.lambda_handler({"body": json.dumps({"url": "https://example.com"})}, None)
+    
+    assert "timings" not in json.loads(response["body"])
+
+def test_lambda_handler_emits_emf_record(mock_trafilatura, mock_bedrock_client, capsys):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    
+    with patch.object(app, 'METRICS_ENABLED', True):
+        app.lambda_handler({"body": json.dumps({"url": "https://example.com"})}, None)
+        app.lambda_handler({"body": json.dumps({"url": "https://example.com"})}, None)
+    
+    lines = [line for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+    assert len(lines) == 2
+    record = json.loads(lines[0])
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == app.METRICS_NAMESPACE
+    assert directive["Dimensions"] == [["Function"]]
+    assert {"fetch_ms", "extract_ms", "bedrock_ms", "total_ms"} <= set(record)
+    units = {metric["Name"]: metric["Unit"] for metric in directive["Metrics"]}
+    assert units["fetch_ms"] == "Milliseconds"
+    assert units["bytes_downloaded"] == "Bytes"
+    
+    # The container-wide cache counters ride along with every record
+    record = json.loads(lines[1])
+    units = {metric["Name"]: metric["Unit"] for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert record["summary_cache_hits"] == 1
+    assert record["summary_cache_hit_rate"] == 0.5
+    assert units["summary_cache_hit_rate"] == "None"
+    assert units["content_cache_bytes"] == "Bytes"
+    assert {"profile_hit_rate", "clients_reused", "content_cache_hit_rate"} <= set(units)
+
+def test_lambda_handler_metrics_disabled(mock_trafilatura, capsys):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    with patch.object(app, 'METRICS_ENABLED', False):
+        app.lambda_handler({"body": "{}"}, None)
+    
+    assert '"_aws"' not in capsys.readouterr().out
+
+def test_resolve_model_id_records_profile_resolution(mock_bedrock_client):
+    mock_bedrock_client.list_inference_profiles.return_value = {
+        'inferenceProfiles': [
+            {'name': 'us-nova-pro', 'inferenceProfileArn': 'arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0'}
+        ]
+    }
+    metrics = instrumentation.RequestMetrics()
+    
+    with patch.object(app.profile_resolver, 'configured_arn', ''):
+        app.resolve_model_id("amazon.nova-pro-v1:0", metrics)
+    
+    assert "profile_resolution" in metrics.to_dict()["stages_ms"]
+
+def test_request_metrics_accumulate_repeated_stages():
+    metrics = instrumentation.RequestMetrics()
+    
+    with metrics.stage('bedrock'):
+        pass
+    with metrics.stage('bedrock'):
+        pass
+    metrics.add('chunks', 2)
+    metrics.add('chunks', 3)
+    metrics.add('input_tokens', None)
+    
+    result = metrics.to_dict()
+    assert list(result["stages_ms"]) == ["bedrock"]
+    assert result["chunks"] == 5
+    assert "input_tokens" not in result
+
+def test_null_metrics_records_nothing():
+    metrics = instrumentation.NullMetrics()
+    
+    with metrics.stage('fetch'):
+        pass
+    metrics.add('chunks', 1)
+    
+    assert metrics.to_dict() == {"stages_ms": {}}
+
+def test_memory_profiler_records_profiled_stages():
+    profiler = memory.MemoryProfiler()
+    was_tracing = memory.tracemalloc.is_tracing()
+    profiler.start()
+    metrics = instrumentation.RequestMetrics(profiler)
+    
+    try:
+        with metrics.stage('extract'):
+            block = bytearray(4 * 1024 * 1024)
+            del block
+        with metrics.stage('bedrock'):
+            pass
+    finally:
+        if not was_tracing:
+            memory.tracemalloc.stop()
+    
+    counters = metrics.to_dict()
+    assert counters["extract_peak_traced_bytes"] >= 4 * 1024 * 1024
+    assert "extract_rss_delta_bytes" in counters
+    assert counters["peak_rss_bytes"] > 0
+    assert not any(name.startswith('bedrock_') for name in counters)
+    units = {entry["Name"]: entry["Unit"] for entry in metrics.emf_record("Test", {"Function": "test"})
+             ["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert units["extract_peak_traced_bytes"] == "Bytes"
+
+def test_memory_profiler_keeps_outer_peak_across_nested_stages():
+    profiler = memory.MemoryProfiler()
+    was_tracing = memory.tracemalloc.is_tracing()
+    profiler.start()
+    metrics = instrumentation.RequestMetrics(profiler)
+    
+    try:
+        with metrics.stage('total'):
+            block = bytearray(20 * 1024 * 1024)
+            del block
+            with metrics.stage('extract'):
+                pass
+            with metrics.stage('serialize'):
+                pass
+    finally:
+        if not was_tracing:
+            memory.tracemalloc.stop()
+    
+    counters = metrics.to_dict()
+    # The inner stages reset tracemalloc's peak after the allocation had been freed
+    assert counters["total_peak_traced_bytes"] >= 20 * 1024 * 1024
+    assert counters["serialize_peak_traced_bytes"] < 1024 * 1024
+
+def test_memory_guard_downgrades_then_rejects():
+    mb = 1024 * 1024
+    guard = memory.MemoryGuard(200 * mb, full_factor=20, fast_factor=8, rss=lambda: 100 * mb)
+    
+    with guard.reserve(1 * mb) as mode:
+        assert mode == memory.MODE_FULL
+    with guard.reserve(8 * mb) as mode:
+        assert mode == memory.MODE_FAST
+    with pytest.raises(memory.MemoryCeilingExceeded):
+        with guard.reserve(20 * mb):
+            pass
+    
+    # Extractions already running count against the ceiling until they finish
+    with guard.reserve(4 * mb):
+        with guard.reserve(2 * mb) as mode:
+            assert mode == memory.MODE_FAST
+    with guard.reserve(2 * mb) as mode:
+        assert mode == memory.MODE_FULL
+    
+    assert memory.ceiling_bytes(300, '512', 0.85) == 300 * mb
+    assert memory.ceiling_bytes(0, '512', 0.5) == 256 * mb
+    assert memory.ceiling_bytes(0, '', 0.85) == 0
+
+def test_extract_content_uses_fast_mode_near_memory_ceiling(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>" + "x" * 1000 + "</body></html>")
+    mock_extract.return_value = "# Test Content"
+    metrics = instrumentation.RequestMetrics()
+    guard = memory.MemoryGuard(100000, full_factor=200, fast_factor=10, rss=lambda: 50000)
+    
+    with patch.object(app, 'memory_guard', guard):
+        assert app.extract_content("https://example.com", metrics=metrics) == "# Test Content"
+    
+    assert mock_extract.call_args.kwargs["no_fallback"] is True
+    assert metrics.to_dict()["fast_extractions"] == 1
+
+def test_lambda_handler_rejects_page_over_memory_ceiling(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>" + "x" * 1000 + "</body></html>")
+    guard = memory.MemoryGuard(100000, rss=lambda: 99000)
+    
+    with patch.object(app, 'memory_guard', guard):
+        status, body = _handle({"url": "https://example.com"})
+    
+    assert status == 400
+    assert "Page too large to extract" in body["details"]
+    mock_extract.assert_not_called()
+    mock_bedrock_client.invoke_model.assert_not_called()
+
+def test_stream_handler_reports_timings(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model_with_response_stream.return_value = _stream(
+        {"contentBlockDelta": {"delta": {"text": "Streamed."}}}
+    )
+    
+    event = {"body": json.dumps({"url": "https://example.com", "model": "amazon.nova-lite-v1:0", "timings": True})}
+    with patch.object(app.profile_resolver, 'configured_arn', 'arn:aws:bedrock:us-east-1:123:inference-profile/test'):
+        records = [json.loads(line) for line in app.stream_handler(event, None)]
+    
+    assert records[-1]["type"] == "done"
+    assert "bedrock" in records[-1]["timings"]["stages_ms"]
+
+def _handle(body):
+    response = app.lambda_handler({"body": json.dumps(body)}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+def test_lambda_handler_content_mode_none(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    status, body = _handle({"url": "https://example.com", "model": model, "content_mode": "none"})
+    
+    assert status == 200
+    assert body["content_mode"] == "none"
+    assert body["extracted_content"] is None
+    assert body["content_bytes"] == len("# Test Content")
+    assert body["summary"] == "Summary."
+
+def test_lambda_handler_content_mode_gzip(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    
+    status, body = _handle({"url": "https://example.com", "content_mode": "gzip"})
+    
+    assert body["content_mode"] == "gzip"
+    assert payload.decode_gzip(body["extracted_content_gzip"]) == "# Test Content"
+
+def test_lambda_handler_content_mode_s3(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    mock_bedrock_client.generate_presigned_url.return_value = "https://bucket.s3.amazonaws.com/signed"
+    
+    with patch.object(app, 'CONTENT_BUCKET', 'content-bucket'):
+        status, body = _handle({"url": "https://example.com", "content_mode": "s3"})
+    
+    assert body["content_mode"] == "s3"
+    assert body["extracted_content_url"] == "https://bucket.s3.amazonaws.com/signed"
+    assert body["extracted_content_expires_in"] == app.CONTENT_URL_EXPIRATION_SECONDS
+    put_kwargs = mock_bedrock_client.put_object.call_args[1]
+    assert put_kwargs["Bucket"] == "content-bucket"
+    assert put_kwargs["Key"] == payload.content_key("# Test Content", app.CONTENT_KEY_PREFIX)
+    assert put_kwargs["Body"] == b"# Test Content"
+
+def test_lambda_handler_auto_content_mode_by_size(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_bedrock_client.invoke_model.side_effect = lambda **kwargs: _nova_response("Summary.")
+    
+    mock_extract.return_value = "Short page."
+    assert _handle({"url": "https://example.com/small"})[1]["extracted_content"] == "Short page."
+    
+    mock_extract.return_value = "Long page. " * 1000
+    status, body = _handle({"url": "https://example.com/large", "cache": False})
+    assert body["content_mode"] == "gzip"
+    assert payload.decode_gzip(body["extracted_content_gzip"]) == "Long page. " * 1000
+
+def test_lambda_handler_rejects_invalid_content_mode(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    status, body = _handle({"url": "https://example.com", "content_mode": "zip"})
+    assert status == 400
+    assert body["error"] == "Invalid parameter"
+    
+    with patch.object(app, 'CONTENT_BUCKET', ''):
+        status, body = _handle({"url": "https://example.com", "content_mode": "s3"})
+    assert status == 400
+    assert "no content bucket" in body["details"]
+    mock_fetch.assert_not_called()
+
+def test_batch_applies_content_mode_per_result(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.side_effect = lambda **kwargs: _nova_response("Summary.")
+    
+    status, body = _handle({"urls": ["https://example.com/a", "https://example.com/b"], "content_mode": "none"})
+    
+    assert [result["content_mode"] for result in body["results"]] == ["none", "none"]
+    assert all(result["extracted_content"] is None for result in body["results"])
+
+def test_choose_content_mode():
+    assert payload.choose_mode(100, 1000, 10000, True) == 'inline'
+    assert payload.choose_mode(5000, 1000, 10000, True) == 'gzip'
+    assert payload.choose_mode(50000, 1000, 10000, True) == 's3'
+    assert payload.choose_mode(50000, 1000, 10000, False) == 'gzip'
+
+def test_shape_content_falls_back_to_gzip_when_offload_fails():
+    def failing_offload(content):
+        raise Exception("Access Denied")
+    
+    fields = payload.shape_content("x" * 100, 'auto', 10, 50, offload=failing_offload)
+    assert fields["content_mode"] == "gzip"
+    assert payload.decode_gzip(fields["extracted_content_gzip"]) == "x" * 100
+    
+    # An explicit request for s3 reports the failure instead
+    with pytest.raises(Exception, match="Access Denied"):
+        payload.shape_content("x" * 100, 's3', 10, 50, offload=failing_offload)
+
+def _poll(job_id):
+    response = app.lambda_handler({"httpMethod": "GET", "pathParameters": {"job_id": job_id}}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+def test_async_job_submit_poll_and_process(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Job summary.")
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    status, body = _handle({"url": "https://example.com", "model": model, "async": True})
+    
+    assert status == 202
+    job_id = body["job_id"]
+    assert body["status"] == "queued"
+    assert body["status_path"] == f"/website-to-text/jobs/{job_id}"
+    mock_fetch.assert_not_called()
+    assert _poll(job_id)[1]["status"] == "queued"
+    
+    assert app.job_worker({}, None) == {"batchItemFailures": [], "processed": 1}
+    
+    status, job = _poll(job_id)
+    assert status == 200
+    assert job["status"] == "succeeded"
+    assert job["status_code"] == 200
+    assert job["result"]["summary"] == "Job summary."
+    assert job["result"]["extracted_content"] == "# Test Content"
+    # The queue is empty once the job is acknowledged
+    assert app.job_worker({}, None)["processed"] == 0
+
+def test_async_job_records_failed_request(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = None
+    
+    job_id = _handle({"url": "https://example.com", "async": True})[1]["job_id"]
+    app.job_worker({}, None)
+    
+    job = _poll(job_id)[1]
+    assert job["status"] == "failed"
+    assert job["status_code"] == 400
+    assert job["result"]["error"] == "Content extraction failed"
+
+def test_async_job_rejects_invalid_request():
+    status, body = _handle({"async": True})
+    
+    assert status == 400
+    assert app.job_queue.receive(10) == []
+
+def test_async_job_unknown_id():
+    status, body = _poll("missing")
+    
+    assert status == 404
+    assert body["error"] == "Job not found"
+
+def test_job_worker_processes_sqs_records(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    job_id = _handle({"url": "https://example.com", "async": True})[1]["job_id"]
+    event = {"Records": [
+        {"messageId": "m1", "body": json.dumps({"job_id": job_id})},
+        {"messageId": "m2", "body": json.dumps({"job_id": job_id})}
+    ]}
+    
+    result = app.job_worker(event, None)
+    
+    assert result["batchItemFailures"] == []
+    assert _poll(job_id)[1]["status"] == "succeeded"
+    # The duplicate delivery found the job finished and did not process it again
+    assert mock_fetch.call_count == 1
+
+def test_job_retried_on_deadline_until_attempts_run_out(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    queue = jobs.JobQueue(jobs.MemoryBackend(visibility_timeout=0), max_attempts=2)
+    
+    with patch.object(app, 'job_queue', queue), patch.object(app, 'JOB_MAX_ATTEMPTS', 2):
+        job_id = _handle({"url": "https://example.com", "async": True})[1]["job_id"]
+        
+        # Ten seconds leaves nothing for the download once Bedrock's reserve is kept back
+        first = app.job_worker({}, _Context(10000))
+        second = app.job_worker({}, _Context(10000))
+        third = app.job_worker({}, _Context(10000))
+        job = _poll(job_id)[1]
+    
+    assert len(first["batchItemFailures"]) == 1
+    assert second["batchItemFailures"] == []
+    assert job["status"] == "failed"
+    assert job["status_code"] == 504
+    assert third["processed"] == 0
+    mock_fetch.assert_not_called()
+
+def test_sqlite_job_backend(tmp_path):
+    backend = jobs.SQLiteBackend(str(tmp_path / "jobs.db"), visibility_timeout=60)
+    queue = jobs.JobQueue(backend)
+    
+    job = queue.submit({"url": "https://example.com"})
+    
+    # A second process sees the same jobs and queue
+    other = jobs.JobQueue(jobs.SQLiteBackend(str(tmp_path / "jobs.db")))
+    assert other.get(job["job_id"])["request"] == {"url": "https://example.com"}
+    
+    received = queue.receive(10)
+    assert [job_id for job_id, _ in received] == [job["job_id"]]
+    # Received jobs are invisible until the visibility timeout passes
+    assert queue.receive(10) == []
+    
+    queue.complete(job["job_id"], 200, {"summary": "Done."})
+    queue.ack(received[0][1])
+    assert jobs.public_view(queue.get(job["job_id"]))["result"] == {"summary": "Done."}
+    
+    backend.visibility_timeout = 0
+    assert queue.receive(10) == []
+
+def test_memory_job_backend_redelivers_unacknowledged_jobs():
+    queue = jobs.JobQueue(jobs.MemoryBackend(visibility_timeout=0))
+    job = queue.submit({"url": "https://example.com"})
+    
+    assert [job_id for job_id, _ in queue.receive(1)] == [job["job_id"]]
+    assert [job_id for job_id, _ in queue.receive(1)] == [job["job_id"]]
+
+def test_aws_job_backend_uses_dynamodb_and_sqs():
+    client = MagicMock()
+    clients = MagicMock()
+    clients.get.return_value = client
+    backend = jobs.create_backend('aws', clients=clients, region='us-east-1', table_name='jobs',
+                                  queue_url='https://sqs.us-east-1.amazonaws.com/123/jobs')
+    
+    job = jobs.JobQueue(backend).submit({"url": "https://example.com"})
+    
+    item = client.put_item.call_args[1]["Item"]
+    assert item["job_id"] == {"S": job["job_id"]}
+    assert json.loads(item["data"]["S"])["status"] == "queued"
+    assert client.send_message.call_args[1]["MessageBody"] == json.dumps({"job_id": job["job_id"]})
+    
+    with pytest.raises(ValueError):
+        jobs.create_backend('aws', clients=clients)
+
+def test_aws_job_backend_keeps_large_results_in_s3():
+    client = MagicMock()
+    clients = MagicMock()
+    clients.get.return_value = client
+    client.generate_presigned_url.return_value = "https://bucket.s3.amazonaws.com/result"
+    backend = jobs.create_backend('aws', clients=clients, region='us-east-1', table_name='jobs',
+                                  queue_url='https://sqs.us-east-1.amazonaws.com/123/jobs', bucket='bucket',
+                                  key_prefix='website-to-text/', url_expiration=60)
+    queue = jobs.JobQueue(backend)
+    job = queue.submit({"urls": ["https://example.com"]})
+    client.get_item.return_value = {"Item": client.put_item.call_args[1]["Item"]}
+    result = {"results": [{"extracted_content": "x" * 8192} for _ in range(50)]}
+    
+    queue.complete(job["job_id"], 200, result)
+    
+    item = client.put_item.call_args[1]["Item"]
+    stored = json.loads(item["data"]["S"])
+    assert len(item["data"]["S"]) < jobs.MAX_ITEM_BYTES
+    assert "result" not in stored
+    assert stored["result_key"] == f"website-to-text/jobs/{job['job_id']}.json"
+    assert json.loads(client.put_object.call_args[1]["Body"]) == result
+    
+    client.get_item.return_value = {"Item": item}
+    view = jobs.public_view(queue.get(job["job_id"]))
+    assert view["status"] == "succeeded"
+    assert view["result_url"] == "https://bucket.s3.amazonaws.com/result"
+    assert view["result_expires_in"] == 60
+    assert "result" not in view
+
+def test_aws_job_backend_fails_large_results_without_bucket():
+    client = MagicMock()
+    clients = MagicMock()
+    clients.get.return_value = client
+    backend = jobs.create_backend('aws', clients=clients, region='us-east-1', table_name='jobs',
+                                  queue_url='https://sqs.us-east-1.amazonaws.com/123/jobs')
+    queue = jobs.JobQueue(backend)
+    job = queue.submit({"urls": ["https://example.com"]})
+    client.get_item.return_value = {"Item": client.put_item.call_args[1]["Item"]}
+    
+    queue.complete(job["job_id"], 200, {"results": ["x" * jobs.MAX_ITEM_BYTES]})
+    
+    stored = json.loads(client.put_item.call_args[1]["Item"]["data"]["S"])
+    assert stored["status"] == "failed"
+    assert stored["result"]["details"] == "The result is too large to store"
+    client.put_object.assert_not_called()
+
+def test_job_progress_is_dropped_when_it_cannot_be_stored_or_is_retried():
+    client = MagicMock()
+    clients = MagicMock()
+    clients.get.return_value = client
+    backend = jobs.create_backend('aws', clients=clients, region='us-east-1', table_name='jobs',
+                                  queue_url='https://sqs.us-east-1.amazonaws.com/123/jobs')
+    queue = jobs.JobQueue(backend)
+    job = queue.submit({"url": "https://example.com", "crawl": True})
+    client.get_item.side_effect = lambda **kwargs: {"Item": client.put_item.call_args[1]["Item"]}
+    queue.start(job["job_id"])
+    
+    # Progress too large for the table, with no bucket to offload it to, leaves the job running
+    queue.progress(job["job_id"], {"pages": 1, "results": ["x" * jobs.MAX_ITEM_BYTES]})
+    view = jobs.public_view(queue.get(job["job_id"]))
+    assert view["status"] == "running" and "progress" not in view
+    
+    queue.progress(job["job_id"], {"pages": 1, "results": ["page"]})
+    assert jobs.public_view(queue.get(job["job_id"]))["progress"]["pages"] == 1
+    # A retry starts over, so the earlier attempt's progress is not shown
+    queue.start(job["job_id"])
+    assert "progress" not in jobs.public_view(queue.get(job["job_id"]))
+
+def test_run_job_marks_unexpected_errors_failed(mock_trafilatura):
+    job_id = _handle({"url": "https://example.com", "async": True})[1]["job_id"]
+    
+    with patch.object(app, '_handle_request', side_effect=RuntimeError("boom")):
+        assert app.job_worker({}, None)["batchItemFailures"] == []
+    
+    job = _poll(job_id)[1]
+    assert job["status"] == "failed"
+    assert job["result"]["details"] == "boom"
+
+def test_run_job_marks_unstorable_results_failed(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = None
+    job_id = _handle({"url": "https://example.com", "async": True})[1]["job_id"]
+    
+    with patch.object(app.job_queue, 'complete', side_effect=ClientError(
+            {'Error': {'Code': 'ValidationException', 'Message': 'Item size has exceeded the maximum'}}, 'PutItem')):
+        app.job_worker({}, None)
+    
+    job = _poll(job_id)[1]
+    assert job["status"] == "failed"
+    assert "Failed to store the result" in job["result"]["details"]
+
+def test_lambda_handler_prompts_extracts_once(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    
+    def invoke(**kwargs):
+        prompt = json.loads(kwargs['body'])['messages'][0]['content'][-1]['text']
+        return _nova_response("Answer to: " + prompt.split("\n")[0])
+    mock_bedrock_client.invoke_model.side_effect = invoke
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    prompts = ["Summarize", "List the key points", "Suggest a title"]
+    
+    status, body = _handle({"url": "https://example.com", "model": model, "prompts": prompts})
+    
+    assert status == 200
+    assert [result["prompt"] for result in body["summaries"]] == prompts
+    assert all(result["summary"].startswith("Answer to: ") for result in body["summaries"])
+    assert body["extracted_content"] == "# Test Content"
+    assert body["cached"] is False and body["partial"] is False
+    assert mock_fetch.call_count == 1
+    assert mock_extract.call_count == 1
+    assert mock_bedrock_client.invoke_model.call_count == 3
+
+def test_summarize_prompts_reports_failures_per_prompt(mock_bedrock_client):
+    def fake_summary(content, prompt, model=None, use_cache=True, deadline=None, metrics=None, routing=None,
+                     url=None):
+        if prompt == "bad":
+            raise Exception("Bedrock API error: ValidationException")
+        if prompt == "slow":
+            raise app.deadlines.DeadlineExceeded("out of time")
+        return "Summary.", False, "m", None
+    
+    with patch.object(app, 'get_or_generate_summary', side_effect=fake_summary):
+        results = app.summarize_prompts("content", ["good", "bad", "slow"])
+        with pytest.raises(Exception, match="ValidationException"):
+            app.summarize_prompts("content", ["bad", "bad"])
+    
+    assert results[0] == {"prompt": "good", "summary": "Summary.", "model_used": "m", "cached": False,
+                          "partial": False}
+    assert results[1]["error"] == "Summary generation failed"
+    assert results[2]["partial"] is True
+
+def test_lambda_handler_rejects_invalid_prompts(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    for body in (
+        {"url": "https://example.com", "prompts": []},
+        {"url": "https://example.com", "prompts": ["ok", ""]},
+        {"url": "https://example.com", "prompts": ["p"] * (app.MAX_PROMPTS + 1)},
+        {"urls": ["https://example.com"], "prompts": ["p"]}
+    ):
+        status, response = _handle(body)
+        assert status == 400
+        assert response["error"] == "Invalid parameter"
+    mock_fetch.assert_not_called()
+
+def test_build_request_body_puts_cached_content_before_prompt():
+    content = "Long page. " * 500
+    
+    blocks = app.build_request_body(content, "Summarize this", "amazon.nova-pro-v1:0")["messages"][0]["content"]
+    
+    assert blocks == [
+        {"text": f"Content:\n{content}"},
+        {"cachePoint": {"type": "default"}},
+        {"text": "Summarize this"}
+    ]
+    # Different prompts over the same page share everything up to the checkpoint
+    other = app.build_request_body(content, "List the key points", "amazon.nova-pro-v1:0")["messages"][0]["content"]
+    assert other[:2] == blocks[:2]
+
+def test_build_request_body_skips_cache_point_when_not_worthwhile():
+    short = app.build_request_body("Short page.", "Summarize this", "amazon.nova-pro-v1:0")
+    assert [block.get("text") for block in short["messages"][0]["content"]] == ["Content:\nShort page.", "Summarize this"]
+    
+    with patch.object(app, 'PROMPT_CACHE_ENABLED', False):
+        disabled = app.build_request_body("Long page. " * 500, "Summarize this", "amazon.nova-pro-v1:0")
+    assert not any("cachePoint" in block for block in disabled["messages"][0]["content"])
+    
+    titan = app.build_request_body("Long page. " * 500, "Summarize this", "amazon.titan-text-express-v1")
+    assert titan["inputText"].startswith("Summarize this\n\nContent:\n")
+
+def test_generate_summary_records_prompt_cache_usage(mock_bedrock_client):
+    mock_response = {'body': MagicMock()}
+    mock_response['body'].read.return_value = json.dumps({
+        "output": {"message": {"content": [{"text": "Summary."}]}},
+        "usage": {"inputTokens": 20, "outputTokens": 10, "cacheReadInputTokenCount": 1500,
+                  "cacheWriteInputTokenCount": 0}
+    })
+    mock_bedrock_client.invoke_model.return_value = mock_response
+    metrics = instrumentation.RequestMetrics()
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    app.generate_summary("Long page. " * 500, "Summarize this", model, metrics=metrics)
+    
+    counters = metrics.to_dict()
+    assert counters["cache_read_tokens"] == 1500
+    assert counters["cache_write_tokens"] == 0
+    units = {metric["Name"]: metric["Unit"] for metric in
+             metrics.emf_record("WebsiteToText", {"Function": "website_to_text"})["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert units["cache_read_tokens"] == "Count"
+
+def test_generate_summary_stream_records_prompt_cache_usage(mock_bedrock_client):
+    mock_bedrock_client.invoke_model_with_response_stream.return_value = _stream(
+        {"contentBlockDelta": {"delta": {"text": "Hello"}, "contentBlockIndex": 0}},
+        {"messageStop": {"stopReason": "end_turn"}, "amazon-bedrock-invocationMetrics": {
+            "inputTokenCount": 20, "outputTokenCount": 1,
+            "cacheReadInputTokenCount": 0, "cacheWriteInputTokenCount": 1500
+        }}
+    )
+    metrics = instrumentation.RequestMetrics()
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    list(app.generate_summary_stream("Long page. " * 500, "Summarize this", model, metrics=metrics))
+    
+    assert metrics.to_dict()["cache_write_tokens"] == 1500
+
+def test_classify_prompt():
+    assert router.classify_prompt("Suggest a title for this page") == "title"
+    assert router.classify_prompt("Compare the two products") == "analysis"
+    assert router.classify_prompt("List the key points") == "extract"
+    assert router.classify_prompt("Provide a concise summary of the main points") == "summary"
+    assert router.classify_prompt("What is the price?") == "general"
+
+def test_model_router_rules_and_latency_target():
+    model_router = router.ModelRouter()
+    micro, lite, pro = model_router.models
+    
+    assert model_router.route(500, "summary") == [micro]
+    assert model_router.route(3000, "summary") == [lite, micro]
+    assert model_router.route(20000, "summary") == [pro, lite, micro]
+    assert model_router.route(20000, "title") == [micro]
+    assert model_router.route(500, "analysis") == [pro, lite, micro]
+    # Pro is estimated at 1500 + 180 * 20 = 5100 ms, lite at 700 + 70 * 20 = 2100 ms
+    assert model_router.route(20000, "summary", latency_target_ms=3000) == [lite, micro]
+    assert model_router.route(20000, "summary", latency_target_ms=1) == [micro]
+
+def test_model_router_from_config():
+    table = {
+        "models": [{"model": "fast"}, {"model": "slow"}],
+        "rules": [{"max_tokens": 100, "model": "fast"}, {"model": "slow"}]
+    }
+    
+    assert router.ModelRouter.from_config(json.dumps(table)).route(1000) == ["slow", "fast"]
+    assert router.ModelRouter.from_config().models == router.ModelRouter().models
+    for bad in ("not json", json.dumps({"models": [{"model": "fast"}], "rules": [{"model": "slow"}]}),
+                json.dumps({"models": [{"model": "fast"}], "rules": [{"max_tokens": 1, "model": "fast"}]})):
+        with pytest.raises(ValueError, match="Invalid routing table"):
+            router.ModelRouter.from_config(bad)
+
+def test_model_router_uses_profiles_of_the_bedrock_region():
+    assert router.ModelRouter(region="eu-west-1").models == [
+        "eu.amazon.nova-micro-v1:0", "eu.amazon.nova-lite-v1:0", "eu.amazon.nova-pro-v1:0"
+    ]
+    assert router.ModelRouter.from_config(region="ap-northeast-1").route(500, "summary") == [
+        "apac.amazon.nova-micro-v1:0"
+    ]
+    assert router.ModelRouter(region="us-west-2").models == router.ModelRouter().models
+    # Regions without cross-region profiles keep the US table
+    assert router.ModelRouter(region="me-central-1").models == router.ModelRouter().models
+
+def test_model_used_reports_the_invoked_profile(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    configured = "arn:aws:bedrock:us-west-2:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    with patch.object(app.profile_resolver, 'configured_arn', configured):
+        status, first = _handle({"url": "https://example.com", "model": "amazon.nova-micro-v1:0"})
+        status, second = _handle({"url": "https://example.com", "model": "amazon.nova-micro-v1:0"})
+    
+    # The configured profile answered, whatever Nova model was asked for
+    assert mock_bedrock_client.invoke_model.call_args[1]["modelId"] == configured
+    assert first["model_used"] == configured
+    assert second["cached"] is True and second["model_used"] == configured
+
+def test_lambda_handler_routes_request_without_model(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Short page"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    
+    status, body = _handle({"url": "https://example.com"})
+    
+    assert status == 200
+    assert body["model_used"] == "us.amazon.nova-micro-v1:0"
+    assert mock_bedrock_client.invoke_model.call_args[1]["modelId"] == "us.amazon.nova-micro-v1:0"
+    mock_bedrock_client.list_inference_profiles.assert_not_called()
+
+def test_lambda_handler_falls_back_to_faster_model_when_throttled(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Page\n\n" + "Some words here. " * 500
+    throttled = ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+    mock_bedrock_client.invoke_model.side_effect = [throttled, _nova_response("Summary.")]
+    
+    with patch.object(app, 'BEDROCK_MAX_RETRIES', 0):
+        status, body = _handle({"url": "https://example.com", "model": "auto"})
+    
+    assert status == 200
+    assert body["summary"] == "Summary."
+    assert body["model_used"] == "us.amazon.nova-micro-v1:0"
+    invoked = [call[1]["modelId"] for call in mock_bedrock_client.invoke_model.call_args_list]
+    assert invoked == ["us.amazon.nova-lite-v1:0", "us.amazon.nova-micro-v1:0"]
+    
+    # The fallback answer is cached under the model that produced it
+    status, body = _handle({"url": "https://example.com", "model": "us.amazon.nova-micro-v1:0"})
+    assert body["cached"] is True
+
+def test_lambda_handler_explicit_model_bypasses_routing(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Short page"
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    status, body = _handle({"url": "https://example.com", "model": model, "latency_target_ms": 1})
+    
+    assert status == 200
+    assert body["model_used"] == model
+    assert mock_bedrock_client.invoke_model.call_args[1]["modelId"] == model
+
+def test_lambda_handler_rejects_invalid_routing_options(mock_trafilatura):
+    for body in ({"url": "https://example.com", "prompt_class": "poem"},
+                 {"url": "https://example.com", "latency_target_ms": 0},
+                 {"url": "https://example.com", "latency_target_ms": "fast"}):
+        status, response = _handle(body)
+        assert status == 400
+        assert response["error"] == "Invalid parameter"
+
+@pytest.mark.parametrize("prompt", [123, None, "", "   ", ["Summarize"]])
+def test_lambda_handler_rejects_invalid_prompt(mock_trafilatura, prompt):
+    mock_fetch, mock_extract = mock_trafilatura
+    
+    for body in ({"url": "https://example.com", "prompt": prompt},
+                 {"url": "https://example.com", "prompt": prompt, "async": True}):
+        status, response = _handle(body)
+        assert status == 400
+        assert response["details"] == "prompt must be a non-empty string"
+    
+    records = [json.loads(line) for line in app.stream_handler(
+        {"body": json.dumps({"url": "https://example.com", "prompt": prompt})}, None)]
+    assert records[0]["statusCode"] == 400
+    assert app.job_queue.receive(10) == []
+    mock_fetch.assert_not_called()
+
+def test_stream_handler_falls_back_before_first_delta(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Short page"
+    throttled = ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}},
+                            'InvokeModelWithResponseStream')
+    mock_bedrock_client.invoke_model_with_response_stream.side_effect = [
+        throttled, _stream({"contentBlockDelta": {"delta": {"text": "Streamed."}}})
+    ]
+    
+    event = {"body": json.dumps({"url": "https://example.com", "prompt_class": "analysis"})}
+    with patch.object(app, 'BEDROCK_MAX_RETRIES', 0):
+        records = [json.loads(line) for line in app.stream_handler(event, None)]
+    
+    assert records[0]["model_used"] == "us.amazon.nova-pro-v1:0"
+    assert records[1] == {"type": "delta", "text": "Streamed."}
+    assert records[-1]["model_used"] == "us.amazon.nova-lite-v1:0"
+
+def _throttled(operation='InvokeModel'):
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, operation)
+
+def test_adaptive_limiter_aimd():
+    aimd = limiter.AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=5)
+    
+    tickets = [aimd.acquire(timeout=0) for _ in range(4)]
+    assert None not in tickets
+    assert aimd.acquire(timeout=0) is None
+    
+    # Calls throttled together cut the limit once
+    for ticket in tickets:
+        aimd.release(ticket, throttled=True)
+    assert aimd.limit == 2 and aimd.in_flight == 0 and aimd.throttles == 4
+    
+    # Each success adds 1 / limit, and the limit never passes max_limit
+    for _ in range(50):
+        aimd.release(aimd.acquire(timeout=0))
+    assert aimd.limit == 5
+
+def test_backoff_delay_is_jittered_and_capped():
+    assert limiter.backoff_delay(0, 0.25, 4.0, rng=lambda: 0.5) == 0.125
+    assert limiter.backoff_delay(3, 0.25, 4.0, rng=lambda: 0.999) == pytest.approx(1.998)
+    assert limiter.backoff_delay(10, 0.25, 4.0, rng=lambda: 0.999) == pytest.approx(3.996)
+
+def test_generate_summary_retries_throttled_calls(mock_bedrock_client):
+    mock_bedrock_client.invoke_model.side_effect = [_throttled(), _throttled(), _nova_response("Summary.")]
+    metrics = instrumentation.RequestMetrics()
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    with patch.object(app.time, 'sleep') as mock_sleep:
+        summary = app.generate_summary("Test content", "Summarize this", model, metrics=metrics)
+    
+    assert summary == "Summary."
+    assert mock_sleep.call_count == 2
+    counters = metrics.to_dict()
+    assert counters["bedrock_throttles"] == 2
+    assert counters["bedrock_retries"] == 2
+    assert counters["bedrock_in_flight"] == 1
+    assert app.bedrock_limiter.in_flight == 0
+    assert app.bedrock_limiter.limit < app.BEDROCK_INITIAL_CONCURRENCY
+
+def test_generate_summary_gives_up_after_max_retries(mock_bedrock_client):
+    mock_bedrock_client.invoke_model.side_effect = _throttled()
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    with patch.object(app.time, 'sleep'):
+        with pytest.raises(router.ModelThrottled):
+            app.generate_summary("Test content", "Summarize this", model)
+    
+    assert mock_bedrock_client.invoke_model.call_count == app.BEDROCK_MAX_RETRIES + 1
+    assert app.bedrock_limiter.in_flight == 0
+
+def test_generate_summary_does_not_retry_past_deadline(mock_bedrock_client):
+    mock_bedrock_client.invoke_model.side_effect = _throttled()
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    with patch.object(app.limiter, 'backoff_delay', return_value=30), patch.object(app.time, 'sleep') as mock_sleep:
+        with pytest.raises(router.ModelThrottled):
+            app.generate_summary("Test content", "Summarize this", model, deadline=deadline.Deadline(20))
+    
+    mock_sleep.assert_not_called()
+
+def test_generate_summary_waits_for_limiter_slot(mock_bedrock_client):
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    tickets = [app.bedrock_limiter.acquire(timeout=0) for _ in range(app.BEDROCK_INITIAL_CONCURRENCY)]
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    call = MagicMock()
+    
+    with pytest.raises(deadline.DeadlineExceeded, match="Bedrock capacity"):
+        app.invoke_bedrock(call, deadline.Deadline(0.05))
+    call.assert_not_called()
+    
+    # A call finishing elsewhere frees the slot
+    threading.Timer(0.1, app.bedrock_limiter.release, args=(tickets.pop(),)).start()
+    assert app.generate_summary("Test content", "Summarize this", model, deadline=deadline.Deadline(20)) == "Summary."
+    
+    for ticket in tickets:
+        app.bedrock_limiter.release(ticket)
+
+def test_generate_summary_stream_holds_slot_until_read(mock_bedrock_client):
+    mock_bedrock_client.invoke_model_with_response_stream.return_value = _stream(
+        {"contentBlockDelta": {"delta": {"text": "Hello"}, "contentBlockIndex": 0}}
+    )
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    stream = app.generate_summary_stream("Test content", "Summarize this", model)
+    assert next(stream) == "Hello"
+    assert app.bedrock_limiter.in_flight == 1
+    assert list(stream) == []
+    assert app.bedrock_limiter.in_flight == 0
+
+SITEMAP = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://docs.example.com/guide</loc></url>
+  <url><loc>https://other.example.com/elsewhere</loc></url>
+</urlset>"""
+
+SITEMAP_INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://docs.example.com/sitemap-pages.xml</loc></sitemap>
+</sitemapindex>"""
+
+def test_parse_sitemap_and_index():
+    assert crawler.parse_sitemap(SITEMAP) == (
+        ["https://docs.example.com/guide", "https://other.example.com/elsewhere"], []
+    )
+    assert crawler.parse_sitemap(gzip.compress(SITEMAP_INDEX)) == (
+        [], ["https://docs.example.com/sitemap-pages.xml"]
+    )
+    with pytest.raises(ValueError, match="Invalid sitemap"):
+        crawler.parse_sitemap(b"<html>not a sitemap")
+
+def test_extract_links_keeps_same_host_pages():
+    markdown = ("See [setup](/setup#install), [api](api/), [again](https://docs.example.com/setup), "
+                "[pdf](/manual.pdf), [mail](mailto:a@example.com) and [other](https://other.example.com/x).")
+    
+    assert crawler.extract_links(markdown, "https://docs.example.com/guide/") == [
+        "https://docs.example.com/setup", "https://docs.example.com/guide/api/"
+    ]
+    assert crawler.normalize_url("https://docs.example.com") == "https://docs.example.com/"
+
+def test_host_throttle_spaces_requests_to_a_host():
+    throttle = crawler.HostThrottle(concurrency=1, delay=0.05)
+    started = []
+    
+    def visit(url):
+        with throttle.slot(url):
+            started.append((url, time.monotonic()))
+    
+    threads = [threading.Thread(target=visit, args=(f"https://a.example.com/{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    times = sorted(start for _, start in started)
+    assert all(later - earlier >= 0.045 for earlier, later in zip(times, times[1:]))
+
+def _site(pages):
+    def fetch_page(url):
+        if url not in pages:
+            raise ValueError("Failed to download content from URL")
+        return pages[url]
+    return fetch_page
+
+def test_crawler_respects_depth_and_page_limits():
+    pages = {
+        "https://docs.example.com/": "[a](/a) [b](/b)",
+        "https://docs.example.com/a": "[c](/c)",
+        "https://docs.example.com/b": "",
+        "https://docs.example.com/c": "[d](/d)",
+        "https://docs.example.com/guide": ""
+    }
+    
+    def process_page(url, depth, content, error):
+        return {"url": url, "depth": depth, "error": error is not None}
+    
+    site = crawler.Crawler(_site(pages), process_page, fetch_sitemap=lambda url: SITEMAP, max_pages=10,
+                           max_depth=2, workers=2)
+    records = {record["url"]: record["depth"] for record in site.crawl("https://docs.example.com")}
+    assert records == {
+        "https://docs.example.com/": 0,
+        "https://docs.example.com/guide": 1,
+        "https://docs.example.com/a": 1,
+        "https://docs.example.com/b": 1,
+        "https://docs.example.com/c": 2
+    }
+    assert site.stopped is None
+    
+    site = crawler.Crawler(_site(pages), process_page, max_pages=2, max_depth=3, workers=1)
+    assert len(list(site.crawl("https://docs.example.com/"))) == 2
+    assert site.stopped == crawler.STOP_MAX_PAGES
+
+def test_stream_handler_crawl_streams_page_records(mock_bedrock_client):
+    pages = {
+        "https://docs.example.com/": "# Home\n\n[Setup](/setup) [Missing](/missing)",
+        "https://docs.example.com/setup": "# Setup",
+        "https://docs.example.com/guide": "# Guide"
+    }
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    body = {"url": "https://docs.example.com/", "crawl": {"max_pages": 10, "max_depth": 1},
+            "model": "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0",
+            "content_mode": "none"}
+    
+    with patch.object(app, 'extract_content', side_effect=lambda url, deadline, metrics: _site(pages)(url)), \
+            patch.object(app, 'fetch_sitemap', return_value=SITEMAP):
+        stream = app.stream_handler({"body": json.dumps(body)}, None)
+        first = json.loads(next(stream))
+        records = [first] + [json.loads(line) for line in stream]
+    
+    assert first["type"] == "page"
+    page_records = {record["url"]: record for record in records if record["type"] == "page"}
+    assert set(page_records) == set(pages) | {"https://docs.example.com/missing"}
+    assert page_records["https://docs.example.com/setup"]["summary"] == "Summary."
+    assert page_records["https://docs.example.com/setup"]["depth"] == 1
+    assert page_records["https://docs.example.com/missing"]["statusCode"] == 400
+    assert records[-1]["type"] == "done"
+    assert records[-1]["pages"] == 4 and records[-1]["failed"] == 1
+    assert records[-1]["stopped"] is None
+
+def test_crawl_request_validation():
+    for body in ({"url": "https://example.com", "crawl": {"max_pages": 0}},
+                 {"url": "https://example.com", "crawl": {"max_depth": app.CRAWL_MAX_DEPTH + 1}},
+                 {"url": "https://example.com", "crawl": "yes"},
+                 {"url": "https://example.com", "crawl": True, "prompts": ["a"]}):
+        records = [json.loads(line) for line in app.stream_handler({"body": json.dumps(body)}, None)]
+        assert records[-1]["statusCode"] == 400
+    
+    status, response = _handle({"url": "https://example.com", "crawl": True})
+    assert status == 400
+    assert "async" in response["details"]
+    
+    status, response = _handle({"url": "https://example.com", "crawl": {"max_pages": 0}, "async": True})
+    assert status == 400
+    assert "max_pages" in response["details"]
+    assert app.job_queue.receive(10) == []
+
+def test_async_crawl_job_stores_page_results(mock_bedrock_client):
+    pages = {
+        "https://docs.example.com/": "# Home\n\n[Setup](/setup)",
+        "https://docs.example.com/setup": "# Setup",
+        "https://docs.example.com/guide": "# Guide"
+    }
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    body = {"url": "https://docs.example.com/", "crawl": {"max_pages": 10, "max_depth": 1}, "async": True,
+            "model": "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0",
+            "content_mode": "none"}
+    
+    status, submitted = _handle(body)
+    assert status == 202
+    store_progress = app.job_queue.progress
+    polled = []
+    
+    def progress(job_id, partial):
+        store_progress(job_id, partial)
+        polled.append(_poll(job_id)[1])
+    
+    with patch.object(app, 'extract_content', side_effect=lambda url, deadline, metrics: _site(pages)(url)), \
+            patch.object(app, 'fetch_sitemap', return_value=SITEMAP), \
+            patch.object(app, 'JOB_PROGRESS_INTERVAL_SECONDS', 0), \
+            patch.object(app.job_queue, 'progress', side_effect=progress):
+        assert app.job_worker({}, None)["processed"] == 1
+    
+    # Every finished page was visible to polling while the crawl was still running
+    assert [view["status"] for view in polled] == ["running"] * 3
+    assert [view["progress"]["pages"] for view in polled] == [1, 2, 3]
+    assert all("result" not in view for view in polled)
+    
+    job = _poll(submitted["job_id"])[1]
+    assert job["status"] == "succeeded"
+    result = job["result"]
+    assert result["pages"] == 3 and result["failed"] == 0
+    assert "type" not in result
+    assert {page["url"] for page in result["results"]} == set(pages)
+    setup = next(page for page in result["results"] if page["url"] == "https://docs.example.com/setup")
+    assert setup["summary"] == "Summary."
+    assert setup["depth"] == 1
+    assert "type" not in setup
+
+ARTICLE = " ".join(
+    f"Paragraph {index} explains how the release changes deployment, monitoring and rollback for every service."
+    for index in range(30)
+)
+
+def test_canonicalize_url_drops_tracking_parameters():
+    assert similarity.canonicalize_url(
+        "HTTPS://Example.COM:443/post?utm_source=x&b=2&fbclid=abc&a=1#comments"
+    ) == "https://example.com/post?a=1&b=2"
+    assert similarity.canonicalize_url("http://example.com:8080") == "http://example.com:8080/"
+    assert similarity.canonicalize_url("https://example.com/post/amp") == "https://example.com/post/amp"
+
+def test_simhash_distance_reflects_similarity():
+    variant = ARTICLE.replace("Paragraph 7 explains", "Paragraph 7 describes") + " Share this article."
+    unrelated = " ".join(f"Recipe step {index}: whisk the eggs and fold in flour slowly." for index in range(30))
+    
+    assert similarity.simhash(ARTICLE) == similarity.simhash(ARTICLE.upper())
+    assert similarity.hamming_distance(similarity.simhash(ARTICLE), similarity.simhash(variant)) <= 3
+    assert similarity.hamming_distance(similarity.simhash(ARTICLE), similarity.simhash(unrelated)) > 10
+    assert similarity.simhash("two words") is None
+
+def test_similarity_index_nearest_and_eviction():
+    index = similarity.SimilarityIndex(max_distance=3, max_entries=2)
+    all_ones = (1 << 64) - 1
+    index.add("a", 0b1111, "https://a.example.com/")
+    index.add("b", all_ones, "https://b.example.com/")
+    
+    match = index.nearest(0b0111)
+    assert match == {"digest": "a", "url": "https://a.example.com/", "distance": 1, "similarity": 0.9844}
+    assert index.nearest(0b0111, exclude="a") is None
+    assert index.nearest(all_ones ^ 0b11111) is None
+    assert index.nearest(all_ones ^ 0b111)["digest"] == "b"
+    
+    index.add("c", 0, None)
+    assert len(index) == 2
+    # "b" was matched last, so the least recently used "a" was dropped
+    assert index.nearest(0b1111) is None
+    assert index.nearest(all_ones)["digest"] == "b"
+    assert index.nearest(0b0011)["digest"] == "c"
+
+def test_similarity_index_skips_entries_of_excluded_url():
+    index = similarity.SimilarityIndex(max_distance=3)
+    index.add("old", 0b0001, "https://example.com/page")
+    index.add("mirror", 0b0110, "https://mirror.example.com/page")
+    
+    assert index.nearest(0b0011)["digest"] == "old"
+    assert index.nearest(0b0011, exclude_url="https://example.com/page")["digest"] == "mirror"
+    index.add("mirror", 0b0110, "https://example.com/page")
+    assert index.nearest(0b0011, exclude_url="https://example.com/page") is None
+
+def test_lambda_handler_reuses_summary_of_near_duplicate(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.side_effect = [ARTICLE, ARTICLE + " Read the AMP version."]
+    mock_bedrock_client.invoke_model.return_value = _nova_response("Summary.")
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    status, first = _handle({"url": "https://example.com/post?utm_source=feed", "model": model})
+    status, second = _handle({"url": "https://example.com/post/amp", "model": model, "timings": True})
+    
+    assert status == 200
+    assert first["cached"] is False and "duplicate_of" not in first
+    assert second["summary"] == "Summary."
+    assert second["cached"] is True
+    assert second["duplicate_of"]["url"] == "https://example.com/post"
+    assert second["duplicate_of"]["similarity"] >= 0.95
+    assert second["timings"]["near_duplicates"] == 1
+    assert mock_bedrock_client.invoke_model.call_count == 1
+
+def test_lambda_handler_summarizes_updated_page_again(mock_trafilatura, mock_bedrock_client):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.side_effect = [ARTICLE + " The price is 10.", ARTICLE + " The price is 99."]
+    mock_bedrock_client.invoke_model.side_effect = [_nova_response("Costs 10."), _nova_response("Costs 99.")]
+    model = "arn:aws:bedrock:us-east-1:123:inference-profile/us.amazon.nova-pro-v1:0"
+    
+    status, first = _handle({"url": "https://example.com/product", "model": model})
+    status, second = _handle({"url": "https://example.com/product?utm_source=feed", "model": model})
+    
+    # A changed page is not a mirror of its own earlier version
+    assert status == 200
+    assert second["summary"] == "Costs 99."
+    assert second["cached"] is False and "duplicate_of" not in second
+    assert mock_bedrock_client.invoke_model.call_count == 2
+
+def test_content_cache_shares_entries_across_tracking_variants(mock_trafilatura):
+    mock_fetch, mock_extract = mock_trafilatura
+    mock_fetch.return_value = _page("<html><body>Test</body></html>")
+    mock_extract.return_value = "# Test Content"
+    
+    with patch.object(app.content_cache, 'fresh_seconds', 60):
+        app.extract_content("https://example.com/post?utm_campaign=spring")
+        app.extract_content("https://example.com/post?gclid=123")
+    
+    assert mock_fetch.call_count == 1
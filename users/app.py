@@ -1,20 +1,123 @@
+import base64
+import binascii
+import hashlib
 import json
 import boto3
 import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
+try:
+    from . import cache
+except ImportError:
+    # Lambda loads app.py as a top-level module, so siblings are imported directly
+    import cache
+
 # Initialize Cognito client with a default region
 # The region will be overridden by AWS_REGION environment variable when deployed
 region = os.environ.get('AWS_REGION', 'us-east-1')
 cognito = boto3.client('cognito-idp', region_name=region)
 
+USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'memory')  # memory, disk or none
+USER_CACHE_MAX_BYTES = int(os.environ.get('USER_CACHE_MAX_BYTES', 1024 * 1024))
+USER_CACHE_DIR = os.environ.get('USER_CACHE_DIR', '/tmp/users/cache')
+USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 60))  # How long user details are served from the cache
+USER_CACHE_NEGATIVE_TTL_SECONDS = int(os.environ.get('USER_CACHE_NEGATIVE_TTL_SECONDS', 30))  # Same for users that were not found
+
+# Lives at module level so warm invocations keep serving from it
+user_cache = cache.UserCache(
+    cache.create_backend(USER_CACHE_BACKEND, USER_CACHE_MAX_BYTES, USER_CACHE_DIR),
+    ttl=USER_CACHE_TTL_SECONDS,
+    negative_ttl=USER_CACHE_NEGATIVE_TTL_SECONDS
+)
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'  # Write the user cache counters as EMF log lines
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Users')
+
+BULK_MAX_USERS = int(os.environ.get('BULK_MAX_USERS', 500))  # Most users in one bulk POST
+CREATE_WORKERS = int(os.environ.get('CREATE_WORKERS', 8))  # Users created at once by a bulk POST
+CREATE_MAX_RETRIES = int(os.environ.get('CREATE_MAX_RETRIES', 4))  # Retries of a throttled Cognito call
+CREATE_RETRY_BASE_SECONDS = float(os.environ.get('CREATE_RETRY_BASE_SECONDS', 0.2))
+CREATE_RETRY_MAX_SECONDS = float(os.environ.get('CREATE_RETRY_MAX_SECONDS', 3.0))
+BULK_DEADLINE_MARGIN_SECONDS = float(os.environ.get('BULK_DEADLINE_MARGIN_SECONDS', 1.0))  # Time kept back to return the results
+
+# Error codes of a Cognito call that was throttled rather than rejected
+THROTTLE_ERROR_CODES = ('TooManyRequestsException', 'ThrottlingException')
+
+# Cognito returns at most 60 users per ListUsers call
+MAX_PAGE_SIZE = 60
+DEFAULT_PAGE_SIZE = min(int(os.environ.get('LIST_USERS_DEFAULT_LIMIT', MAX_PAGE_SIZE)), MAX_PAGE_SIZE)
+# Lambda responses are capped at 6 MB, and the body's quotes are escaped again inside the response
+SCAN_MAX_BYTES = int(os.environ.get('SCAN_MAX_BYTES', 4 * 1024 * 1024))  # Largest ?all=true body before it ends with a cursor
+
+# Query parameters that become a Cognito ListUsers filter, and the attribute each one searches.
+# Cognito only searches these attributes and accepts one filter per call.
+FILTER_ATTRIBUTES = {
+    'username': 'username',
+    'email': 'email',
+    'phone_number': 'phone_number',
+    'name': 'name',
+    'given_name': 'given_name',
+    'family_name': 'family_name',
+    'preferred_username': 'preferred_username',
+    'sub': 'sub',
+    'status': 'cognito:user_status',
+    'enabled': 'status'
+}
+# Fields of a listed user that are not user attributes
+USER_FIELDS = ('username', 'enabled', 'status', 'created')
+ATTRIBUTE_NAME = re.compile(r'^[\w:.-]{1,64}$')
+
 def lambda_handler(event, context):
     """
     Lambda handler for user endpoints.
-    GET /users - List all users
+    GET /users - List users one page at a time (?limit=&cursor=), or as NDJSON up to SCAN_MAX_BYTES (?all=true&cursor=)
     GET /users/{username} - Get specific user details
-    POST /users - Create a new user
+    POST /users - Create a new user, or many users from a JSON array
+    """
+    try:
+        return _route(event, context)
+    finally:
+        _emit_cache_metrics()
+
+def _emit_cache_metrics():
     """
+    Write the user cache's counters as an Embedded Metric Format log line
+    
+    The counters add up over the lifetime of the execution environment.
+    CloudWatch Logs turns them into metrics named `user_cache_hits`,
+    `user_cache_hit_rate` and so on, without an API call during the request.
+    A metrics failure never breaks the response.
+    """
+    if not METRICS_ENABLED:
+        return
+    try:
+        values = {f'user_cache_{name}': value for name, value in user_cache.stats().items()}
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Function']],
+                    'Metrics': [
+                        {'Name': name, 'Unit': 'None' if name.endswith('_rate') else
+                         'Bytes' if name.endswith('_bytes') else 'Count'}
+                        for name in values
+                    ]
+                }]
+            },
+            'Function': 'users'
+        }
+        record.update(values)
+        print(json.dumps(record))
+    except Exception as e:
+        print(f'Failed to emit metrics: {str(e)}')
+
+def _route(event, context):
+    """Dispatch a request to the handler for its method and path"""
     # Get HTTP method
     http_method = event.get('httpMethod', '')
     
@@ -23,15 +126,31 @@ def lambda_handler(event, context):
     if path_parameters is None:
         path_parameters = {}
     
+    query_parameters = event.get('queryStringParameters') or {}
+    
     # Get the username if provided in the path
     username = path_parameters.get('username')
     
+    # Conditional GETs answer 304 when the client's copy is current
+    if_none_match = _header(event, 'If-None-Match')
+    
     # Route the request based on HTTP method and path
     if http_method == 'GET':
         if username:
-            return get_user(username)
-        else:
-            return list_users()
+            return get_user(username, if_none_match)
+        try:
+            options = parse_list_query(query_parameters)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'error': str(e)
+                })
+            }
+        if query_parameters.get('all') == 'true':
+            return scan_users(query_parameters.get('cursor'), **options)
+        return list_users(query_parameters.get('limit'), query_parameters.get('cursor'), if_none_match=if_none_match,
+                          **options)
     elif http_method == 'POST':
         # Parse the request body for user creation
         try:
@@ -43,7 +162,10 @@ def lambda_handler(event, context):
                     'error': 'Invalid JSON in request body'
                 })
             }
-        return create_user(body)
+        # A JSON array creates every user in it
+        if isinstance(body, list):
+            return create_users(body, context)
+        return create_user(body, context)
     else:
         return {
             'statusCode': 405,
@@ -52,35 +174,335 @@ def lambda_handler(event, context):
             })
         }
 
-def list_users():
-    """List all users in the Cognito User Pool"""
+def _header(event, name):
+    """Get a request header, whatever case the client sent it in"""
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def _etag(data):
+    """Strong ETag of serialized data"""
+    return '"' + hashlib.sha256(data.encode('utf-8')).hexdigest()[:32] + '"'
+
+def user_etag(user):
+    """
+    Strong ETag of a user's details
+    
+    Derived from the last modification date together with the attributes and
+    account state, so it changes whenever the returned user would.
+    """
+    return _etag(json.dumps({
+        'username': user.get('username'),
+        'enabled': user.get('enabled'),
+        'status': user.get('status'),
+        'lastModified': user.get('lastModified'),
+        'attributes': user.get('attributes')
+    }, sort_keys=True))
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against an ETag, comparing weakly as RFC 7232 asks"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return any((candidate[2:] if candidate.startswith('W/') else candidate) == etag for candidate in candidates)
+
+def _not_modified(etag, headers=None):
+    """Build a 304 response, which has no body"""
+    return {
+        'statusCode': 304,
+        'headers': dict(headers or {}, ETag=etag),
+        'body': ''
+    }
+
+def stream_handler(event, context):
+    """
+    Response-streaming entry point for a full scan of the User Pool
+    
+    Writes one NDJSON record per user as Cognito pages arrive, then a final
+    record with the count, so only one page is held in memory at a time.
+    Accepts the same filter and `fields` query parameters as GET /users.
+    The managed Python runtime cannot stream a generator, so template.yaml
+    does not deploy this; the API pages through ?all=true with cursors.
+    
+    Yields:
+        bytes: NDJSON encoded records
+    """
+    try:
+        options = parse_list_query((event or {}).get('queryStringParameters') or {})
+    except ValueError as e:
+        yield (json.dumps({'error': str(e), 'count': 0}) + '\n').encode('utf-8')
+        return
+    for line in iter_user_records(os.environ.get('USER_POOL_ID'), **options):
+        yield line.encode('utf-8')
+
+def _quote(value):
+    """Quote a value for a Cognito filter expression"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def build_filter(query_parameters):
+    """
+    Turn filter query parameters into a Cognito ListUsers filter expression
+    
+    `<name>=value` matches exactly and `<name>_prefix=value` matches the start,
+    for each name in FILTER_ATTRIBUTES. `status` is the account status, such as
+    CONFIRMED, and `enabled` takes true or false.
+    
+    Returns:
+        str: The filter expression, or None if no filter was given
+        
+    Raises:
+        ValueError: If more than one filter is given or a value is invalid
+    """
+    filters = []
+    for name, attribute in FILTER_ATTRIBUTES.items():
+        for parameter, operator in ((name, '='), (f'{name}_prefix', '^=')):
+            value = query_parameters.get(parameter)
+            if value is None:
+                continue
+            if name == 'enabled':
+                if operator != '=' or value not in ('true', 'false'):
+                    raise ValueError('enabled must be true or false')
+                value = 'Enabled' if value == 'true' else 'Disabled'
+            if not value:
+                raise ValueError(f'{parameter} must not be empty')
+            filters.append(f'{attribute} {operator} {_quote(value)}')
+    if len(filters) > 1:
+        raise ValueError('Only one filter can be used at a time')
+    return filters[0] if filters else None
+
+def parse_fields(fields):
+    """
+    Parse a `fields` projection
+    
+    Args:
+        fields (str): Comma-separated names from USER_FIELDS and user attributes
+        
+    Returns:
+        tuple: The USER_FIELDS to return and the attributes to fetch from Cognito,
+            or None if no projection was given
+            
+    Raises:
+        ValueError: If a name is invalid
+    """
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    if not names:
+        raise ValueError('fields must name at least one field')
+    for name in names:
+        if not ATTRIBUTE_NAME.match(name):
+            raise ValueError(f'Invalid field: {name}')
+    user_fields = [name for name in names if name in USER_FIELDS]
+    attributes = [name for name in names if name not in USER_FIELDS]
+    return user_fields, attributes
+
+def parse_list_query(query_parameters):
+    """
+    Read the filter and projection of a user listing from its query parameters
+    
+    Returns:
+        dict: 'filter_expression' and 'fields' keyword arguments for the listing functions
+        
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    return {
+        'filter_expression': build_filter(query_parameters),
+        'fields': parse_fields(query_parameters.get('fields'))
+    }
+
+def encode_cursor(pagination_token):
+    """Wrap a Cognito pagination token in an opaque, URL-safe cursor"""
+    if not pagination_token:
+        return None
+    payload = json.dumps({'token': pagination_token}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Get the Cognito pagination token back from a cursor
+    
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        token = json.loads(payload.decode('utf-8'))['token']
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(token, str) or not token:
+        raise ValueError('Invalid cursor')
+    return token
+
+def iter_user_pages(user_pool_id, page_size=MAX_PAGE_SIZE, pagination_token=None, filter_expression=None,
+                    attributes=None):
+    """
+    Pull pages of users from Cognito on demand
+    
+    Args:
+        user_pool_id (str): The User Pool ID
+        page_size (int, optional): Users per Cognito call, at most MAX_PAGE_SIZE
+        pagination_token (str, optional): Token to resume from
+        filter_expression (str, optional): Cognito filter, see build_filter
+        attributes (list, optional): Attributes Cognito returns for each user, all of them if None
+        
+    Yields:
+        tuple: The page's raw Cognito users and the token of the next page, or None after the last page
+    """
+    while True:
+        params = {'UserPoolId': user_pool_id, 'Limit': page_size}
+        if pagination_token:
+            params['PaginationToken'] = pagination_token
+        if filter_expression:
+            params['Filter'] = filter_expression
+        if attributes is not None:
+            params['AttributesToGet'] = attributes
+        response = cognito.list_users(**params)
+        pagination_token = response.get('PaginationToken')
+        yield response.get('Users', []), pagination_token
+        if not pagination_token:
+            return
+
+def iter_users(user_pool_id, filter_expression=None, attributes=None):
+    """Iterate over every matching user in the User Pool, one Cognito page in memory at a time"""
+    pages = iter_user_pages(user_pool_id, filter_expression=filter_expression, attributes=attributes)
+    for users, _ in pages:
+        for user in users:
+            yield user
+
+def iter_user_records(user_pool_id, filter_expression=None, fields=None, pagination_token=None, max_bytes=None):
+    """
+    Encode a scan of the User Pool as NDJSON lines
+    
+    Args:
+        user_pool_id (str): The User Pool ID
+        filter_expression (str, optional): Cognito filter, see build_filter
+        fields (tuple, optional): Projection from parse_fields
+        pagination_token (str, optional): Token of the Cognito page to start from
+        max_bytes (int, optional): Stop before the Cognito page that would take the
+            user lines past this size; the scan is never cut inside a page
+        
+    Yields:
+        str: A {"user": ...} line per user, then a {"done": true, "count": ...} line,
+            a {"done": false, "count": ..., "next_cursor": ...} line if max_bytes
+            cut the scan short, or an {"error": ...} line if Cognito fails part way
+    """
+    count = 0
+    size = 0
+    try:
+        pages = iter_user_pages(user_pool_id, MAX_PAGE_SIZE, pagination_token, filter_expression,
+                                fields[1] if fields else None)
+        for users, next_token in pages:
+            lines = [json.dumps({'user': _user_summary(user, fields)}) + '\n' for user in users]
+            page_bytes = sum(len(line) for line in lines)
+            if max_bytes and size and size + page_bytes > max_bytes:
+                # The cursor fetches this page again on the next request
+                yield json.dumps({'done': False, 'count': count, 'next_cursor': encode_cursor(pagination_token)}) + '\n'
+                return
+            yield from lines
+            count += len(lines)
+            size += page_bytes
+            pagination_token = next_token
+    except Exception as e:
+        yield json.dumps({'error': str(e), 'count': count}) + '\n'
+        return
+    yield json.dumps({'done': True, 'count': count}) + '\n'
+
+def _user_summary(user, fields=None):
+    """Extract the listed fields of a Cognito user, limited to a projection from parse_fields"""
+    if fields is None:
+        return {
+            'username': user.get('Username'),
+            'enabled': user.get('Enabled'),
+            'status': user.get('UserStatus'),
+            'created': user.get('UserCreateDate').isoformat() if user.get('UserCreateDate') else None,
+            'attributes': {attr['Name']: attr['Value'] for attr in user.get('Attributes', [])}
+        }
+    user_fields, attributes = fields
+    summary = {}
+    if 'username' in user_fields:
+        summary['username'] = user.get('Username')
+    if 'enabled' in user_fields:
+        summary['enabled'] = user.get('Enabled')
+    if 'status' in user_fields:
+        summary['status'] = user.get('UserStatus')
+    if 'created' in user_fields:
+        summary['created'] = user.get('UserCreateDate').isoformat() if user.get('UserCreateDate') else None
+    if attributes:
+        summary['attributes'] = {attr['Name']: attr['Value'] for attr in user.get('Attributes', [])
+                                 if attr['Name'] in attributes}
+    return summary
+
+def list_users(limit=None, cursor=None, filter_expression=None, fields=None, if_none_match=None):
+    """
+    List one page of users in the Cognito User Pool
+    
+    Args:
+        limit (str, optional): Users per page, 1 to MAX_PAGE_SIZE, from the query string
+        cursor (str, optional): The next_cursor of the previous page
+        filter_expression (str, optional): Cognito filter, see build_filter
+        fields (tuple, optional): Projection from parse_fields
+        if_none_match (str, optional): If-None-Match header; a page whose ETag matches returns 304
+    """
+    try:
+        page_size = DEFAULT_PAGE_SIZE if limit is None else int(limit)
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': f'limit must be an integer from 1 to {MAX_PAGE_SIZE}'
+            })
+        }
+    
     try:
         # Get the User Pool ID from environment variable
         user_pool_id = os.environ.get('USER_POOL_ID')
+        pagination_token = decode_cursor(cursor) if cursor else None
         
-        # Call Cognito to list users
-        response = cognito.list_users(
-            UserPoolId=user_pool_id,
-            Limit=60
-        )
-        
-        # Extract relevant user information
-        users = []
-        for user in response.get('Users', []):
-            user_data = {
-                'username': user.get('Username'),
-                'enabled': user.get('Enabled'),
-                'status': user.get('UserStatus'),
-                'created': user.get('UserCreateDate').isoformat() if user.get('UserCreateDate') else None,
-                'attributes': {attr['Name']: attr['Value'] for attr in user.get('Attributes', [])}
-            }
-            users.append(user_data)
+        # Fetch a single Cognito page; the cursor resumes after it
+        pages = iter_user_pages(user_pool_id, page_size, pagination_token, filter_expression,
+                                fields[1] if fields else None)
+        users, next_token = next(pages)
+        users = [_user_summary(user, fields) for user in users]
         
+        body = json.dumps({
+            'users': users,
+            'count': len(users),
+            'next_cursor': encode_cursor(next_token)
+        })
+        etag = _etag(body)
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
         return {
             'statusCode': 200,
+            'headers': {'ETag': etag},
+            'body': body
+        }
+    except ValueError as e:
+        return {
+            'statusCode': 400,
             'body': json.dumps({
-                'users': users,
-                'count': len(users)
+                'error': str(e)
+            })
+        }
+    except ClientError as e:
+        # Cognito rejects pagination tokens that are expired or belong to another pool
+        if e.response['Error']['Code'] == 'InvalidParameterException' and cursor:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'error': 'Invalid cursor'
+                })
+            }
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': str(e)
             })
         }
     except Exception as e:
@@ -91,11 +513,72 @@ def list_users():
             })
         }
 
-def get_user(username):
-    """Get details for a specific user"""
+def scan_users(cursor=None, filter_expression=None, fields=None):
+    """
+    List matching users in the Cognito User Pool as NDJSON, as many as fit in one response
+    
+    API Gateway buffers the whole body, so it is capped at SCAN_MAX_BYTES,
+    below Lambda's 6 MB response limit. A scan that does not fit ends with a
+    record carrying `next_cursor`, which continues it when passed back as
+    `cursor` with `all=true`.
+    
+    Args:
+        cursor (str, optional): The next_cursor of the previous response
+        filter_expression (str, optional): Cognito filter, see build_filter
+        fields (tuple, optional): Projection from parse_fields
+    """
+    try:
+        pagination_token = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(e)
+            })
+        }
+    user_pool_id = os.environ.get('USER_POOL_ID')
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/x-ndjson'},
+        'body': ''.join(iter_user_records(user_pool_id, filter_expression, fields, pagination_token, SCAN_MAX_BYTES))
+    }
+
+def _cache_key(user_pool_id, username):
+    """Key of a username in `user_cache`"""
+    return f'{user_pool_id}:{username}'
+
+def get_user(username, if_none_match=None):
+    """
+    Get details for a specific user
+    
+    Served from `user_cache` when the user, or the fact that it does not
+    exist, was looked up recently; the X-Cache header says which. Responses
+    carry the user's ETag, and a request whose If-None-Match matches it gets
+    a 304 without a body.
+    """
     try:
         # Get the User Pool ID from environment variable
         user_pool_id = os.environ.get('USER_POOL_ID')
+        cache_key = _cache_key(user_pool_id, username)
+        
+        cached = user_cache.get(cache_key)
+        if cached is not None:
+            if not cached['found']:
+                return {
+                    'statusCode': 404,
+                    'headers': {'X-Cache': 'HIT'},
+                    'body': json.dumps({
+                        'error': f"User '{username}' not found"
+                    })
+                }
+            etag = cached.get('etag') or user_etag(cached['user'])
+            if etag_matches(if_none_match, etag):
+                return _not_modified(etag, {'X-Cache': 'HIT'})
+            return {
+                'statusCode': 200,
+                'headers': {'X-Cache': 'HIT', 'ETag': etag},
+                'body': json.dumps(cached['user'])
+            }
         
         # Call Cognito to get user
         response = cognito.admin_get_user(
@@ -115,16 +598,23 @@ def get_user(username):
             'lastModified': response.get('UserLastModifiedDate').isoformat() if response.get('UserLastModifiedDate') else None,
             'attributes': attributes
         }
+        etag = user_etag(user)
+        user_cache.put(cache_key, user, etag)
         
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag, {'X-Cache': 'MISS'})
         return {
             'statusCode': 200,
+            'headers': {'X-Cache': 'MISS', 'ETag': etag},
             'body': json.dumps(user)
         }
     except ClientError as e:
         # Check if this is a UserNotFoundException
         if e.response['Error']['Code'] == 'UserNotFoundException':
+            user_cache.put_not_found(cache_key)
             return {
                 'statusCode': 404,
+                'headers': {'X-Cache': 'MISS'},
                 'body': json.dumps({
                     'error': f"User '{username}' not found"
                 })
@@ -144,26 +634,57 @@ def get_user(username):
             })
         }
 
-def create_user(user_data):
-    """Create a new user in Cognito User Pool"""
-    try:
-        # Get required parameters
-        email = user_data.get('email')
-        password = user_data.get('password')
-        name = user_data.get('name', '')
-        
-        # Validate required fields
-        if not email or not password:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'error': 'Email and password are required'
-                })
-            }
-        
-        # Get the User Pool ID and Client ID from environment variables
-        user_pool_id = os.environ.get('USER_POOL_ID')
+def _invocation_deadline(context):
+    """The time.monotonic() by which work must stop to return the response, or None without a context"""
+    if context is None:
+        return None
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000.0 - BULK_DEADLINE_MARGIN_SECONDS
+
+def _call_cognito(operation, deadline=None, **kwargs):
+    """
+    Call a Cognito operation, retrying when Cognito throttles it
+    
+    Throttled calls were not carried out, so they are safe to repeat. Each
+    retry waits a random time of up to CREATE_RETRY_BASE_SECONDS * 2 ** retry,
+    capped at CREATE_RETRY_MAX_SECONDS. A retry whose wait would end past
+    `deadline` is not made, and the throttling error is raised instead.
+    """
+    for attempt in range(CREATE_MAX_RETRIES + 1):
+        try:
+            return getattr(cognito, operation)(**kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in THROTTLE_ERROR_CODES or attempt == CREATE_MAX_RETRIES:
+                raise
+            wait = random.random() * min(CREATE_RETRY_MAX_SECONDS, CREATE_RETRY_BASE_SECONDS * 2 ** attempt)
+            if deadline is not None and time.monotonic() + wait >= deadline:
+                raise
+            time.sleep(wait)
+
+def create_user_result(user_data, user_pool_id, deadline=None):
+    """
+    Create a user and set their password
+    
+    Args:
+        user_data (dict): The user's email, password, name and other attributes
+        user_pool_id (str): The User Pool ID
+        deadline (float, optional): time.monotonic() after which throttled calls are not retried
         
+    Returns:
+        tuple: The status code (201, 400, 409 or 500) and the response body as a dict
+    """
+    if not isinstance(user_data, dict):
+        return 400, {'error': 'Each user must be a JSON object'}
+    
+    # Get required parameters
+    email = user_data.get('email')
+    password = user_data.get('password')
+    name = user_data.get('name', '')
+    
+    # Validate required fields
+    if not email or not password:
+        return 400, {'error': 'Email and password are required'}
+    
+    try:
         # Prepare user attributes
         user_attributes = [
             {'Name': 'email', 'Value': email},
@@ -184,7 +705,9 @@ def create_user(user_data):
                 user_attributes.append({'Name': attr_name, 'Value': str(value)})
         
         # Create the user
-        response = cognito.admin_create_user(
+        response = _call_cognito(
+            'admin_create_user',
+            deadline,
             UserPoolId=user_pool_id,
             Username=email,
             UserAttributes=user_attributes,
@@ -192,57 +715,106 @@ def create_user(user_data):
             TemporaryPassword=password
         )
         
+        # The user exists from here on, so drop any cached not-found entry for the
+        # email and for the username Cognito assigned
+        created_names = (email, response.get('User', {}).get('Username'))
+        user_cache.invalidate(*[_cache_key(user_pool_id, name) for name in created_names if name])
+        
         # Set the password as permanent (no reset required)
-        cognito.admin_set_user_password(
+        _call_cognito(
+            'admin_set_user_password',
+            deadline,
             UserPoolId=user_pool_id,
             Username=email,
             Password=password,
             Permanent=True
         )
         
+        # A lookup between the two calls cached the user as FORCE_CHANGE_PASSWORD,
+        # so drop the entries again now that the user is complete
+        user_cache.invalidate(*[_cache_key(user_pool_id, name) for name in created_names if name])
+        
         # Extract user data from response
         user = response.get('User', {})
         user_attributes = {attr['Name']: attr['Value'] for attr in user.get('Attributes', [])}
         
-        return {
-            'statusCode': 201,
-            'body': json.dumps({
-                'username': user.get('Username'),
-                'status': user.get('UserStatus'),
-                'created': user.get('UserCreateDate').isoformat() if user.get('UserCreateDate') else None,
-                'attributes': user_attributes,
-                'message': 'User created successfully'
-            })
+        return 201, {
+            'username': user.get('Username'),
+            'status': user.get('UserStatus'),
+            'created': user.get('UserCreateDate').isoformat() if user.get('UserCreateDate') else None,
+            'attributes': user_attributes,
+            'message': 'User created successfully'
         }
     except ClientError as e:
         error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
         
         if error_code == 'UsernameExistsException':
-            return {
-                'statusCode': 409,
-                'body': json.dumps({
-                    'error': f"User with email '{email}' already exists"
-                })
-            }
+            return 409, {'error': f"User with email '{email}' already exists"}
         elif error_code == 'InvalidPasswordException':
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'error': error_message
-                })
-            }
+            return 400, {'error': error_message}
         else:
-            return {
-                'statusCode': 500,
-                'body': json.dumps({
-                    'error': f"{error_code}: {error_message}"
-                })
-            }
+            return 500, {'error': f"{error_code}: {error_message}"}
     except Exception as e:
+        return 500, {'error': str(e)}
+
+def create_user(user_data, context=None):
+    """Create a new user in Cognito User Pool"""
+    # Get the User Pool ID and Client ID from environment variables
+    status_code, body = create_user_result(user_data, os.environ.get('USER_POOL_ID'), _invocation_deadline(context))
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(body)
+    }
+
+def create_users(users, context=None):
+    """
+    Create many users in one request
+    
+    Users are created on CREATE_WORKERS threads, each making the same
+    create and set-password calls as a single POST. Users not started while
+    enough of the invocation is left are reported with a 503, so the client
+    can send them again.
+    
+    Args:
+        users (list): The users, each in the single POST's format
+        context (object, optional): Lambda context, for the remaining time
+        
+    Returns:
+        dict: API response with a result per user, in request order
+    """
+    if not users or len(users) > BULK_MAX_USERS:
         return {
-            'statusCode': 500,
+            'statusCode': 400,
             'body': json.dumps({
-                'error': str(e)
+                'error': f'A bulk request must contain 1 to {BULK_MAX_USERS} users'
             })
-        }
\ No newline at end of file
+        }
+    
+    user_pool_id = os.environ.get('USER_POOL_ID')
+    deadline = _invocation_deadline(context)
+    
+    def create(user_data):
+        if deadline is not None and time.monotonic() >= deadline:
+            return 503, {'error': 'Not attempted before the request ran out of time'}
+        return create_user_result(user_data, user_pool_id, deadline)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(CREATE_WORKERS, len(users)))) as pool:
+        outcomes = list(pool.map(create, users))
+    
+    results = []
+    for user_data, (status_code, body) in zip(users, outcomes):
+        result = {'email': user_data.get('email') if isinstance(user_data, dict) else None, 'statusCode': status_code}
+        result.update(body)
+        results.append(result)
+    succeeded = sum(1 for result in results if result['statusCode'] == 201)
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'results': results,
+            'count': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        })
+    }
@@ -0,0 +1,110 @@
+import threading
+import time
+
+# The storage backends come from the shared layer, see shared/cache_backends.py
+from cache_backends import DiskBackend, MemoryBackend, create_backend  # noqa: F401
+
+
+class UserCache:
+    """
+    Read-through cache of user details keyed by username
+
+    Found users are kept for `ttl` seconds. Usernames Cognito reported as not
+    found are remembered for `negative_ttl` seconds, so polling a missing user
+    does not call Cognito every time either. Writes must `invalidate` the
+    usernames they touch.
+    """
+
+    def __init__(self, backend, ttl=60, negative_ttl=30):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def get(self, username):
+        """
+        Look up a username
+
+        Returns:
+            dict: {'found': True, 'user': ..., 'etag': ...} for a cached user,
+                {'found': False} for a cached miss, or None if Cognito has to be asked
+        """
+        if self.backend is None:
+            return None
+        entry = self.backend.get(username)
+        if entry is None:
+            self._count('misses')
+            return None
+        ttl = self.ttl if entry['found'] else self.negative_ttl
+        if time.time() - entry['stored_at'] >= ttl:
+            self.backend.delete(username)
+            self._count('expired')
+            self._count('misses')
+            return None
+        self._count('hits' if entry['found'] else 'negative_hits')
+        return entry
+
+    def put(self, username, user, etag=None):
+        """Store a user's details, with their ETag so cached responses need not recompute it"""
+        if self.backend is None:
+            return
+        self.backend.set(username, {"found": True, "user": user, "etag": etag, "stored_at": time.time()})
+
+    def put_not_found(self, username):
+        """Remember that a username does not exist"""
+        if self.backend is None or self.negative_ttl <= 0:
+            return
+        self.backend.set(username, {"found": False, "stored_at": time.time()})
+
+    def invalidate(self, *usernames):
+        """Drop the entries of usernames that were just written"""
+        if self.backend is None:
+            return
+        for username in usernames:
+            if username:
+                self.backend.delete(username)
+                self._count('invalidations')
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.negative_hits = 0
+            self.misses = 0
+            self.expired = 0
+            self.invalidations = 0
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, negative hits, misses, expirations, invalidations, hit rate, size and evictions
+        """
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "bytes": self.backend.size if self.backend is not None else 0,
+            "evictions": self.backend.evictions if self.backend is not None else 0
+        }
@@ -2,9 +2,38 @@ import json
 import time
 import os
 import logging
-import boto3
-import trafilatura
-from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+try:
+    from . import cache
+    from . import chunking
+    from . import crawler
+    from . import deadline as deadlines
+    from . import fetcher
+    from . import instrumentation
+    from . import jobs
+    from . import limiter
+    from . import memory
+    from . import payload
+    from . import resolver
+    from . import router
+    from . import similarity
+except ImportError:
+    # Lambda loads app.py as a top-level module, so siblings are imported directly
+    import cache
+    import chunking
+    import crawler
+    import deadline as deadlines
+    import fetcher
+    import instrumentation
+    import jobs
+    import limiter
+    import memory
+    import payload
+    import resolver
+    import router
+    import similarity
 
 # Configure logging
 logger = logging.getLogger()
@@ -13,52 +42,528 @@ logger.setLevel(logging.INFO)
 # Environment variables with defaults
 BEDROCK_REGION = os.environ.get('BEDROCK_REGION', 'us-east-1')
 DEFAULT_MODEL = os.environ.get('DEFAULT_MODEL', 'amazon.nova-pro-v1:0')  # Back to Nova as default
-MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 10000))
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 100000))  # Hard cap on extracted content
 TIMEOUT_SECONDS = int(os.environ.get('TIMEOUT_SECONDS', 30))
+FETCH_CONNECT_TIMEOUT = min(int(os.environ.get('FETCH_CONNECT_TIMEOUT', 5)), TIMEOUT_SECONDS)
+MAX_DOWNLOAD_BYTES = int(os.environ.get('MAX_DOWNLOAD_BYTES', 2 * 1024 * 1024))  # Stop reading pages past this size
+FETCH_POOL_SIZE = int(os.environ.get('FETCH_POOL_SIZE', 10))  # Keep-alive connections per host
+SUMMARY_RESERVE_SECONDS = int(os.environ.get('SUMMARY_RESERVE_SECONDS', 15))  # Time kept back from the download for Bedrock
+DEADLINE_SAFETY_MARGIN = float(os.environ.get('DEADLINE_SAFETY_MARGIN', 1.0))  # Time kept back to return a response
+DEFAULT_DEADLINE_SECONDS = int(os.environ.get('DEFAULT_DEADLINE_SECONDS', 60))  # Budget when there is no Lambda context
+API_GATEWAY_DEADLINE_SECONDS = float(os.environ.get('API_GATEWAY_DEADLINE_SECONDS', 28))  # Budget cap for API requests, under the gateway's 29s timeout
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'  # Write EMF metric log lines
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'WebsiteToText')
+MEMORY_PROFILING = os.environ.get('MEMORY_PROFILING', 'false').lower() == 'true'  # Record per-stage memory use, slows requests down
+MEMORY_CEILING_MB = int(os.environ.get('MEMORY_CEILING_MB', 0))  # Predicted memory use extractions must stay under, 0 to derive it
+MEMORY_CEILING_FRACTION = float(os.environ.get('MEMORY_CEILING_FRACTION', 0.85))  # Share of the function's memory used as the derived ceiling
+EXTRACTION_MEMORY_FACTOR = float(os.environ.get('EXTRACTION_MEMORY_FACTOR', 20))  # Predicted bytes per HTML byte for a full extraction
+FAST_EXTRACTION_MEMORY_FACTOR = float(os.environ.get('FAST_EXTRACTION_MEMORY_FACTOR', 8))  # Same for a fast extraction
+# Bedrock read timeouts are picked from fixed steps so only a handful of clients are ever created
+BEDROCK_TIMEOUT_STEPS = (5, 10, 20, 30, 45, 60)
+BEDROCK_INITIAL_CONCURRENCY = int(os.environ.get('BEDROCK_INITIAL_CONCURRENCY', 4))  # Concurrent Bedrock calls per container at start
+BEDROCK_MIN_CONCURRENCY = int(os.environ.get('BEDROCK_MIN_CONCURRENCY', 1))
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', 16))
+BEDROCK_MAX_RETRIES = int(os.environ.get('BEDROCK_MAX_RETRIES', 3))  # Retries of a throttled Bedrock call
+BEDROCK_RETRY_BASE_SECONDS = float(os.environ.get('BEDROCK_RETRY_BASE_SECONDS', 0.25))
+BEDROCK_RETRY_MAX_SECONDS = float(os.environ.get('BEDROCK_RETRY_MAX_SECONDS', 4.0))
 INFERENCE_PROFILE_ARN = os.environ.get('INFERENCE_PROFILE_ARN', '')  # For specifying inference profile directly
 DEFAULT_INFERENCE_PROFILE_NAME = os.environ.get('DEFAULT_INFERENCE_PROFILE_NAME', 'nova-default-profile')  # Default profile name
+PROFILE_CACHE_TTL_SECONDS = int(os.environ.get('PROFILE_CACHE_TTL_SECONDS', 3600))
+PROFILE_NEGATIVE_TTL_SECONDS = int(os.environ.get('PROFILE_NEGATIVE_TTL_SECONDS', 300))
+PREWARM_ON_INIT = os.environ.get('PREWARM_ON_INIT', 'false').lower() == 'true'
+PREWARM_BUDGET_SECONDS = float(os.environ.get('PREWARM_BUDGET_SECONDS', API_GATEWAY_DEADLINE_SECONDS))  # Handler budget the prewarmed Bedrock client is sized for
+CONTENT_CACHE_BACKEND = os.environ.get('CONTENT_CACHE_BACKEND', 'memory')  # memory, disk or none
+CONTENT_CACHE_MAX_BYTES = int(os.environ.get('CONTENT_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+CONTENT_CACHE_DIR = os.environ.get('CONTENT_CACHE_DIR', '/tmp/website_to_text/content')
+CONTENT_CACHE_FRESH_SECONDS = int(os.environ.get('CONTENT_CACHE_FRESH_SECONDS', 0))  # Serve without revalidating
+SUMMARY_CACHE_BACKEND = os.environ.get('SUMMARY_CACHE_BACKEND', 'memory')  # memory, disk or none
+SUMMARY_CACHE_MAX_BYTES = int(os.environ.get('SUMMARY_CACHE_MAX_BYTES', 10 * 1024 * 1024))
+SUMMARY_CACHE_DIR = os.environ.get('SUMMARY_CACHE_DIR', '/tmp/website_to_text/summaries')
+SUMMARY_CACHE_TTL_SECONDS = int(os.environ.get('SUMMARY_CACHE_TTL_SECONDS', 3600))
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 50))
+BATCH_FETCH_WORKERS = int(os.environ.get('BATCH_FETCH_WORKERS', 8))  # Concurrent downloads and extractions
+BATCH_SUMMARY_WORKERS = int(os.environ.get('BATCH_SUMMARY_WORKERS', 4))  # Concurrent Bedrock calls
+CHUNK_TOKEN_BUDGET = int(os.environ.get('CHUNK_TOKEN_BUDGET', 8000))  # Largest content sent in one Bedrock call
+MAP_REDUCE_WORKERS = int(os.environ.get('MAP_REDUCE_WORKERS', 0))  # Most concurrent chunk summaries, 0 for one per chunk
+MAX_REDUCE_ROUNDS = 3
+PROMPT_CACHE_ENABLED = os.environ.get('PROMPT_CACHE_ENABLED', 'true').lower() == 'true'  # Nova cachePoint after the content
+PROMPT_CACHE_MIN_TOKENS = int(os.environ.get('PROMPT_CACHE_MIN_TOKENS', 1000))  # Smaller content is not worth a checkpoint
+DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'true').lower() == 'true'  # Reuse summaries of near-duplicate pages
+DEDUP_MAX_DISTANCE = int(os.environ.get('DEDUP_MAX_DISTANCE', 3))  # Most differing SimHash bits of a near-duplicate
+DEDUP_MIN_WORDS = int(os.environ.get('DEDUP_MIN_WORDS', 50))  # Shorter content is too small to fingerprint reliably
+DEDUP_INDEX_MAX_ENTRIES = int(os.environ.get('DEDUP_INDEX_MAX_ENTRIES', 10000))
+ROUTING_ENABLED = os.environ.get('ROUTING_ENABLED', 'true').lower() == 'true'  # Route requests that name no model
+ROUTING_TABLE = os.environ.get('ROUTING_TABLE', '')  # Routing table as JSON, see router.DEFAULT_TABLE
+ROUTING_TABLE_FILE = os.environ.get('ROUTING_TABLE_FILE', '')  # Routing table JSON file, used if ROUTING_TABLE is empty
+MAX_PROMPTS = int(os.environ.get('MAX_PROMPTS', 10))  # Prompts answered from one extraction
+PROMPT_WORKERS = int(os.environ.get('PROMPT_WORKERS', 4))  # Concurrent Bedrock calls for a prompts list
+CRAWL_MAX_PAGES = int(os.environ.get('CRAWL_MAX_PAGES', 50))  # Most pages one crawl may request
+CRAWL_MAX_DEPTH = int(os.environ.get('CRAWL_MAX_DEPTH', 3))  # Most link hops from the root one crawl may request
+CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS', 4))  # Pages fetched and summarized at once
+CRAWL_HOST_CONCURRENCY = int(os.environ.get('CRAWL_HOST_CONCURRENCY', 2))  # Concurrent requests to one host
+CRAWL_HOST_DELAY_SECONDS = float(os.environ.get('CRAWL_HOST_DELAY_SECONDS', 0.25))  # Gap between requests to one host
+CONTENT_MODE_DEFAULT = os.environ.get('CONTENT_MODE_DEFAULT', 'auto')  # auto, inline, none, gzip or s3
+CONTENT_INLINE_MAX_BYTES = int(os.environ.get('CONTENT_INLINE_MAX_BYTES', 8 * 1024))  # auto: largest uncompressed content
+CONTENT_GZIP_MAX_BYTES = int(os.environ.get('CONTENT_GZIP_MAX_BYTES', 256 * 1024))  # auto: largest compressed content
+CONTENT_BUCKET = os.environ.get('CONTENT_BUCKET', '')  # Bucket for offloaded content, s3 mode is off without it
+CONTENT_KEY_PREFIX = os.environ.get('CONTENT_KEY_PREFIX', 'website-to-text/')
+CONTENT_URL_EXPIRATION_SECONDS = int(os.environ.get('CONTENT_URL_EXPIRATION_SECONDS', 300))
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'memory')  # memory, sqlite or aws
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', '/tmp/website_to_text/jobs.db')
+JOB_TABLE = os.environ.get('JOB_TABLE', '')  # DynamoDB table for the aws job backend
+JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL', '')  # SQS queue for the aws job backend
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 86400))  # How long job records are kept
+JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT', 300))  # Local backends: retry unacknowledged jobs after this
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_WORKER_BATCH_SIZE = int(os.environ.get('JOB_WORKER_BATCH_SIZE', 10))  # Jobs pulled per worker invocation
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 4))  # Jobs processed at once by a worker
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.environ.get('JOB_PROGRESS_INTERVAL_SECONDS', 2))  # Shortest gap between progress writes of a crawl job
+
+MAP_PROMPT = (
+    "The following is one part of a longer web page. Summarize this part so the summary "
+    "can later be combined with summaries of the other parts. Keep every detail that is "
+    "relevant to this request: {prompt}"
+)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of one web page. Combine them into a "
+    "single response to this request: {prompt}"
+)
+
+# Generation parameters shared by every model family
+INFERENCE_CONFIG = {
+    "max_tokens": 1000,
+    "temperature": 0.7,
+    "top_p": 0.9
+}
+
+# Clients and profile lookups live at module level so warm invocations reuse them
+client_cache = resolver.ClientCache()
+profile_resolver = resolver.ProfileResolver(
+    client_cache,
+    BEDROCK_REGION,
+    configured_arn=INFERENCE_PROFILE_ARN,
+    default_profile_name=DEFAULT_INFERENCE_PROFILE_NAME,
+    ttl=PROFILE_CACHE_TTL_SECONDS,
+    negative_ttl=PROFILE_NEGATIVE_TTL_SECONDS
+)
+
+# One limit for every thread of the container, so batch and map-reduce work cannot burst past it
+bedrock_limiter = limiter.AdaptiveLimiter(
+    initial_limit=BEDROCK_INITIAL_CONCURRENCY,
+    min_limit=BEDROCK_MIN_CONCURRENCY,
+    max_limit=BEDROCK_MAX_CONCURRENCY
+)
+
+# Memory profiling traces every allocation from init on, so it is only on when asked for
+memory_profiler = memory.MemoryProfiler() if MEMORY_PROFILING else None
+if memory_profiler is not None:
+    memory_profiler.start()
+
+memory_guard = memory.MemoryGuard(
+    memory.ceiling_bytes(MEMORY_CEILING_MB, os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', ''),
+                         MEMORY_CEILING_FRACTION),
+    full_factor=EXTRACTION_MEMORY_FACTOR,
+    fast_factor=FAST_EXTRACTION_MEMORY_FACTOR
+)
+
+content_cache = cache.ContentCache(
+    cache.create_backend(CONTENT_CACHE_BACKEND, CONTENT_CACHE_MAX_BYTES, CONTENT_CACHE_DIR),
+    fresh_seconds=CONTENT_CACHE_FRESH_SECONDS
+)
+
+page_fetcher = fetcher.Fetcher(
+    connect_timeout=FETCH_CONNECT_TIMEOUT,
+    read_timeout=TIMEOUT_SECONDS,
+    max_bytes=MAX_DOWNLOAD_BYTES,
+    total_timeout=TIMEOUT_SECONDS,
+    pool_size=FETCH_POOL_SIZE
+)
+
+summary_cache = cache.SummaryCache(
+    cache.create_backend(SUMMARY_CACHE_BACKEND, SUMMARY_CACHE_MAX_BYTES, SUMMARY_CACHE_DIR),
+    ttl=SUMMARY_CACHE_TTL_SECONDS
+)
+
+# Fingerprints of summarized content, for reusing summaries of near-duplicate pages
+similarity_index = similarity.SimilarityIndex(DEDUP_MAX_DISTANCE, DEDUP_INDEX_MAX_ENTRIES)
+
+model_router = router.ModelRouter.from_config(ROUTING_TABLE, ROUTING_TABLE_FILE, BEDROCK_REGION)
+
+job_queue = jobs.JobQueue(
+    jobs.create_backend(
+        JOB_BACKEND,
+        visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+        path=JOB_DB_PATH,
+        clients=client_cache,
+        region=os.environ.get('AWS_REGION', BEDROCK_REGION),
+        table_name=JOB_TABLE,
+        queue_url=JOB_QUEUE_URL,
+        bucket=CONTENT_BUCKET,
+        key_prefix=CONTENT_KEY_PREFIX,
+        url_expiration=CONTENT_URL_EXPIRATION_SECONDS
+    ),
+    ttl=JOB_TTL_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS
+)
+
+def bedrock_timeout_step(seconds):
+    """The longest Bedrock read timeout step that fits in `seconds`, or None if none does"""
+    steps = [step for step in BEDROCK_TIMEOUT_STEPS if step <= seconds]
+    return steps[-1] if steps else None
+
+def prewarm():
+    """
+    Load what every request needs during the Lambda init phase
+    
+    Imports the extraction libraries and creates the Bedrock runtime client
+    that `get_bedrock_client` picks for a request starting with the handler's
+    full budget, `PREWARM_BUDGET_SECONDS` less the safety margin, then
+    resolves the default model's inference profile. Everything else is loaded
+    on first use.
+    """
+    try:
+        import trafilatura  # noqa: F401
+        fetcher.load_http()
+    except ImportError as e:
+        logger.warning(f"Prewarm failed: {str(e)}")
+    read_timeout = bedrock_timeout_step(PREWARM_BUDGET_SECONDS - DEADLINE_SAFETY_MARGIN) or BEDROCK_TIMEOUT_STEPS[0]
+    profile_resolver.prewarm([DEFAULT_MODEL], read_timeout=read_timeout)
+
+if PREWARM_ON_INIT:
+    prewarm()
+
+def download_page(url, etag=None, last_modified=None, timeout=None):
+    """
+    Download a page, sending conditional headers when validators are known
+    
+    Args:
+        url (str): The URL to download
+        etag (str, optional): ETag from a previous response, sent as If-None-Match
+        last_modified (str, optional): Last-Modified from a previous response, sent as If-Modified-Since
+        timeout (float, optional): Time budget for the download, defaults to TIMEOUT_SECONDS
+        
+    Returns:
+        dict: 'not_modified', 'content' (bytes), 'etag' and 'last_modified', or None if the download failed
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    
+    response = page_fetcher.fetch(url, headers=headers, timeout=timeout)
+    if response['status_code'] == 304:
+        return {
+            "not_modified": True,
+            "content": None,
+            "etag": response['etag'] or etag,
+            "last_modified": response['last_modified'] or last_modified
+        }
+    if response['status_code'] != 200 or not response['content']:
+        logger.warning(f"Download of {url} returned status {response['status_code']}")
+        return None
+    
+    return {
+        "not_modified": False,
+        "content": response['content'],
+        "etag": response['etag'],
+        "last_modified": response['last_modified']
+    }
 
-def extract_content(url):
+def extract_content(url, deadline=None, metrics=None):
     """
     Extract content from a website URL and convert to markdown format
     
+    Previously extracted content is served from `content_cache`, keyed by the
+    canonical URL so variants that only differ in tracking parameters share an
+    entry. Cached pages are revalidated with a conditional GET, and a 304
+    response skips both the download and the extraction. Pages whose predicted
+    extraction memory exceeds `memory_guard`'s ceiling are extracted in fast
+    mode, or rejected if that would not fit either.
+    
     Args:
         url (str): The URL to extract content from
+        deadline (Deadline, optional): Request deadline. The download gets at most
+            TIMEOUT_SECONDS and always leaves SUMMARY_RESERVE_SECONDS for Bedrock.
+        metrics (RequestMetrics, optional): Receives fetch and extract durations,
+            bytes downloaded and content length
         
     Returns:
         str: Extracted content in markdown format
         
     Raises:
         ValueError: If URL is invalid or content extraction fails
+        DeadlineExceeded: If there is no time left to download the page, or the
+            download timed out because the deadline shortened its budget
     """
     if not url or not url.startswith(('http://', 'https://')):
         raise ValueError("Invalid URL provided")
     
+    metrics = metrics or instrumentation.NULL_METRICS
+    cache_key = similarity.canonicalize_url(url)
+    
     try:
-        # Download and extract the main content
-        downloaded = trafilatura.fetch_url(url)
+        cached = content_cache.get(cache_key)
+        if cached and content_cache.is_fresh(cached):
+            content_cache.record_hit()
+            metrics.add('content_length', len(cached['markdown']))
+            return _truncate(cached['markdown'])
+        
+        timeout = None
+        if deadline is not None:
+            timeout = deadline.budget(TIMEOUT_SECONDS, reserve=SUMMARY_RESERVE_SECONDS)
+            if timeout <= 0:
+                raise deadlines.DeadlineExceeded("No time left to download the page")
+        
+        # Download the page, revalidating any cached copy
+        with metrics.stage('fetch'):
+            downloaded = download_page(
+                url,
+                etag=cached.get('etag') if cached else None,
+                last_modified=cached.get('last_modified') if cached else None,
+                timeout=timeout
+            )
         if not downloaded:
             raise ValueError("Failed to download content from URL")
         
-        # Extract the main content and convert to markdown
-        result = trafilatura.extract(downloaded, output_format='markdown', 
-                                    include_links=True, include_images=False,
-                                    include_tables=True)
+        if downloaded['not_modified'] and cached:
+            content_cache.record_revalidated()
+            content_cache.touch(cache_key, cached)
+            metrics.add('content_length', len(cached['markdown']))
+            return _truncate(cached['markdown'])
+        if cached:
+            content_cache.record_changed()
+        metrics.add('bytes_downloaded', len(downloaded['content']))
+        
+        # trafilatura and lxml are a large share of cold-start time, so they load on first use
+        import trafilatura
+        
+        # Extract the main content and convert to markdown, skipping the fallback
+        # extractors when the page is too large for a full extraction
+        try:
+            with memory_guard.reserve(len(downloaded['content'])) as mode, metrics.stage('extract'):
+                if mode == memory.MODE_FAST:
+                    metrics.add('fast_extractions', 1)
+                result = trafilatura.extract(downloaded['content'], output_format='markdown', 
+                                            include_links=True, include_images=False,
+                                            include_tables=True, no_fallback=mode == memory.MODE_FAST)
+        except memory.MemoryCeilingExceeded:
+            metrics.add('memory_rejections', 1)
+            raise
         
         if not result:
             raise ValueError("Failed to extract content from downloaded page")
+        metrics.add('content_length', len(result))
         
-        # Truncate if content is too long
-        if len(result) > MAX_CONTENT_LENGTH:
-            result = result[:MAX_CONTENT_LENGTH] + "\n\n[Content truncated due to length]"
-            
-        return result
+        content_cache.put(cache_key, result, downloaded['etag'], downloaded['last_modified'])
+        
+        return _truncate(result)
         
+    except deadlines.DeadlineExceeded:
+        raise
+    except fetcher.DownloadTimeout as e:
+        # A download cut short by the deadline's budget is a deadline failure, not a bad page
+        if timeout is not None and timeout < TIMEOUT_SECONDS:
+            raise deadlines.DeadlineExceeded(f"No time left to finish downloading the page: {str(e)}")
+        logger.error(f"Error extracting content from {url}: {str(e)}")
+        raise ValueError(f"Content extraction failed: {str(e)}")
     except Exception as e:
         logger.error(f"Error extracting content from {url}: {str(e)}")
         raise ValueError(f"Content extraction failed: {str(e)}")
 
-def generate_summary(content, prompt, model=None):
+def _truncate(result):
+    """Truncate extracted content that is too long"""
+    if len(result) > MAX_CONTENT_LENGTH:
+        result = result[:MAX_CONTENT_LENGTH] + "\n\n[Content truncated due to length]"
+    return result
+
+def supports_prompt_cache(model):
+    """Check whether a model accepts cachePoint blocks for Bedrock prompt caching"""
+    return PROMPT_CACHE_ENABLED and "nova" in model.lower()
+
+def build_request_body(content, prompt, model):
+    """
+    Build the invoke_model request body for a model family
+    
+    For models with prompt caching, the content goes first and is closed by a
+    cache checkpoint, so requests with different prompts over the same page
+    share a cached prefix and only the prompt after it is processed anew.
+    
+    Args:
+        content (str): The content to summarize
+        prompt (str): The prompt to use for summarization
+        model (str): The model ID or inference profile ARN
+        
+    Returns:
+        dict: The request body
+    """
+    # Prepare request body based on model
+    if "nova" in model.lower():
+        # Nova models use a specific message format
+        blocks = [{"text": f"Content:\n{content}"}]
+        if supports_prompt_cache(model) and chunking.estimate_tokens(content) >= PROMPT_CACHE_MIN_TOKENS:
+            blocks.append({"cachePoint": {"type": "default"}})
+        blocks.append({"text": prompt})
+        return {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": blocks
+                }
+            ],
+            "inferenceConfig": {
+                "max_new_tokens": INFERENCE_CONFIG['max_tokens'],
+                "temperature": INFERENCE_CONFIG['temperature'],
+                "top_p": INFERENCE_CONFIG['top_p']
+            }
+        }
+    
+    # Default format for other models like Titan, which have no prompt caching
+    full_prompt = f"{prompt}\n\nContent:\n{content}"
+    return {
+        "inputText": full_prompt,
+        "textGenerationConfig": {
+            "maxTokenCount": INFERENCE_CONFIG['max_tokens'],
+            "temperature": INFERENCE_CONFIG['temperature'],
+            "topP": INFERENCE_CONFIG['top_p']
+        }
+    }
+
+def resolve_model_id(model, metrics=None):
+    """
+    Map a model ID to the identifier invoke_model expects
+    
+    Args:
+        model (str): The model ID or inference profile ARN
+        metrics (RequestMetrics, optional): Receives the profile resolution duration
+        
+    Returns:
+        str: The inference profile ARN for Nova models, otherwise the model unchanged
+        
+    Raises:
+        Exception: If a Nova model has no usable inference profile
+    """
+    # For Nova models, we need to use a specific inference profile
+    if profile_resolver.needs_profile(model):
+        try:
+            with (metrics or instrumentation.NULL_METRICS).stage('profile_resolution'):
+                return profile_resolver.resolve(model)
+        except Exception as e:
+            logger.error(f"Error handling inference profile: {str(e)}")
+            raise Exception(f"Nova model requires an inference profile: {str(e)}")
+    return model
+
+def invoked_model_id(model):
+    """
+    Name the identifier Bedrock was invoked with for a model, for `model_used`
+    
+    A Nova model ID is sent as the inference profile it resolves to, which is
+    `INFERENCE_PROFILE_ARN` whenever that is set. Resolutions are cached, so
+    this costs no call after the summary was generated. Falls back to the
+    model itself when it cannot be resolved.
+    """
+    try:
+        return profile_resolver.resolve(model)
+    except Exception:
+        return model
+
+def record_usage(metrics, response_body, model):
+    """
+    Record token counts from an invoke_model response body
+    
+    Args:
+        metrics (RequestMetrics): The request metrics
+        response_body (dict): The parsed response body
+        model (str): The model ID or inference profile ARN that answered
+    """
+    if "nova" in model.lower():
+        usage = response_body.get('usage', {})
+        metrics.add('input_tokens', usage.get('inputTokens'))
+        metrics.add('output_tokens', usage.get('outputTokens'))
+        metrics.add('cache_read_tokens', usage.get('cacheReadInputTokenCount'))
+        metrics.add('cache_write_tokens', usage.get('cacheWriteInputTokenCount'))
+    else:
+        metrics.add('input_tokens', response_body.get('inputTextTokenCount'))
+        metrics.add('output_tokens', response_body.get('results', [{}])[0].get('tokenCount'))
+
+def _is_throttle(error):
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') == 'ThrottlingException'
+
+def invoke_bedrock(call, deadline=None, metrics=None, hold=False):
+    """
+    Make a Bedrock call within `bedrock_limiter`, retrying it while throttled
+    
+    Throttled attempts are retried up to BEDROCK_MAX_RETRIES times after a
+    jittered exponential backoff, as long as the wait fits in the deadline.
+    
+    Args:
+        call (callable): Makes the call and returns its result
+        deadline (Deadline, optional): Request deadline bounding the wait for a slot and the retries
+        metrics (RequestMetrics, optional): Receives in-flight, throttle and retry counts
+        hold (bool, optional): Keep the slot after a successful call, for responses
+            read after returning. The caller must release the returned ticket.
+        
+    Returns:
+        The call's result, or a (result, ticket) tuple when `hold` is set
+        
+    Raises:
+        DeadlineExceeded: If no slot frees up within the deadline
+        ClientError: The last error, if the call failed for another reason or stayed throttled
+    """
+    metrics = metrics or instrumentation.NULL_METRICS
+    attempt = 0
+    while True:
+        with metrics.stage('bedrock_queue'):
+            ticket = bedrock_limiter.acquire(deadline.remaining() if deadline else None)
+        if ticket is None:
+            raise deadlines.DeadlineExceeded("No Bedrock capacity freed up within the remaining time budget")
+        metrics.peak('bedrock_in_flight', bedrock_limiter.in_flight)
+        
+        try:
+            result = call()
+        except Exception as e:
+            throttled = _is_throttle(e)
+            bedrock_limiter.release(ticket, throttled)
+            if not throttled:
+                raise
+            metrics.add('bedrock_throttles', 1)
+            delay = limiter.backoff_delay(attempt, BEDROCK_RETRY_BASE_SECONDS, BEDROCK_RETRY_MAX_SECONDS)
+            if attempt >= BEDROCK_MAX_RETRIES or (deadline and delay >= deadline.remaining()):
+                raise
+            logger.warning(f"Bedrock throttled the call, retrying in {delay:.2f}s")
+            metrics.add('bedrock_retries', 1)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        
+        if hold:
+            return result, ticket
+        bedrock_limiter.release(ticket)
+        return result
+
+def get_bedrock_client(deadline=None):
+    """
+    Get the Bedrock runtime client for the time left in a request
+    
+    Args:
+        deadline (Deadline, optional): Request deadline
+        
+    Returns:
+        object: A cached bedrock-runtime client whose read timeout fits the deadline
+        
+    Raises:
+        DeadlineExceeded: If less than the shortest timeout step remains
+    """
+    if deadline is None:
+        return client_cache.get('bedrock-runtime', BEDROCK_REGION)
+    
+    remaining = deadline.remaining()
+    read_timeout = bedrock_timeout_step(remaining)
+    if read_timeout is None:
+        raise deadlines.DeadlineExceeded(f"Only {remaining:.1f}s left, not enough to call Bedrock")
+    return client_cache.get('bedrock-runtime', BEDROCK_REGION, read_timeout=read_timeout)
+
+def generate_summary(content, prompt, model=None, deadline=None, metrics=None):
     """
     Generate a summary of the content using Amazon Bedrock
     
@@ -66,112 +571,38 @@ def generate_summary(content, prompt, model=None):
         content (str): The content to summarize
         prompt (str): The prompt to use for summarization
         model (str, optional): The model ID or inference profile ARN to use
+        deadline (Deadline, optional): Request deadline used to size the read timeout
+        metrics (RequestMetrics, optional): Receives the Bedrock duration and token counts
         
     Returns:
         str: The generated summary
         
     Raises:
+        DeadlineExceeded: If the call cannot finish within the deadline
         Exception: If the Bedrock API call fails
     """
     if not model:
         model = DEFAULT_MODEL
+    metrics = metrics or instrumentation.NULL_METRICS
     
     try:
-        # Initialize Bedrock client
-        bedrock_client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=BEDROCK_REGION
-        )
-        
-        # Prepare the prompt with content
-        full_prompt = f"{prompt}\n\nContent:\n{content}"
+        # Reuse the Bedrock client across warm invocations
+        bedrock_client = get_bedrock_client(deadline)
         
-        # Prepare request body based on model
-        if "nova" in model.lower():
-            # Nova models use a specific message format
-            request_body = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "text": full_prompt
-                            }
-                        ]
-                    }
-                ],
-                "inferenceConfig": {
-                    "max_new_tokens": 1000,
-                    "temperature": 0.7,
-                    "top_p": 0.9
-                }
-            }
-        else:
-            # Default format for other models like Titan
-            request_body = {
-                "inputText": full_prompt,
-                "textGenerationConfig": {
-                    "maxTokenCount": 1000,
-                    "temperature": 0.7,
-                    "topP": 0.9
-                }
-            }
+        request_body = build_request_body(content, prompt, model)
+        model = resolve_model_id(model, metrics)
         
-        # For Nova models, we need to use a specific inference profile
-        if "nova" in model.lower() and not (model.startswith('arn:') or ':inference-profile/' in model):
-            try:
-                # First check if inference profile ARN is provided
-                if INFERENCE_PROFILE_ARN:
-                    logger.info(f"Using configured inference profile ARN: {INFERENCE_PROFILE_ARN}")
-                    model = INFERENCE_PROFILE_ARN
-                else:
-                    # Try to list available inference profiles
-                    bedrock_mgmt = boto3.client('bedrock', region_name=BEDROCK_REGION)
-                    profiles = bedrock_mgmt.list_inference_profiles()
-                    
-                    # Look for an existing Nova profile
-                    nova_profile = None
-                    for profile in profiles.get('inferenceProfiles', []):
-                        if 'nova' in profile['name'].lower():
-                            nova_profile = profile['inferenceProfileArn']
-                            break
-                    
-                    if nova_profile:
-                        logger.info(f"Found existing Nova inference profile: {nova_profile}")
-                        model = nova_profile
-                    else:
-                        # If no profile found, try to create one
-                        try:
-                            # Get account ID
-                            sts_client = boto3.client('sts')
-                            account_id = sts_client.get_caller_identity()['Account']
-                            
-                            # Create inference profile
-                            response = bedrock_mgmt.create_inference_profile(
-                                inferenceProfileName=DEFAULT_INFERENCE_PROFILE_NAME,
-                                modelArn=f"arn:aws:bedrock:{BEDROCK_REGION}::foundation-model/{model}",
-                                provisionedModelThroughput=1
-                            )
-                            
-                            # Use the newly created profile
-                            model = response['inferenceProfileArn']
-                            logger.info(f"Created new inference profile: {model}")
-                        except Exception as create_error:
-                            logger.error(f"Failed to create inference profile: {str(create_error)}")
-                            raise Exception(f"Nova model requires an inference profile. Please create one in the Bedrock console or set INFERENCE_PROFILE_ARN environment variable.")
-            except Exception as e:
-                logger.error(f"Error handling inference profile: {str(e)}")
-                raise Exception(f"Nova model requires an inference profile: {str(e)}")
-        
-        # Invoke the model
-        start_time = time.time()
-        response = bedrock_client.invoke_model(
-            modelId=model,
-            body=json.dumps(request_body)
-        )
+        # Invoke the model, reading the response while the call still holds its slot
+        def invoke():
+            response = bedrock_client.invoke_model(
+                modelId=model,
+                body=json.dumps(request_body)
+            )
+            return json.loads(response.get('body').read())
         
-        # Parse the response based on model
-        response_body = json.loads(response.get('body').read())
+        with metrics.stage('bedrock'):
+            response_body = invoke_bedrock(invoke, deadline, metrics)
+        record_usage(metrics, response_body, model)
         if "nova" in model.lower():
             # Nova models return content in a different nested structure
             summary = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', '')
@@ -181,15 +612,770 @@ def generate_summary(content, prompt, model=None):
         
         return summary.strip()
         
+    except deadlines.DeadlineExceeded:
+        raise
+    except ReadTimeoutError:
+        raise deadlines.DeadlineExceeded("Bedrock did not answer within the remaining time budget")
+    except ClientError as e:
+        error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+        error_message = e.response.get('Error', {}).get('Message', str(e))
+        logger.error(f"Bedrock API error: {error_code} - {error_message}")
+        if error_code == 'ThrottlingException':
+            raise router.ModelThrottled(f"Bedrock API error: {error_message}")
+        raise Exception(f"Bedrock API error: {error_message}")
+    except Exception as e:
+        logger.error(f"Error generating summary: {str(e)}")
+        raise Exception(f"Summary generation failed: {str(e)}")
+
+# Error events Bedrock can send in place of a chunk in a response stream
+STREAM_ERROR_EVENTS = (
+    'internalServerException',
+    'modelStreamErrorException',
+    'modelTimeoutException',
+    'serviceUnavailableException',
+    'throttlingException',
+    'validationException'
+)
+
+def parse_stream_chunk(chunk, model):
+    """
+    Extract the text delta from one decoded response stream chunk
+    
+    Args:
+        chunk (dict): The JSON payload of a stream chunk
+        model (str): The model ID or inference profile ARN that produced it
+        
+    Returns:
+        str: The text delta, or an empty string for non-text events
+    """
+    if "nova" in model.lower():
+        # Nova streams messageStart, contentBlockDelta, contentBlockStop, messageStop and metadata events
+        return chunk.get('contentBlockDelta', {}).get('delta', {}).get('text', '')
+    # Titan streams a sequence of outputText fragments
+    return chunk.get('outputText', '')
+
+def generate_summary_stream(content, prompt, model=None, deadline=None, metrics=None):
+    """
+    Generate a summary with Amazon Bedrock, yielding text as it is produced
+    
+    Uses invoke_model_with_response_stream so the first tokens reach the
+    caller long before the full generation finishes. Callers that need the
+    complete text at once should use `generate_summary`.
+    
+    Args:
+        content (str): The content to summarize
+        prompt (str): The prompt to use for summarization
+        model (str, optional): The model ID or inference profile ARN to use
+        deadline (Deadline, optional): Request deadline used to size the read timeout
+        metrics (RequestMetrics, optional): Receives the Bedrock duration and token counts
+        
+    Yields:
+        str: Text deltas in generation order
+        
+    Raises:
+        DeadlineExceeded: If the stream cannot finish within the deadline
+        Exception: If the Bedrock API call fails or the stream reports an error
+    """
+    if not model:
+        model = DEFAULT_MODEL
+    metrics = metrics or instrumentation.NULL_METRICS
+    
+    try:
+        bedrock_client = get_bedrock_client(deadline)
+        
+        request_body = build_request_body(content, prompt, model)
+        model = resolve_model_id(model, metrics)
+        
+        with metrics.stage('bedrock'):
+            # The slot is held until the stream has been read to the end
+            response, ticket = invoke_bedrock(
+                lambda: bedrock_client.invoke_model_with_response_stream(
+                    modelId=model,
+                    body=json.dumps(request_body)
+                ),
+                deadline, metrics, hold=True
+            )
+            throttled = False
+            try:
+                for event in response.get('body'):
+                    for error_event in STREAM_ERROR_EVENTS:
+                        if error_event in event:
+                            message = f"Bedrock stream error: {event[error_event].get('message', error_event)}"
+                            if error_event == 'throttlingException':
+                                throttled = True
+                                raise router.ModelThrottled(message)
+                            raise Exception(message)
+                    chunk = event.get('chunk')
+                    if not chunk:
+                        continue
+                    payload = json.loads(chunk.get('bytes'))
+                    # The last chunk of every model family carries the invocation's token counts
+                    invocation_metrics = payload.get('amazon-bedrock-invocationMetrics')
+                    if invocation_metrics:
+                        metrics.add('input_tokens', invocation_metrics.get('inputTokenCount'))
+                        metrics.add('output_tokens', invocation_metrics.get('outputTokenCount'))
+                        metrics.add('cache_read_tokens', invocation_metrics.get('cacheReadInputTokenCount'))
+                        metrics.add('cache_write_tokens', invocation_metrics.get('cacheWriteInputTokenCount'))
+                    delta = parse_stream_chunk(payload, model)
+                    if delta:
+                        yield delta
+            finally:
+                bedrock_limiter.release(ticket, throttled)
+        
+    except (deadlines.DeadlineExceeded, router.ModelThrottled):
+        raise
+    except ReadTimeoutError:
+        raise deadlines.DeadlineExceeded("Bedrock did not answer within the remaining time budget")
     except ClientError as e:
         error_code = e.response.get('Error', {}).get('Code', 'Unknown')
         error_message = e.response.get('Error', {}).get('Message', str(e))
         logger.error(f"Bedrock API error: {error_code} - {error_message}")
+        if error_code == 'ThrottlingException':
+            raise router.ModelThrottled(f"Bedrock API error: {error_message}")
         raise Exception(f"Bedrock API error: {error_message}")
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         raise Exception(f"Summary generation failed: {str(e)}")
 
+def prepare_summary_input(content, prompt, model=None, deadline=None, metrics=None):
+    """
+    Reduce long content to something that fits a single Bedrock call
+    
+    Content within `CHUNK_TOKEN_BUDGET` is returned unchanged. Longer content
+    is split on heading and paragraph boundaries, each chunk is summarized in
+    parallel (the map step), and the partial summaries are returned with a
+    prompt that merges them (the reduce step). Every chunk gets its own
+    thread, unless MAP_REDUCE_WORKERS caps them, and `bedrock_limiter` bounds
+    how many calls are actually in flight, so latency is bounded by the
+    slowest chunk rather than by the total length of the page.
+    
+    Args:
+        content (str): The content to summarize
+        prompt (str): The prompt to use for summarization
+        model (str, optional): The model ID or inference profile ARN to use
+        deadline (Deadline, optional): Request deadline passed to every chunk summary
+        metrics (RequestMetrics, optional): Receives the chunk count and every chunk's Bedrock metrics
+        
+    Returns:
+        tuple: The content and prompt for the final summarization call
+        
+    Raises:
+        Exception: If summarizing any chunk fails
+    """
+    map_prompt = MAP_PROMPT.format(prompt=prompt)
+    reduce_prompt = REDUCE_PROMPT.format(prompt=prompt)
+    
+    # Partial summaries that are still too long together are reduced again
+    for _ in range(MAX_REDUCE_ROUNDS):
+        if chunking.estimate_tokens(content) <= CHUNK_TOKEN_BUDGET:
+            break
+        chunks = chunking.split_markdown(content, CHUNK_TOKEN_BUDGET)
+        logger.info(f"Summarizing {len(chunks)} chunks of {len(content)} characters")
+        if metrics is not None:
+            metrics.add('chunks', len(chunks))
+        
+        workers = min(MAP_REDUCE_WORKERS, len(chunks)) if MAP_REDUCE_WORKERS > 0 else len(chunks)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(lambda chunk: generate_summary(chunk, map_prompt, model, deadline, metrics), chunks))
+        
+        content = "\n\n".join(f"Part {index}:\n{partial}" for index, partial in enumerate(partials, 1))
+        prompt = reduce_prompt
+    
+    return content, prompt
+
+def summarize_content(content, prompt, model=None, deadline=None, metrics=None):
+    """
+    Generate a summary of content of any length
+    
+    Args:
+        content (str): The content to summarize
+        prompt (str): The prompt to use for summarization
+        model (str, optional): The model ID or inference profile ARN to use
+        deadline (Deadline, optional): Request deadline
+        metrics (RequestMetrics, optional): Receives Bedrock durations and token counts
+        
+    Returns:
+        str: The generated summary
+        
+    Raises:
+        Exception: If the Bedrock API call fails
+    """
+    content, prompt = prepare_summary_input(content, prompt, model, deadline, metrics)
+    return generate_summary(content, prompt, model, deadline, metrics)
+
+def select_models(content, prompt, model=None, routing=None):
+    """
+    Choose the models to try for a summary
+    
+    An explicitly requested model is used as is. Otherwise, with routing
+    enabled, `model_router` picks one from the content length, the prompt
+    class and the caller's latency target.
+    
+    Args:
+        content (str): The content to summarize
+        prompt (str): The prompt to use for summarization
+        model (str, optional): The requested model ID or inference profile ARN, or 'auto'
+        routing (dict, optional): 'prompt_class' and 'latency_target_ms' from the request
+        
+    Returns:
+        list: The model to invoke first, followed by throttling fallbacks
+    """
+    if model and model != 'auto':
+        return [model]
+    if not ROUTING_ENABLED:
+        return [DEFAULT_MODEL]
+    routing = routing or {}
+    return model_router.route(
+        chunking.estimate_tokens(content),
+        routing.get('prompt_class') or router.classify_prompt(prompt),
+        routing.get('latency_target_ms')
+    )
+
+def content_fingerprint(content):
+    """SimHash of content for near-duplicate lookups, or None if dedup is off or the content is too short"""
+    if not DEDUP_ENABLED or len(content.split()) < DEDUP_MIN_WORDS:
+        return None
+    return similarity.simhash(content)
+
+def lookup_summary(content, prompt, model, fingerprint=None, metrics=None, url=None):
+    """
+    Look up a stored summary for content or, failing that, for a near-duplicate of it
+    
+    Earlier versions of the same page are not near-duplicates: a page whose
+    content changed slightly is summarized again instead of getting the
+    summary of its old content.
+    
+    Args:
+        content (str): The content to summarize
+        prompt (str): The prompt to use for summarization
+        model (str): The model ID or inference profile ARN the summary was generated with
+        fingerprint (int, optional): The content's `content_fingerprint`
+        metrics (RequestMetrics, optional): Receives the near_duplicates count
+        url (str, optional): The page's URL, whose own index entries are skipped
+        
+    Returns:
+        tuple: The summary or None, and for a near-duplicate the matched page's
+            'url', 'similarity' and 'distance', otherwise None
+    """
+    digest = summary_cache.content_digest(content)
+    summary = summary_cache.get(summary_cache.digest_key(digest, prompt, model, INFERENCE_CONFIG))
+    if summary is not None or fingerprint is None:
+        return summary, None
+    
+    match = similarity_index.nearest(fingerprint, exclude=digest,
+                                     exclude_url=url and similarity.canonicalize_url(url))
+    if match is None:
+        return None, None
+    summary = summary_cache.get(summary_cache.digest_key(match['digest'], prompt, model, INFERENCE_CONFIG))
+    if summary is None:
+        return None, None
+    logger.info(f"Reusing the summary of near-duplicate {match['url']} (similarity {match['similarity']})")
+    (metrics or instrumentation.NULL_METRICS).add('near_duplicates', 1)
+    return summary, {"url": match['url'], "similarity": match['similarity'], "distance": match['distance']}
+
+def store_summary(content, prompt, model, summary, fingerprint=None, url=None):
+    """Cache a generated summary and index the content's fingerprint for near-duplicate lookups"""
+    digest = summary_cache.content_digest(content)
+    summary_cache.put(summary_cache.digest_key(digest, prompt, model, INFERENCE_CONFIG), summary)
+    if fingerprint is not None:
+        similarity_index.add(digest, fingerprint, url and similarity.canonicalize_url(url))
+
+def get_or_generate_summary(content, prompt, model=None, use_cache=True, deadline=None, metrics=None, routing=None,
+                            url=None):
+    """
+    Generate a summary, serving repeat requests from `summary_cache`
+    
+    Content that is a near-duplicate of an already summarized page, such as a
+    mirror or an AMP variant, reuses that page's summary. When Bedrock
+    throttles the selected model, the request falls back to the next faster
+    model chosen by the router.
+    
+    Args:
+        content (str): The content to summarize
+        prompt (str): The prompt to use for summarization
+        model (str, optional): The model ID or inference profile ARN to use, or 'auto' to route
+        use_cache (bool, optional): Set to False to bypass the cache and near-duplicate lookups
+        deadline (Deadline, optional): Request deadline
+        metrics (RequestMetrics, optional): Receives Bedrock durations and token counts
+        routing (dict, optional): 'prompt_class' and 'latency_target_ms' from the request
+        url (str, optional): The page's URL, reported when later pages match it
+        
+    Returns:
+        tuple: The summary, whether it was served from the cache, the identifier
+            of the model that produced it as sent to Bedrock, and the
+            near-duplicate match it was reused from or None
+        
+    Raises:
+        Exception: If the Bedrock API call fails
+    """
+    models = select_models(content, prompt, model, routing)
+    fingerprint = content_fingerprint(content)
+    
+    if use_cache:
+        summary, duplicate = lookup_summary(content, prompt, models[0], fingerprint, metrics, url)
+        if summary is not None:
+            return summary, True, invoked_model_id(models[0]), duplicate
+    
+    for index, candidate in enumerate(models):
+        try:
+            summary = summarize_content(content, prompt, candidate, deadline, metrics)
+            break
+        except router.ModelThrottled:
+            if index == len(models) - 1:
+                raise
+            logger.warning(f"{candidate} is throttled, falling back to {models[index + 1]}")
+            if metrics is not None:
+                metrics.add('model_fallbacks', 1)
+    
+    # Cached under the model that answered, which is what was sent to Bedrock
+    store_summary(content, prompt, candidate, summary, fingerprint, url)
+    return summary, False, invoked_model_id(candidate), None
+
+def summarize_prompts(content, prompts, model=None, use_cache=True, deadline=None, metrics=None, routing=None):
+    """
+    Answer several prompts over the same extracted content concurrently
+    
+    Args:
+        content (str): The extracted content
+        prompts (list): The prompts to answer
+        model (str, optional): The model ID or inference profile ARN to use
+        use_cache (bool, optional): Set to False to bypass the summary cache lookup
+        deadline (Deadline, optional): Request deadline shared by every prompt
+        metrics (RequestMetrics, optional): Accumulates Bedrock durations and token counts across prompts
+        routing (dict, optional): 'prompt_class' and 'latency_target_ms' from the request
+        
+    Returns:
+        list: One result per prompt, in request order, with 'prompt', 'summary',
+            'model_used', 'cached' and 'partial'. Prompts that ran out of time are
+            partial; prompts that failed carry 'error' and 'details'.
+        
+    Raises:
+        Exception: The first error, if every prompt failed with one
+    """
+    def answer(prompt):
+        try:
+            summary, cached, model_used, duplicate = get_or_generate_summary(content, prompt, model, use_cache,
+                                                                             deadline, metrics, routing)
+            result = {"prompt": prompt, "summary": summary, "model_used": model_used, "cached": cached,
+                      "partial": False}
+            if duplicate is not None:
+                result["duplicate_of"] = duplicate
+            return result, None
+        except deadlines.DeadlineExceeded as e:
+            return {"prompt": prompt, "summary": None, "cached": False, "partial": True, "details": str(e)}, None
+        except Exception as e:
+            logger.error(f"Error answering prompt {prompt!r}: {str(e)}")
+            return {"prompt": prompt, "summary": None, "cached": False, "partial": False,
+                    "error": "Summary generation failed", "details": str(e)}, e
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(PROMPT_WORKERS, len(prompts)))) as pool:
+        answers = list(pool.map(answer, prompts))
+    
+    errors = [error for _, error in answers if error is not None]
+    if len(errors) == len(answers):
+        raise errors[0]
+    return [result for result, _ in answers]
+
+def offload_content(content):
+    """
+    Write extracted content to the content bucket
+    
+    Args:
+        content (str): The extracted content
+        
+    Returns:
+        dict: 'extracted_content_url', a presigned GET URL for the object, and
+            'extracted_content_expires_in', its lifetime in seconds
+    """
+    s3_client = client_cache.get('s3', os.environ.get('AWS_REGION', BEDROCK_REGION))
+    key = payload.content_key(content, CONTENT_KEY_PREFIX)
+    s3_client.put_object(
+        Bucket=CONTENT_BUCKET,
+        Key=key,
+        Body=content.encode('utf-8'),
+        ContentType='text/markdown; charset=utf-8'
+    )
+    url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': CONTENT_BUCKET, 'Key': key},
+        ExpiresIn=CONTENT_URL_EXPIRATION_SECONDS
+    )
+    return {
+        "extracted_content_url": url,
+        "extracted_content_expires_in": CONTENT_URL_EXPIRATION_SECONDS
+    }
+
+def shape_content(content, mode, metrics=None):
+    """
+    Build the response fields for the extracted content in the requested mode
+    
+    Args:
+        content (str): The extracted content
+        mode (str): One of payload.CONTENT_MODES
+        metrics (RequestMetrics, optional): Records the time spent shaping the content
+        
+    Returns:
+        dict: Fields to merge into the response or result
+    """
+    metrics = metrics or instrumentation.NULL_METRICS
+    with metrics.stage('shape'):
+        return payload.shape_content(
+            content,
+            mode,
+            CONTENT_INLINE_MAX_BYTES,
+            CONTENT_GZIP_MAX_BYTES,
+            offload=offload_content if CONTENT_BUCKET else None
+        )
+
+def _content_mode_error(mode):
+    """Check a requested content mode, returning an error message or None"""
+    if mode not in payload.CONTENT_MODES:
+        return f"content_mode must be one of: {', '.join(payload.CONTENT_MODES)}"
+    if mode == 's3' and not CONTENT_BUCKET:
+        return "content_mode 's3' is not available: no content bucket is configured"
+    return None
+
+def _prompt_error(body):
+    """Check a request's prompt, returning an error message or None"""
+    if 'prompt' not in body:
+        return None
+    prompt = body['prompt']
+    if not isinstance(prompt, str) or not prompt.strip():
+        return "prompt must be a non-empty string"
+    return None
+
+def _prompts_error(body):
+    """Check a request's prompts list, returning an error message or None"""
+    prompts = body.get('prompts')
+    if not isinstance(prompts, list) or not prompts or \
+            not all(isinstance(prompt, str) and prompt.strip() for prompt in prompts):
+        return "prompts must be a non-empty list of strings"
+    if len(prompts) > MAX_PROMPTS:
+        return f"A request may contain at most {MAX_PROMPTS} prompts"
+    if 'urls' in body:
+        return "prompts cannot be combined with urls"
+    return None
+
+def _is_crawl(body):
+    """Check whether a request asks for a crawl; an empty crawl object uses the default limits"""
+    return body.get('crawl') not in (None, False)
+
+def _crawl_options(body):
+    """Read a request's crawl limits, filling in the defaults"""
+    options = body.get('crawl')
+    options = options if isinstance(options, dict) else {}
+    return {
+        "max_pages": options.get('max_pages', min(20, CRAWL_MAX_PAGES)),
+        "max_depth": options.get('max_depth', min(2, CRAWL_MAX_DEPTH)),
+        "sitemap": options.get('sitemap', True) is not False
+    }
+
+def _crawl_error(body):
+    """Check a request's crawl options, returning an error message or None"""
+    if not isinstance(body.get('crawl'), (bool, dict)):
+        return "crawl must be true or an object with max_pages, max_depth and sitemap"
+    options = _crawl_options(body)
+    if isinstance(options['max_pages'], bool) or not isinstance(options['max_pages'], int) or \
+            not 1 <= options['max_pages'] <= CRAWL_MAX_PAGES:
+        return f"crawl.max_pages must be between 1 and {CRAWL_MAX_PAGES}"
+    if isinstance(options['max_depth'], bool) or not isinstance(options['max_depth'], int) or \
+            not 0 <= options['max_depth'] <= CRAWL_MAX_DEPTH:
+        return f"crawl.max_depth must be between 0 and {CRAWL_MAX_DEPTH}"
+    if 'urls' in body or 'prompts' in body:
+        return "crawl cannot be combined with urls or prompts"
+    return None
+
+def _routing_error(body):
+    """Check a request's routing options, returning an error message or None"""
+    prompt_classes = [prompt_class for prompt_class, _ in router.PROMPT_CLASSES] + [router.GENERAL]
+    if body.get('prompt_class') is not None and body['prompt_class'] not in prompt_classes:
+        return f"prompt_class must be one of: {', '.join(prompt_classes)}"
+    target = body.get('latency_target_ms')
+    if target is not None and (isinstance(target, bool) or not isinstance(target, (int, float)) or target <= 0):
+        return "latency_target_ms must be a positive number"
+    return None
+
+def _request_error(body, crawl_allowed=False):
+    """
+    Validate a parsed request body before any work is done
+    
+    Args:
+        body (dict): The request body
+        crawl_allowed (bool, optional): Accept crawl requests, which only run as async jobs
+        
+    Returns:
+        dict: A 400 API response, or None if the request is valid
+    """
+    error = "Invalid parameter"
+    details = _content_mode_error(body.get('content_mode', CONTENT_MODE_DEFAULT))
+    if details is None and 'urls' in body:
+        urls = body.get('urls')
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+            details = "urls must be a non-empty list of strings"
+        elif len(urls) > BATCH_MAX_URLS:
+            details = f"A batch may contain at most {BATCH_MAX_URLS} URLs"
+    elif details is None and not body.get('url'):
+        error, details = "Missing required parameter", "URL parameter is required"
+    if details is None:
+        details = _prompt_error(body)
+    if details is None and 'prompts' in body:
+        details = _prompts_error(body)
+    if details is None and _is_crawl(body):
+        details = _crawl_error(body)
+        if details is None and not crawl_allowed:
+            details = "A crawl takes longer than API Gateway allows; submit it with \"async\": true"
+    if details is None:
+        details = _routing_error(body)
+    
+    if details is None:
+        return None
+    return {
+        "statusCode": 400,
+        "body": json.dumps({
+            "error": error,
+            "details": details
+        })
+    }
+
+def _error_result(url, error):
+    """Build the per-URL result for a failed batch item, mirroring the single-URL error responses"""
+    if isinstance(error, deadlines.DeadlineExceeded):
+        return {
+            "url": url,
+            "statusCode": 504,
+            "error": "Deadline exceeded",
+            "details": str(error)
+        }
+    if isinstance(error, ValueError):
+        return {
+            "url": url,
+            "statusCode": 400,
+            "error": "Content extraction failed",
+            "details": str(error)
+        }
+    logger.error(f"Error processing {url}: {str(error)}")
+    return {
+        "url": url,
+        "statusCode": 500,
+        "error": "Internal server error",
+        "details": str(error)
+    }
+
+def process_batch(urls, prompt, model=None, use_cache=True, deadline=None, metrics=None, routing=None):
+    """
+    Extract and summarize several URLs with bounded concurrency
+    
+    Downloads and extractions run on one worker pool and Bedrock calls on
+    another. A page is handed to the summary pool as soon as its extraction
+    finishes, so network fetches overlap with summarization of earlier pages.
+    
+    Args:
+        urls (list): The URLs to process
+        prompt (str): The prompt to use for summarization
+        model (str, optional): The model ID or inference profile ARN to use
+        use_cache (bool, optional): Set to False to bypass the summary cache lookup
+        deadline (Deadline, optional): Request deadline shared by every URL
+        metrics (RequestMetrics, optional): Accumulates stage durations and counters across URLs
+        routing (dict, optional): 'prompt_class' and 'latency_target_ms' from the request
+        
+    Returns:
+        list: One result per URL, in request order, each routed on its own. Failed URLs carry a
+            statusCode, error and details instead of a summary. URLs that were
+            extracted but ran out of time for Bedrock are returned as partial.
+    """
+    results = [None] * len(urls)
+    
+    with ThreadPoolExecutor(max_workers=BATCH_FETCH_WORKERS) as fetch_pool, \
+            ThreadPoolExecutor(max_workers=BATCH_SUMMARY_WORKERS) as summary_pool:
+        fetch_futures = {fetch_pool.submit(extract_content, url, deadline, metrics): index for index, url in enumerate(urls)}
+        summary_futures = {}
+        
+        for future in as_completed(fetch_futures):
+            index = fetch_futures[future]
+            try:
+                extracted_content = future.result()
+            except Exception as e:
+                results[index] = _error_result(urls[index], e)
+                continue
+            summary_future = summary_pool.submit(
+                get_or_generate_summary, extracted_content, prompt, model, use_cache, deadline, metrics, routing,
+                urls[index]
+            )
+            summary_futures[summary_future] = (index, extracted_content)
+        
+        for future in as_completed(summary_futures):
+            index, extracted_content = summary_futures[future]
+            partial = None
+            try:
+                summary, cached, model_used, duplicate = future.result()
+            except deadlines.DeadlineExceeded as e:
+                summary, cached, model_used, duplicate, partial = None, False, None, None, str(e)
+            except Exception as e:
+                results[index] = _error_result(urls[index], e)
+                continue
+            results[index] = {
+                "url": urls[index],
+                "statusCode": 200,
+                "extracted_content": extracted_content,
+                "summary": summary,
+                "model_used": model_used,
+                "cached": cached,
+                "partial": partial is not None
+            }
+            if partial is not None:
+                results[index]["details"] = partial
+            if duplicate is not None:
+                results[index]["duplicate_of"] = duplicate
+    
+    return results
+
+def _batch_response(urls, prompt, model, use_cache, start_time, deadline, metrics, include_timings,
+                    content_mode, routing):
+    """Process a validated batch request and build its API response"""
+    results = process_batch(urls, prompt, model, use_cache, deadline, metrics, routing)
+    for index, result in enumerate(results):
+        if result["statusCode"] != 200:
+            continue
+        try:
+            result.update(shape_content(result["extracted_content"], content_mode, metrics))
+        except Exception as e:
+            results[index] = _error_result(result["url"], e)
+    succeeded = sum(1 for result in results if result["statusCode"] == 200)
+    
+    response_body = {
+        "results": results,
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "model_used": _requested_model(model),
+        "processing_time": round(time.time() - start_time, 2)
+    }
+    if include_timings:
+        response_body["timings"] = metrics.to_dict()
+    
+    with metrics.stage('serialize'):
+        serialized = json.dumps(response_body)
+    return {
+        "statusCode": 200,
+        "body": serialized
+    }
+
+def _prompts_response(url, extracted_content, prompts, model, use_cache, start_time, deadline, metrics,
+                      include_timings, content_mode, routing):
+    """Answer a validated prompts list over extracted content and build its API response"""
+    results = summarize_prompts(extracted_content, prompts, model, use_cache, deadline, metrics, routing)
+    
+    response_body = {"url": url}
+    response_body.update(shape_content(extracted_content, content_mode, metrics))
+    response_body.update({
+        "summaries": results,
+        "model_used": _requested_model(model),
+        "cached": all(result["cached"] for result in results),
+        "partial": any(result["partial"] for result in results),
+        "processing_time": round(time.time() - start_time, 2)
+    })
+    if include_timings:
+        response_body["timings"] = metrics.to_dict()
+    
+    with metrics.stage('serialize'):
+        serialized = json.dumps(response_body)
+    return {
+        "statusCode": 200,
+        "body": serialized
+    }
+
+def _requested_model(model):
+    """Name the requested model for responses covering several Bedrock calls"""
+    if model and model != 'auto':
+        return model
+    return 'auto' if ROUTING_ENABLED else DEFAULT_MODEL
+
+def _routing_options(body):
+    """Collect the router inputs a request can set"""
+    return {
+        "prompt_class": body.get('prompt_class'),
+        "latency_target_ms": body.get('latency_target_ms')
+    }
+
+def _submit_job(body):
+    """Store a validated request as a job and return its ID with a 202"""
+    request = {key: value for key, value in body.items() if key != 'async'}
+    try:
+        job = job_queue.submit(request)
+    except Exception as e:
+        logger.error(f"Error submitting job: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "error": "Internal server error",
+                "details": f"Failed to submit job: {str(e)}"
+            })
+        }
+    return {
+        "statusCode": 202,
+        "body": json.dumps({
+            "job_id": job['job_id'],
+            "status": job['status'],
+            "status_path": f"/website-to-text/jobs/{job['job_id']}"
+        })
+    }
+
+def _job_status_response(job_id):
+    """Build the polling response for GET /website-to-text/jobs/{job_id}"""
+    if not job_id:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({
+                "error": "Missing required parameter",
+                "details": "job_id path parameter is required"
+            })
+        }
+    try:
+        job = job_queue.get(job_id)
+    except Exception as e:
+        logger.error(f"Error reading job {job_id}: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "error": "Internal server error",
+                "details": str(e)
+            })
+        }
+    if job is None:
+        return {
+            "statusCode": 404,
+            "body": json.dumps({
+                "error": "Job not found",
+                "job_id": job_id
+            })
+        }
+    return {
+        "statusCode": 200,
+        "body": json.dumps(jobs.public_view(job))
+    }
+
+def cache_stats():
+    """
+    Get the container-wide counters of the profile resolver and the caches
+    
+    Returns:
+        dict: `profile_resolver.stats()` plus the content and summary cache
+            stats, prefixed with `content_cache_` and `summary_cache_`
+    """
+    stats = dict(profile_resolver.stats())
+    for prefix, store in (('content_cache', content_cache), ('summary_cache', summary_cache)):
+        stats.update({f"{prefix}_{name}": value for name, value in store.stats().items()})
+    return stats
+
+def _emit_metrics(metrics, function_name='website_to_text'):
+    """Write a request's EMF record with the cache counters, never letting a metrics failure break the response"""
+    if not METRICS_ENABLED:
+        return
+    try:
+        metrics.emit(METRICS_NAMESPACE, {"Function": function_name}, gauges=cache_stats())
+    except Exception as e:
+        logger.warning(f"Failed to emit metrics: {str(e)}")
+
 def lambda_handler(event, context):
     """
     Lambda handler function
@@ -203,6 +1389,30 @@ def lambda_handler(event, context):
     """
     start_time = time.time()
     
+    # Every stage sizes its timeouts from what is left of the invocation. API Gateway
+    # gives up at 29 seconds, however long the function may run, so the budget
+    # stops there and a partial result still reaches the client.
+    deadline = deadlines.Deadline.from_context(context, DEADLINE_SAFETY_MARGIN, DEFAULT_DEADLINE_SECONDS,
+                                               max_seconds=API_GATEWAY_DEADLINE_SECONDS)
+    metrics = instrumentation.RequestMetrics(memory_profiler)
+    
+    try:
+        with metrics.stage('total'):
+            response = _handle_request(event, deadline, metrics, start_time)
+    finally:
+        _emit_metrics(metrics)
+    return response
+
+def _handle_request(event, deadline, metrics, start_time, in_job=False, progress=None):
+    """
+    Process one API Gateway request for `lambda_handler`, or a stored request for `run_job`
+    
+    `progress`, passed by `run_job`, receives the partial response body of a
+    crawl as its pages finish.
+    """
+    if event.get('httpMethod') == 'GET':
+        return _job_status_response((event.get('pathParameters') or {}).get('job_id'))
+    
     try:
         # Extract parameters from the event
         body = event.get('body', '{}')
@@ -211,38 +1421,87 @@ def lambda_handler(event, context):
         
         url = body.get('url')
         prompt = body.get('prompt', 'Provide a concise summary of the main points')
-        model = body.get('model', DEFAULT_MODEL)
-        
-        if not url:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({
-                    "error": "Missing required parameter",
-                    "details": "URL parameter is required"
-                })
-            }
+        model = body.get('model')
+        routing = _routing_options(body)
+        use_cache = body.get('cache', True) is not False
+        include_timings = body.get('timings', False) is True
+        content_mode = body.get('content_mode', CONTENT_MODE_DEFAULT)
+        
+        invalid = _request_error(body, crawl_allowed=in_job or body.get('async') is True)
+        if invalid:
+            return invalid
+        
+        # Async mode stores the request as a job and returns before any work is done
+        if body.get('async') is True:
+            return _submit_job(body)
+        
+        # Crawls only get here from the job worker, which has time for a whole site
+        if _is_crawl(body):
+            return _crawl_response(body, deadline, metrics, start_time, progress)
+        
+        # Batch mode processes a list of URLs and reports errors per URL
+        if 'urls' in body:
+            return _batch_response(body.get('urls'), prompt, model, use_cache, start_time, deadline, metrics,
+                                   include_timings, content_mode, routing)
         
         # Extract content from the URL
-        extracted_content = extract_content(url)
+        extracted_content = extract_content(url, deadline, metrics)
         
-        # Generate summary using Bedrock
-        summary = generate_summary(extracted_content, prompt, model)
+        # A prompts list is answered from this one extraction
+        if 'prompts' in body:
+            return _prompts_response(url, extracted_content, body['prompts'], model, use_cache, start_time,
+                                     deadline, metrics, include_timings, content_mode, routing)
+        
+        # Generate summary using Bedrock, unless an identical request was recently answered.
+        # Running out of time here still returns the extracted content as a partial result.
+        partial = None
+        try:
+            summary, cached, model_used, duplicate = get_or_generate_summary(
+                extracted_content, prompt, model, use_cache, deadline, metrics, routing, url
+            )
+        except deadlines.DeadlineExceeded as e:
+            logger.warning(f"Returning partial result for {url}: {str(e)}")
+            summary, cached, duplicate, partial = None, False, None, str(e)
+            model_used = select_models(extracted_content, prompt, model, routing)[0]
+        
+        response_body = {"url": url}
+        response_body.update(shape_content(extracted_content, content_mode, metrics))
         
         # Calculate processing time
         processing_time = round(time.time() - start_time, 2)
         
+        response_body.update({
+            "summary": summary,
+            "model_used": model_used,
+            "cached": cached,
+            "partial": partial is not None,
+            "processing_time": processing_time
+        })
+        if partial is not None:
+            response_body["details"] = partial
+        if duplicate is not None:
+            response_body["duplicate_of"] = duplicate
+        if include_timings:
+            response_body["timings"] = metrics.to_dict()
+        
         # Return successful response
+        with metrics.stage('serialize'):
+            serialized = json.dumps(response_body)
         return {
             "statusCode": 200,
+            "body": serialized
+        }
+        
+    except deadlines.DeadlineExceeded as e:
+        logger.error(f"Deadline exceeded: {str(e)}")
+        return {
+            "statusCode": 504,
             "body": json.dumps({
-                "url": url,
-                "extracted_content": extracted_content,
-                "summary": summary,
-                "model_used": model,
-                "processing_time": processing_time
+                "error": "Deadline exceeded",
+                "details": str(e),
+                "url": body.get('url') if 'body' in locals() and isinstance(body, dict) else None
             })
         }
-        
     except ValueError as e:
         return {
             "statusCode": 400,
@@ -261,4 +1520,421 @@ def lambda_handler(event, context):
                 "details": str(e),
                 "url": body.get('url') if 'body' in locals() and isinstance(body, dict) else None
             })
-        }
\ No newline at end of file
+        }
+
+def _ndjson(record):
+    """Encode one record as a newline-delimited JSON line"""
+    return (json.dumps(record) + "\n").encode('utf-8')
+
+def stream_handler(event, context):
+    """
+    Response-streaming entry point
+    
+    Produces the same result as `lambda_handler`, but as newline-delimited
+    JSON records written as soon as they are available: a `content` record
+    after extraction, a `delta` record per generated text fragment, and a
+    final `done` or `error` record. The buffered `lambda_handler` remains the
+    API Gateway entry point; the managed Python runtime cannot stream a
+    generator, so this one is not deployed by template.yaml.
+    
+    Args:
+        event (dict): Lambda event
+        context (object): Lambda context
+        
+    Yields:
+        bytes: NDJSON encoded records
+    """
+    start_time = time.time()
+    deadline = deadlines.Deadline.from_context(context, DEADLINE_SAFETY_MARGIN, DEFAULT_DEADLINE_SECONDS)
+    metrics = instrumentation.RequestMetrics(memory_profiler)
+    try:
+        with metrics.stage('total'):
+            yield from _stream_request(event, deadline, metrics, start_time)
+    finally:
+        _emit_metrics(metrics)
+
+
+def _stream_request(event, deadline, metrics, start_time):
+    """Produce the NDJSON records for one streaming request"""
+    body = event.get('body', '{}')
+    try:
+        if isinstance(body, str):
+            body = json.loads(body)
+    except ValueError:
+        yield _ndjson({"type": "error", "statusCode": 400, "error": "Invalid JSON in request body"})
+        return
+    
+    url = body.get('url')
+    prompt = body.get('prompt', 'Provide a concise summary of the main points')
+    model = body.get('model')
+    routing = _routing_options(body)
+    use_cache = body.get('cache', True) is not False
+    include_timings = body.get('timings', False) is True
+    content_mode = body.get('content_mode', CONTENT_MODE_DEFAULT)
+    
+    invalid = _content_mode_error(content_mode) or _prompt_error(body) or _routing_error(body)
+    if invalid is None and _is_crawl(body):
+        invalid = _crawl_error(body)
+    elif invalid is None and 'prompts' in body:
+        invalid = "prompts are not supported when streaming; use lambda_handler"
+    if invalid:
+        yield _ndjson({
+            "type": "error",
+            "statusCode": 400,
+            "error": "Invalid parameter",
+            "details": invalid
+        })
+        return
+    
+    if not url:
+        yield _ndjson({
+            "type": "error",
+            "statusCode": 400,
+            "error": "Missing required parameter",
+            "details": "URL parameter is required"
+        })
+        return
+    
+    if _is_crawl(body):
+        yield from _crawl_stream(body, deadline, metrics, start_time)
+        return
+    
+    try:
+        extracted_content = extract_content(url, deadline, metrics)
+    except deadlines.DeadlineExceeded as e:
+        yield _ndjson({
+            "type": "error",
+            "statusCode": 504,
+            "error": "Deadline exceeded",
+            "details": str(e),
+            "url": url
+        })
+        return
+    except ValueError as e:
+        yield _ndjson({
+            "type": "error",
+            "statusCode": 400,
+            "error": "Content extraction failed",
+            "details": str(e),
+            "url": url
+        })
+        return
+    
+    content_record = {"type": "content", "url": url}
+    try:
+        content_record.update(shape_content(extracted_content, content_mode, metrics))
+    except Exception as e:
+        logger.error(f"Error returning content for {url}: {str(e)}")
+        yield _ndjson({
+            "type": "error",
+            "statusCode": 500,
+            "error": "Internal server error",
+            "details": str(e),
+            "url": url
+        })
+        return
+    models = select_models(extracted_content, prompt, model, routing)
+    model_used = models[0]
+    content_record["model_used"] = model_used
+    yield _ndjson(content_record)
+    
+    fingerprint = content_fingerprint(extracted_content)
+    summary, duplicate = lookup_summary(extracted_content, prompt, model_used, fingerprint, metrics, url) \
+        if use_cache else (None, None)
+    cached = summary is not None
+    
+    partial = None
+    if cached:
+        yield _ndjson({"type": "delta", "text": summary})
+    else:
+        parts = []
+        try:
+            for index, model_used in enumerate(models):
+                try:
+                    # Long pages are mapped to partial summaries first, then the reduce call is streamed
+                    final_content, final_prompt = prepare_summary_input(extracted_content, prompt, model_used,
+                                                                         deadline, metrics)
+                    for delta in generate_summary_stream(final_content, final_prompt, model_used, deadline,
+                                                         metrics):
+                        parts.append(delta)
+                        yield _ndjson({"type": "delta", "text": delta})
+                    break
+                except router.ModelThrottled:
+                    # Once text has been sent, the answer cannot switch to another model
+                    if parts or index == len(models) - 1:
+                        raise
+                    logger.warning(f"{model_used} is throttled, falling back to {models[index + 1]}")
+                    metrics.add('model_fallbacks', 1)
+        except deadlines.DeadlineExceeded as e:
+            # The content record and any deltas already sent stand as a partial result
+            logger.warning(f"Returning partial result for {url}: {str(e)}")
+            partial = str(e)
+        except Exception as e:
+            logger.error(f"Error processing request: {str(e)}")
+            yield _ndjson({
+                "type": "error",
+                "statusCode": 500,
+                "error": "Internal server error",
+                "details": str(e),
+                "url": url
+            })
+            return
+        if partial is None:
+            store_summary(extracted_content, prompt, model_used, "".join(parts).strip(), fingerprint, url)
+    
+    done = {
+        "type": "done",
+        "model_used": model_used if partial is not None else invoked_model_id(model_used),
+        "cached": cached,
+        "partial": partial is not None,
+        "processing_time": round(time.time() - start_time, 2)
+    }
+    if partial is not None:
+        done["details"] = partial
+    if duplicate is not None:
+        done["duplicate_of"] = duplicate
+    if include_timings:
+        done["timings"] = metrics.to_dict()
+    yield _ndjson(done)
+
+def fetch_sitemap(url, deadline=None):
+    """
+    Download a sitemap for a crawl
+    
+    Args:
+        url (str): The sitemap URL
+        deadline (Deadline, optional): Request deadline bounding the download
+        
+    Returns:
+        bytes: The sitemap, or None if it does not exist
+    """
+    timeout = deadline.budget(TIMEOUT_SECONDS) if deadline is not None else None
+    response = page_fetcher.fetch(url, timeout=timeout, allowed_types=crawler.SITEMAP_CONTENT_TYPES)
+    return response['content'] if response['status_code'] == 200 else None
+
+def _crawl_page(url, depth, extracted_content, error, prompt, model, use_cache, deadline, metrics, routing,
+                content_mode):
+    """Summarize one crawled page and build its NDJSON record"""
+    if error is not None:
+        result = _error_result(url, error)
+    else:
+        partial = None
+        try:
+            summary, cached, model_used, duplicate = get_or_generate_summary(
+                extracted_content, prompt, model, use_cache, deadline, metrics, routing, url
+            )
+        except deadlines.DeadlineExceeded as e:
+            summary, cached, model_used, duplicate, partial = None, False, None, None, str(e)
+        result = {"url": url, "statusCode": 200}
+        result.update(shape_content(extracted_content, content_mode, metrics))
+        result.update({
+            "summary": summary,
+            "model_used": model_used,
+            "cached": cached,
+            "partial": partial is not None
+        })
+        if partial is not None:
+            result["details"] = partial
+        if duplicate is not None:
+            result["duplicate_of"] = duplicate
+    record = {"type": "page", "depth": depth}
+    record.update(result)
+    return record
+
+def _crawl_stream(body, deadline, metrics, start_time):
+    """
+    Produce the NDJSON records for a validated crawl request
+    
+    Yields a `page` record for every visited page as soon as it has been
+    summarized, then a `done` record with the totals and, if the crawl was
+    cut short, the reason in `stopped`.
+    """
+    for record in _crawl_records(body, deadline, metrics, start_time):
+        yield _ndjson(record)
+
+def _crawl_response(body, deadline, metrics, start_time, progress=None):
+    """
+    Run a validated crawl for an async job and build its API response from the collected records
+    
+    While the crawl runs, `progress` is called with the pages finished so far,
+    at most every `JOB_PROGRESS_INTERVAL_SECONDS` and not after the last page.
+    """
+    results = []
+    last_progress = time.monotonic()
+    for record in _crawl_records(body, deadline, metrics, start_time):
+        kind = record.pop("type")
+        if kind == "done":
+            response_body = record
+            break
+        results.append(record)
+        if progress is not None and time.monotonic() - last_progress >= JOB_PROGRESS_INTERVAL_SECONDS:
+            progress({"url": body['url'], "pages": len(results), "results": results})
+            last_progress = time.monotonic()
+    # The done record carries the totals; the page records become its results
+    response_body["results"] = results
+    
+    with metrics.stage('serialize'):
+        serialized = json.dumps(response_body)
+    return {
+        "statusCode": 200,
+        "body": serialized
+    }
+
+def _crawl_records(body, deadline, metrics, start_time):
+    """Crawl the site of a validated crawl request, yielding its page records and then the done record"""
+    url = body['url']
+    prompt = body.get('prompt', 'Provide a concise summary of the main points')
+    model = body.get('model')
+    routing = _routing_options(body)
+    use_cache = body.get('cache', True) is not False
+    content_mode = body.get('content_mode', CONTENT_MODE_DEFAULT)
+    options = _crawl_options(body)
+    
+    def process_page(page_url, depth, extracted_content, error):
+        try:
+            return _crawl_page(page_url, depth, extracted_content, error, prompt, model, use_cache, deadline,
+                               metrics, routing, content_mode)
+        except Exception as e:
+            record = {"type": "page", "depth": depth}
+            record.update(_error_result(page_url, e))
+            return record
+    
+    site = crawler.Crawler(
+        fetch_page=lambda page_url: extract_content(page_url, deadline, metrics),
+        process_page=process_page,
+        fetch_sitemap=(lambda sitemap_url: fetch_sitemap(sitemap_url, deadline)) if options['sitemap'] else None,
+        max_pages=options['max_pages'],
+        max_depth=options['max_depth'],
+        workers=CRAWL_WORKERS,
+        throttle=crawler.HostThrottle(CRAWL_HOST_CONCURRENCY, CRAWL_HOST_DELAY_SECONDS)
+    )
+    pages = succeeded = 0
+    # A page is only started while there is time left to download and summarize it
+    for record in site.crawl(url, deadline, reserve_seconds=SUMMARY_RESERVE_SECONDS):
+        pages += 1
+        succeeded += record["statusCode"] == 200
+        metrics.add('pages_crawled', 1)
+        yield record
+    
+    done = {
+        "type": "done",
+        "url": url,
+        "pages": pages,
+        "succeeded": succeeded,
+        "failed": pages - succeeded,
+        "stopped": site.stopped,
+        "model_used": _requested_model(model),
+        "processing_time": round(time.time() - start_time, 2)
+    }
+    if body.get('timings', False) is True:
+        done["timings"] = metrics.to_dict()
+    yield done
+
+def run_job(job_id, deadline=None, metrics=None):
+    """
+    Process one queued job
+    
+    The stored request goes through the same extraction and summarization
+    path as a synchronous call, and the response that call would have
+    returned is stored as the job's result. A job that fails unexpectedly,
+    or whose result cannot be stored, is marked failed rather than left
+    running.
+    
+    Args:
+        job_id (str): The job ID
+        deadline (Deadline, optional): Deadline of the worker invocation
+        metrics (RequestMetrics, optional): Accumulates stage durations and counters across jobs
+        
+    Returns:
+        bool: False if the job ran out of time and should be retried, otherwise True
+    """
+    job = job_queue.start(job_id)
+    if job is None:
+        # Unknown, expired or already finished, e.g. a redelivered message
+        return True
+    
+    deadline = deadline or deadlines.Deadline(DEFAULT_DEADLINE_SECONDS)
+    metrics = metrics or instrumentation.NULL_METRICS
+    
+    def report_progress(body):
+        # Progress is best effort; the final result is still stored when the job finishes
+        try:
+            job_queue.progress(job_id, body)
+        except Exception as e:
+            logger.warning(f"Error storing the progress of job {job_id}: {str(e)}")
+    
+    try:
+        response = _handle_request({"body": job['request']}, deadline, metrics, time.time(), in_job=True,
+                                   progress=report_progress)
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {str(e)}")
+        job_queue.fail(job_id, str(e))
+        return True
+    if response["statusCode"] == 504 and job['attempts'] < JOB_MAX_ATTEMPTS:
+        logger.warning(f"Job {job_id} ran out of time, leaving it queued for a retry")
+        return False
+    
+    try:
+        job_queue.complete(job_id, response["statusCode"], json.loads(response["body"]))
+    except Exception as e:
+        logger.error(f"Error storing the result of job {job_id}: {str(e)}")
+        job_queue.fail(job_id, f"Failed to store the result: {str(e)}")
+    return True
+
+def job_worker(event, context):
+    """
+    Worker entry point for async jobs
+    
+    Triggered by the SQS event source mapping, it processes the job IDs in
+    the event's records. Invoked with any other event, e.g. on a schedule or
+    locally, it pulls up to JOB_WORKER_BATCH_SIZE jobs from the job backend.
+    Jobs in a batch run concurrently and share the invocation's deadline.
+    
+    Args:
+        event (dict): SQS event, or any other event to poll the backend
+        context (object): Lambda context
+        
+    Returns:
+        dict: 'batchItemFailures' naming messages to redeliver, and the number of jobs processed
+    """
+    deadline = deadlines.Deadline.from_context(context, DEADLINE_SAFETY_MARGIN, DEFAULT_DEADLINE_SECONDS)
+    metrics = instrumentation.RequestMetrics(memory_profiler)
+    
+    records = (event or {}).get('Records')
+    if records:
+        messages = [(json.loads(record['body'])['job_id'], record['messageId']) for record in records]
+    else:
+        messages = job_queue.receive(JOB_WORKER_BATCH_SIZE)
+    
+    failures = []
+    try:
+        with metrics.stage('total'):
+            with ThreadPoolExecutor(max_workers=max(1, JOB_WORKER_CONCURRENCY)) as pool:
+                futures = {}
+                started = set()
+                for job_id, receipt in messages:
+                    # A job delivered twice in one batch is run once; the duplicate is done with it
+                    if job_id in started:
+                        if not records:
+                            job_queue.ack(receipt)
+                        continue
+                    started.add(job_id)
+                    futures[pool.submit(run_job, job_id, deadline, metrics)] = (job_id, receipt)
+                for future in as_completed(futures):
+                    job_id, receipt = futures[future]
+                    try:
+                        done = future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing job {job_id}: {str(e)}")
+                        done = False
+                    if not done:
+                        failures.append(receipt)
+                    elif not records:
+                        job_queue.ack(receipt)
+    finally:
+        _emit_metrics(metrics, 'website_to_text_worker')
+    
+    return {
+        "batchItemFailures": [{"itemIdentifier": receipt} for receipt in failures],
+        "processed": len(messages) - len(failures)
+    }
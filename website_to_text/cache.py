@@ -0,0 +1,231 @@
+import hashlib
+import json
+import threading
+import time
+
+# The storage backends come from the shared layer, see shared/cache_backends.py
+from cache_backends import DiskBackend, MemoryBackend, create_backend  # noqa: F401
+
+
+class ContentCache:
+    """
+    Cache of extracted page content keyed by URL
+
+    Each entry keeps the markdown together with the ETag and Last-Modified
+    validators the origin returned, so the next fetch can be a conditional
+    GET. Entries younger than `fresh_seconds` are served without contacting
+    the origin at all.
+    """
+
+    def __init__(self, backend, fresh_seconds=0):
+        self.backend = backend
+        self.fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.changed = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def get(self, url):
+        """
+        Look up the cached entry for a URL
+
+        Args:
+            url (str): The page URL
+
+        Returns:
+            dict: The entry with markdown, etag, last_modified and stored_at, or None
+        """
+        if self.backend is None:
+            return None
+        entry = self.backend.get(url)
+        if entry is None:
+            self._count('misses')
+        return entry
+
+    def is_fresh(self, entry):
+        """Check whether an entry can be served without revalidation"""
+        return self.fresh_seconds > 0 and time.time() - entry['stored_at'] < self.fresh_seconds
+
+    def put(self, url, markdown, etag=None, last_modified=None):
+        """
+        Store extracted content with the origin's validators
+
+        Entries without any validator are only kept when a freshness window is
+        configured, since they could never be revalidated.
+        """
+        if self.backend is None:
+            return
+        if not etag and not last_modified and self.fresh_seconds <= 0:
+            return
+        self.backend.set(url, {
+            "markdown": markdown,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time()
+        })
+
+    def touch(self, url, entry):
+        """Restart the freshness window of an entry the origin confirmed unchanged"""
+        entry = dict(entry, stored_at=time.time())
+        self.backend.set(url, entry)
+        return entry
+
+    def record_hit(self):
+        self._count('hits')
+
+    def record_revalidated(self):
+        self._count('revalidated')
+
+    def record_changed(self):
+        self._count('changed')
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.revalidated = 0
+            self.changed = 0
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, misses, 304 revalidations, changed pages, size and evictions
+        """
+        lookups = self.hits + self.misses + self.revalidated + self.changed
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "changed": self.changed,
+            "hit_rate": round((self.hits + self.revalidated) / lookups, 4) if lookups else 0.0,
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "bytes": self.backend.size if self.backend is not None else 0,
+            "evictions": self.backend.evictions if self.backend is not None else 0
+        }
+
+
+class SummaryCache:
+    """
+    Cache of generated summaries keyed by a digest of the request
+
+    The key covers the whitespace-normalized content, the prompt, the model
+    and the inference configuration, so any change to what would be sent to
+    Bedrock produces a different key. Entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, backend, ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @staticmethod
+    def content_digest(content):
+        """Digest of the whitespace-normalized content, identifying it in summary keys"""
+        normalized = ' '.join((content or '').split())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def key(content, prompt, model, inference_config=None):
+        """
+        Build the cache key for a summary request
+
+        Args:
+            content (str): The content to summarize
+            prompt (str): The summarization prompt
+            model (str): The requested model ID
+            inference_config (dict, optional): Generation parameters
+
+        Returns:
+            str: A hex SHA-256 digest
+        """
+        return SummaryCache.digest_key(SummaryCache.content_digest(content), prompt, model, inference_config)
+
+    @staticmethod
+    def digest_key(digest, prompt, model, inference_config=None):
+        """Build the cache key for a summary request from the content's `content_digest`"""
+        payload = json.dumps({
+            "content": digest,
+            "prompt": (prompt or '').strip(),
+            "model": model,
+            "inference_config": inference_config or {}
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached summary
+
+        Returns:
+            str: The cached summary, or None on a miss or expired entry
+        """
+        if self.backend is None:
+            return None
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count('misses')
+            return None
+        if time.time() - entry['stored_at'] >= self.ttl:
+            self.backend.delete(key)
+            self._count('expired')
+            self._count('misses')
+            return None
+        self._count('hits')
+        return entry['summary']
+
+    def put(self, key, summary):
+        """Store a generated summary"""
+        if self.backend is None:
+            return
+        self.backend.set(key, {"summary": summary, "stored_at": time.time()})
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        if self.backend is not None:
+            self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.expired = 0
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, misses, expirations, hit rate, size and evictions
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "bytes": self.backend.size if self.backend is not None else 0,
+            "evictions": self.backend.evictions if self.backend is not None else 0
+        }
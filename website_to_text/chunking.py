@@ -0,0 +1,80 @@
+import re
+
+# Rough characters-per-token ratio for English prose, used to budget chunks
+CHARS_PER_TOKEN = 4
+
+HEADING_PATTERN = re.compile(r'^#{1,6}\s', re.MULTILINE)
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of model tokens in a piece of text
+
+    Args:
+        text (str): The text to measure
+
+    Returns:
+        int: Approximate token count
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _split_sections(markdown):
+    """Split markdown into sections that each start at a heading"""
+    starts = [match.start() for match in HEADING_PATTERN.finditer(markdown)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(markdown))
+    return [markdown[start:end].strip() for start, end in zip(starts, starts[1:]) if markdown[start:end].strip()]
+
+
+def _split_oversized(block, max_chars):
+    """Break a block that exceeds the budget on paragraph, sentence and finally character boundaries"""
+    if len(block) <= max_chars:
+        return [block]
+
+    for pattern in ('\n\n', None):
+        parts = block.split(pattern) if pattern else SENTENCE_PATTERN.split(block)
+        parts = [part.strip() for part in parts if part.strip()]
+        if len(parts) > 1:
+            pieces = []
+            for part in parts:
+                pieces.extend(_split_oversized(part, max_chars))
+            return pieces
+
+    return [block[i:i + max_chars] for i in range(0, len(block), max_chars)]
+
+
+def split_markdown(markdown, max_tokens):
+    """
+    Split markdown into chunks that each fit a token budget
+
+    Chunks prefer to break at headings, then at paragraphs, and only split
+    sentences or raw characters when a single paragraph is over budget.
+    Consecutive small sections are packed together into one chunk.
+
+    Args:
+        markdown (str): The markdown to split
+        max_tokens (int): Token budget per chunk
+
+    Returns:
+        list: Chunks of markdown, in document order
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    blocks = []
+    for section in _split_sections(markdown):
+        blocks.extend(_split_oversized(section, max_chars))
+
+    chunks = []
+    current = ''
+    for block in blocks:
+        candidate = f"{current}\n\n{block}" if current else block
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = block
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,255 @@
+import gzip
+import logging
+import re
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit
+
+# Configure logging
+logger = logging.getLogger()
+
+# Media types sitemaps are served with
+SITEMAP_CONTENT_TYPES = ('application/xml', 'text/xml', 'application/gzip', 'application/x-gzip', 'text/plain')
+
+# Markdown links as written by trafilatura: [text](target)
+MARKDOWN_LINK = re.compile(r'\[[^\]]*\]\(\s*<?([^)\s>]+)')
+
+# Links to files that are not pages
+SKIPPED_EXTENSIONS = ('.pdf', '.zip', '.gz', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.css', '.js', '.xml')
+
+# Nested sitemap indexes followed at most
+MAX_SITEMAP_DEPTH = 2
+
+STOP_MAX_PAGES = 'max_pages'
+STOP_DEADLINE = 'deadline'
+
+
+def normalize_url(url, base=None):
+    """
+    Make a link absolute and drop its fragment
+
+    Args:
+        url (str): The link
+        base (str, optional): URL of the page the link was found on
+
+    Returns:
+        str: The normalized URL, or None for non-HTTP links and links to files
+    """
+    url = urldefrag(urljoin(base, url.strip()) if base else url.strip())[0]
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+    if parts.path.lower().endswith(SKIPPED_EXTENSIONS):
+        return None
+    # https://example.com and https://example.com/ are the same page
+    return urlunsplit(parts._replace(path=parts.path or '/'))
+
+
+def same_host(url, root):
+    """Check whether two URLs are on the same host"""
+    return urlsplit(url).netloc.lower() == urlsplit(root).netloc.lower()
+
+
+def extract_links(markdown, base_url):
+    """
+    Find the same-host page links in extracted markdown
+
+    Args:
+        markdown (str): Content extracted with links included
+        base_url (str): URL of the page, for relative links
+
+    Returns:
+        list: Normalized URLs in order of appearance, without duplicates
+    """
+    links = []
+    for target in MARKDOWN_LINK.findall(markdown or ''):
+        url = normalize_url(target, base_url)
+        if url and same_host(url, base_url) and url not in links:
+            links.append(url)
+    return links
+
+
+def parse_sitemap(data):
+    """
+    Parse a sitemap or sitemap index
+
+    Args:
+        data (bytes): The sitemap, optionally gzip compressed
+
+    Returns:
+        tuple: Page URLs from a urlset and sitemap URLs from a sitemap index
+
+    Raises:
+        ValueError: If the document is not valid XML
+    """
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"Invalid sitemap: {str(e)}")
+    # Elements are namespaced, so match on the local name
+    locations = [element.text.strip() for element in root.iter()
+                 if element.tag.rsplit('}', 1)[-1] == 'loc' and element.text]
+    if root.tag.rsplit('}', 1)[-1] == 'sitemapindex':
+        return [], locations
+    return locations, []
+
+
+class HostThrottle:
+    """
+    Per-host politeness limits for a crawl
+
+    At most `concurrency` requests run against one host at a time, and
+    consecutive requests to a host start at least `delay` seconds apart.
+    """
+
+    def __init__(self, concurrency=2, delay=0.0):
+        self.concurrency = max(1, concurrency)
+        self.delay = delay
+        self._semaphores = {}
+        self._next_start = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        """Hold one of the host's request slots for the enclosed block"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.concurrency))
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+class Crawler:
+    """
+    Breadth-first crawl of one site
+
+    Pages come from the site's sitemap and from same-host links found in
+    each visited page, up to `max_pages` pages and `max_depth` link hops from
+    the root. Sitemap pages count as one hop. Pages are fetched concurrently
+    under the host's politeness limits, and each page's record is yielded as
+    soon as it is processed.
+    """
+
+    def __init__(self, fetch_page, process_page, fetch_sitemap=None, max_pages=20, max_depth=2, workers=4,
+                 throttle=None):
+        """
+        Args:
+            fetch_page (callable): Takes a URL and returns its extracted markdown
+            process_page (callable): Takes a URL, its depth, its markdown, or the
+                exception raised while fetching it, and returns the page's record
+            fetch_sitemap (callable, optional): Takes a sitemap URL and returns its bytes, or None
+            max_pages (int): Most pages visited, including the root
+            max_depth (int): Most link hops from the root
+            workers (int): Pages processed at once
+            throttle (HostThrottle, optional): Politeness limits for page and sitemap fetches
+        """
+        self.fetch_page = fetch_page
+        self.process_page = process_page
+        self.fetch_sitemap = fetch_sitemap
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.workers = workers
+        self.throttle = throttle or HostThrottle()
+        self.stopped = None
+
+    def sitemap_urls(self, root):
+        """
+        Read the pages listed in the root's /sitemap.xml, following sitemap indexes
+
+        Returns:
+            list: Same-host page URLs, empty if there is no usable sitemap
+        """
+        if self.fetch_sitemap is None:
+            return []
+        pending = deque([(urljoin(root, '/sitemap.xml'), 0)])
+        pages = []
+        while pending and len(pages) < self.max_pages:
+            sitemap, depth = pending.popleft()
+            try:
+                with self.throttle.slot(sitemap):
+                    data = self.fetch_sitemap(sitemap)
+                if not data:
+                    continue
+                urls, sitemaps = parse_sitemap(data)
+            except Exception as e:
+                logger.warning(f"Skipping sitemap {sitemap}: {str(e)}")
+                continue
+            for url in urls:
+                url = normalize_url(url)
+                if url and same_host(url, root) and url not in pages:
+                    pages.append(url)
+            if depth < MAX_SITEMAP_DEPTH:
+                pending.extend((url, depth + 1) for url in sitemaps if same_host(url, root))
+        return pages
+
+    def _visit(self, url, depth):
+        try:
+            with self.throttle.slot(url):
+                content = self.fetch_page(url)
+        except Exception as e:
+            return self.process_page(url, depth, None, e), []
+        links = extract_links(content, url) if depth < self.max_depth else []
+        return self.process_page(url, depth, content, None), links
+
+    def crawl(self, root, deadline=None, reserve_seconds=0):
+        """
+        Crawl a site
+
+        Args:
+            root (str): URL to start from
+            deadline (Deadline, optional): No page is started once less than
+                `reserve_seconds` remain
+            reserve_seconds (float, optional): Time a page needs to be processed
+
+        Yields:
+            dict: One record per visited page, in completion order. Afterwards
+                `stopped` says why pages were left out: 'max_pages', 'deadline' or None.
+        """
+        root = normalize_url(root) or root
+        seen = {root}
+        frontier = deque([(root, 0)])
+        if self.max_depth > 0:
+            for url in self.sitemap_urls(root):
+                if url not in seen:
+                    seen.add(url)
+                    frontier.append((url, 1))
+        visited = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            running = {}
+            while frontier or running:
+                while frontier and len(running) < self.workers:
+                    if visited >= self.max_pages:
+                        self.stopped = STOP_MAX_PAGES
+                        frontier.clear()
+                        break
+                    if deadline is not None and deadline.remaining() <= reserve_seconds:
+                        self.stopped = STOP_DEADLINE
+                        frontier.clear()
+                        break
+                    url, depth = frontier.popleft()
+                    running[pool.submit(self._visit, url, depth)] = depth
+                    visited += 1
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    depth = running.pop(future)
+                    record, links = future.result()
+                    for link in links:
+                        if link not in seen:
+                            seen.add(link)
+                            frontier.append((link, depth + 1))
+                    yield record
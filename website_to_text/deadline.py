@@ -0,0 +1,62 @@
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage cannot finish within the remaining time budget"""
+
+
+class Deadline:
+    """
+    End-to-end time budget for one invocation
+
+    Created once per request from the Lambda context and passed through every
+    stage, so each stage sizes its own timeouts from what is actually left
+    instead of from a fixed configuration value.
+    """
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_context(cls, context, safety_margin=1.0, fallback_seconds=60, max_seconds=None):
+        """
+        Create a deadline from a Lambda context
+
+        Args:
+            context (object): Lambda context, or None when invoked locally
+            safety_margin (float, optional): Seconds kept back to serialize and return the response
+            fallback_seconds (float, optional): Budget used when there is no context
+            max_seconds (float, optional): Cap on the budget, for callers that give up
+                before the invocation times out, such as API Gateway
+
+        Returns:
+            Deadline: The request deadline
+        """
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            seconds = context.get_remaining_time_in_millis() / 1000.0
+        else:
+            seconds = fallback_seconds
+        if max_seconds is not None:
+            seconds = min(seconds, max_seconds)
+        return cls(max(seconds - safety_margin, 0))
+
+    def remaining(self):
+        """Seconds left before the deadline"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        """Check whether the deadline has passed"""
+        return self.remaining() <= 0
+
+    def budget(self, cap, reserve=0):
+        """
+        Size a stage timeout from the remaining time
+
+        Args:
+            cap (float): The stage's own configured maximum
+            reserve (float, optional): Seconds to leave for later stages
+
+        Returns:
+            float: The timeout for the stage, never more than `cap`, possibly 0
+        """
+        return max(min(cap, self.remaining() - reserve), 0.0)
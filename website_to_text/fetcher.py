@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Configure logging
+logger = logging.getLogger()
+
+# Content types trafilatura can extract from
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+
+USER_AGENT = 'Mozilla/5.0 (compatible; website-to-text/1.0)'
+
+
+class DownloadTimeout(ValueError):
+    """Raised when a download does not finish within its time budget"""
+
+
+def load_http():
+    """
+    Import requests on first use
+
+    requests and urllib3 are only needed once a page is downloaded, so they
+    are kept out of module load to shorten cold starts.
+
+    Returns:
+        tuple: The requests module and its HTTPAdapter class
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    return requests, HTTPAdapter
+
+
+class Fetcher:
+    """
+    HTTP fetcher with per-host keep-alive pools and a capped streaming read
+
+    Each host gets its own requests Session, so connections are reused across
+    requests and warm invocations. The response headers are checked before
+    any of the body is read, and the body is read in chunks that stop at
+    `max_bytes` or when `total_timeout` has elapsed.
+    """
+
+    def __init__(self, connect_timeout, read_timeout, max_bytes, total_timeout=None, pool_size=10,
+                 max_hosts=32, allowed_types=HTML_CONTENT_TYPES, chunk_size=64 * 1024):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_bytes = max_bytes
+        self.total_timeout = total_timeout if total_timeout is not None else read_timeout
+        self.pool_size = pool_size
+        self.max_hosts = max_hosts
+        self.allowed_types = allowed_types
+        self.chunk_size = chunk_size
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _session(self, url):
+        """Get the keep-alive session for a URL's host, creating it on first use"""
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc.lower()}"
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is not None:
+                self._sessions.move_to_end(host)
+                return session
+            requests, HTTPAdapter = load_http()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = USER_AGENT
+            self._sessions[host] = session
+            if len(self._sessions) > self.max_hosts:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.close()
+            return session
+
+    def fetch(self, url, headers=None, timeout=None, allowed_types=None):
+        """
+        Fetch a page
+
+        Args:
+            url (str): The URL to fetch
+            headers (dict, optional): Extra request headers, e.g. conditional headers
+            timeout (float, optional): Overall time budget in seconds, overriding `total_timeout`
+            allowed_types (tuple, optional): Accepted media types, overriding the fetcher's
+
+        Returns:
+            dict: 'status_code', 'content' (bytes, None unless 200), 'etag',
+                'last_modified', 'content_type', 'bytes' and 'truncated'
+
+        Raises:
+            DownloadTimeout: If the connection, a read or the whole download times out
+            ValueError: If the content type is not supported
+            requests.RequestException: If the connection fails
+        """
+        budget = self.total_timeout if timeout is None else timeout
+        deadline = time.monotonic() + budget
+        request_timeout = (min(self.connect_timeout, budget), min(self.read_timeout, budget))
+
+        requests = load_http()[0]
+        try:
+            response = self._session(url).get(url, headers=headers or {}, timeout=request_timeout, stream=True)
+        except requests.Timeout as e:
+            raise DownloadTimeout(f"Download timed out within {budget} seconds: {str(e)}")
+        try:
+            result = {
+                "status_code": response.status_code,
+                "content": None,
+                "etag": response.headers.get('ETag'),
+                "last_modified": response.headers.get('Last-Modified'),
+                "content_type": response.headers.get('Content-Type', ''),
+                "bytes": 0,
+                "truncated": False
+            }
+            if response.status_code != 200:
+                return result
+
+            # Reject binary and other non-HTML responses before reading the body
+            media_type = result["content_type"].split(';')[0].strip().lower()
+            if media_type and media_type not in (allowed_types or self.allowed_types):
+                raise ValueError(f"Unsupported content type: {media_type}")
+
+            chunks = []
+            size = 0
+            try:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if time.monotonic() > deadline:
+                        raise DownloadTimeout(f"Download exceeded {budget} seconds")
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        result["truncated"] = True
+                        logger.warning(f"Stopped reading {url} at {self.max_bytes} bytes")
+                        break
+            except requests.ConnectionError as e:
+                # requests reports a read timeout while streaming the body as a ConnectionError
+                from urllib3.exceptions import ReadTimeoutError
+                if not (e.args and isinstance(e.args[0], ReadTimeoutError)):
+                    raise
+                raise DownloadTimeout(f"Download timed out within {budget} seconds: {str(e)}")
+
+            content = b''.join(chunks)[:self.max_bytes]
+            result["content"] = content
+            result["bytes"] = len(content)
+            return result
+        finally:
+            response.close()
+
+    def close(self):
+        """Close every pooled session"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,160 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# CloudWatch units for the counters recorded by the pipeline
+COUNTER_UNITS = {
+    "bytes_downloaded": "Bytes",
+    "content_length": "Count",
+    "input_tokens": "Count",
+    "output_tokens": "Count",
+    "cache_read_tokens": "Count",
+    "cache_write_tokens": "Count",
+    "chunks": "Count",
+    "model_fallbacks": "Count",
+    "bedrock_in_flight": "Count",
+    "bedrock_throttles": "Count",
+    "bedrock_retries": "Count",
+    "pages_crawled": "Count",
+    "near_duplicates": "Count",
+    "fast_extractions": "Count",
+    "memory_rejections": "Count"
+}
+
+
+def metric_unit(name):
+    """CloudWatch unit of a named value: its counter unit, none for rates, bytes for sizes, else a count"""
+    if name in COUNTER_UNITS:
+        return COUNTER_UNITS[name]
+    if name.endswith('_rate'):
+        return "None"
+    return "Bytes" if name.endswith('_bytes') else "Count"
+
+
+class RequestMetrics:
+    """
+    Per-request stage durations and counters
+
+    Stages and counters accumulate, so a stage that runs several times (for
+    example one Bedrock call per chunk) reports its total time. Safe to share
+    between the worker threads of one request. With a memory profiler, the
+    profiled stages also record their memory use.
+    """
+
+    def __init__(self, memory_profiler=None):
+        self.durations = {}
+        self.counters = {}
+        self.memory_profiler = memory_profiler
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block and add it to the named stage"""
+        if self.memory_profiler is not None:
+            with self.memory_profiler.measure(name, self), self._timed(name):
+                yield
+        else:
+            with self._timed(name):
+                yield
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.durations[name] = self.durations.get(name, 0.0) + elapsed
+
+    def add(self, name, value):
+        """Add a value to a named counter"""
+        if value is None:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def peak(self, name, value):
+        """Keep the largest value seen for a named gauge"""
+        if value is None:
+            return
+        with self._lock:
+            self.counters[name] = max(self.counters.get(name, value), value)
+
+    def to_dict(self):
+        """
+        Get the recorded values for the response's `timings` section
+
+        Returns:
+            dict: Stage durations in milliseconds under 'stages_ms', plus every counter
+        """
+        with self._lock:
+            result = {"stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.durations.items()}}
+            result.update(self.counters)
+        return result
+
+    def emf_record(self, namespace, dimensions, gauges=None):
+        """
+        Build a CloudWatch Embedded Metric Format record
+
+        Args:
+            namespace (str): The CloudWatch namespace
+            dimensions (dict): Dimension names and values for every metric
+            gauges (dict, optional): Values reported as they are rather than
+                recorded by the request, such as container-wide cache counters
+
+        Returns:
+            dict: The EMF record
+        """
+        with self._lock:
+            values = {f"{name}_ms": round(seconds * 1000, 2) for name, seconds in self.durations.items()}
+            units = {name: "Milliseconds" for name in values}
+            for name, value in list(self.counters.items()) + list((gauges or {}).items()):
+                values[name] = value
+                units[name] = metric_unit(name)
+
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": namespace,
+                        "Dimensions": [list(dimensions.keys())],
+                        "Metrics": [{"Name": name, "Unit": units[name]} for name in values]
+                    }
+                ]
+            }
+        }
+        record.update(dimensions)
+        record.update(values)
+        return record
+
+    def emit(self, namespace, dimensions, stream=None, gauges=None):
+        """
+        Write the EMF record as a single line to stdout
+
+        CloudWatch Logs extracts the metrics from the log line asynchronously,
+        so emitting costs no API call during the request.
+        """
+        stream = stream or sys.stdout
+        stream.write(json.dumps(self.emf_record(namespace, dimensions, gauges)) + "\n")
+        stream.flush()
+
+
+class NullMetrics(RequestMetrics):
+    """Metrics sink that records nothing, used when a caller does not pass metrics"""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add(self, name, value):
+        pass
+
+    def peak(self, name, value):
+        pass
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,432 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Configure logging
+logger = logging.getLogger()
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# DynamoDB items are capped at 400 KB; records over this size keep their result in S3
+MAX_ITEM_BYTES = 350 * 1024
+
+
+class MemoryBackend:
+    """
+    In-process job store and queue
+
+    Stands in for the AWS backend in local runs and tests. Received jobs stay
+    in the queue, invisible, until they are acknowledged or the visibility
+    timeout passes, so a worker that dies mid-job lets the job be retried.
+    """
+
+    def __init__(self, visibility_timeout=300):
+        self.visibility_timeout = visibility_timeout
+        self._jobs = {}
+        self._queue = []
+        self._next_receipt = 0
+        self._lock = threading.Lock()
+
+    def put(self, job):
+        with self._lock:
+            self._jobs[job['job_id']] = json.loads(json.dumps(job))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def enqueue(self, job_id):
+        with self._lock:
+            self._next_receipt += 1
+            self._queue.append([self._next_receipt, job_id, 0.0])
+
+    def receive(self, max_jobs):
+        now = time.time()
+        received = []
+        with self._lock:
+            for message in self._queue:
+                if len(received) >= max_jobs:
+                    break
+                if message[2] <= now:
+                    message[2] = now + self.visibility_timeout
+                    received.append((message[1], message[0]))
+        return received
+
+    def ack(self, receipt):
+        with self._lock:
+            self._queue = [message for message in self._queue if message[0] != receipt]
+
+    def clear(self):
+        with self._lock:
+            self._jobs.clear()
+            self._queue = []
+
+
+class SQLiteBackend:
+    """
+    Job store and queue in a local SQLite file
+
+    Behaves like MemoryBackend but survives process restarts and can be
+    shared by several local processes, e.g. an API process and a worker.
+    """
+
+    def __init__(self, path, visibility_timeout=300):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue "
+            "(receipt INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, visible_at REAL NOT NULL)"
+        )
+
+    def put(self, job):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO jobs (job_id, data) VALUES (?, ?)",
+                               (job['job_id'], json.dumps(job)))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def enqueue(self, job_id):
+        with self._lock:
+            self._conn.execute("INSERT INTO queue (job_id, visible_at) VALUES (?, 0)", (job_id,))
+
+    def receive(self, max_jobs):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT receipt, job_id FROM queue WHERE visible_at <= ? ORDER BY receipt LIMIT ?",
+                    (now, max_jobs)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE queue SET visible_at = ? WHERE receipt = ?",
+                    [(now + self.visibility_timeout, receipt) for receipt, _ in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(job_id, receipt) for receipt, job_id in rows]
+
+    def ack(self, receipt):
+        with self._lock:
+            self._conn.execute("DELETE FROM queue WHERE receipt = ?", (receipt,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.execute("DELETE FROM queue")
+
+
+class AwsBackend:
+    """
+    Job records in a DynamoDB table and the work queue in SQS
+
+    Records are stored as a JSON document under `data`, with `expires_at`
+    for the table's TTL. A record over MAX_ITEM_BYTES, such as a large batch
+    result, keeps its result in the S3 bucket instead, and reads return a
+    presigned `result_url` for it; without a bucket such a result is replaced
+    by an error. When the worker is triggered by an SQS event source mapping,
+    Lambda deletes handled messages itself and `receive` is unused.
+    """
+
+    def __init__(self, clients, region, table_name, queue_url, bucket=None, key_prefix='', url_expiration=300):
+        self.clients = clients
+        self.region = region
+        self.table_name = table_name
+        self.queue_url = queue_url
+        self.bucket = bucket
+        self.key_prefix = key_prefix
+        self.url_expiration = url_expiration
+
+    def put(self, job):
+        job = {key: value for key, value in job.items() if key not in ('result_url', 'result_expires_in')}
+        data = json.dumps(job)
+        if len(data.encode('utf-8')) > MAX_ITEM_BYTES and 'result' in job:
+            data = json.dumps(self._offload_result(job))
+        self.clients.get('dynamodb', self.region).put_item(
+            TableName=self.table_name,
+            Item={
+                'job_id': {'S': job['job_id']},
+                'data': {'S': data},
+                'expires_at': {'N': str(int(job['expires_at']))}
+            }
+        )
+
+    def _offload_result(self, job):
+        """Move a job's result to S3, or replace it with an error if there is no bucket"""
+        job = dict(job)
+        result = job.pop('result')
+        if not self.bucket and job['status'] == RUNNING:
+            # Partial results are best effort; the job carries on without them
+            return job
+        if not self.bucket:
+            logger.error(f"Result of job {job['job_id']} is too large to store and no bucket is configured")
+            job['status'] = FAILED
+            job['status_code'] = 500
+            job['result'] = {"error": "Job failed", "details": "The result is too large to store"}
+            return job
+        key = f"{self.key_prefix}jobs/{job['job_id']}.json"
+        self.clients.get('s3', self.region).put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=json.dumps(result).encode('utf-8'),
+            ContentType='application/json'
+        )
+        job['result_key'] = key
+        return job
+
+    def get(self, job_id):
+        response = self.clients.get('dynamodb', self.region).get_item(
+            TableName=self.table_name,
+            Key={'job_id': {'S': job_id}},
+            ConsistentRead=True
+        )
+        item = response.get('Item')
+        if not item:
+            return None
+        job = json.loads(item['data']['S'])
+        if job.get('result_key'):
+            job['result_url'] = self.clients.get('s3', self.region).generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket, 'Key': job['result_key']},
+                ExpiresIn=self.url_expiration
+            )
+            job['result_expires_in'] = self.url_expiration
+        return job
+
+    def enqueue(self, job_id):
+        self.clients.get('sqs', self.region).send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps({'job_id': job_id})
+        )
+
+    def receive(self, max_jobs):
+        response = self.clients.get('sqs', self.region).receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=max(1, min(max_jobs, 10)),
+            WaitTimeSeconds=0
+        )
+        return [(json.loads(message['Body'])['job_id'], message['ReceiptHandle'])
+                for message in response.get('Messages', [])]
+
+    def ack(self, receipt):
+        self.clients.get('sqs', self.region).delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+    def clear(self):
+        pass
+
+
+def create_backend(kind, visibility_timeout=300, path=None, clients=None, region=None, table_name=None,
+                   queue_url=None, bucket=None, key_prefix='', url_expiration=300):
+    """
+    Create a job backend from configuration
+
+    Args:
+        kind (str): 'memory', 'sqlite' or 'aws'
+        visibility_timeout (int, optional): Seconds a received job stays hidden from other workers
+        path (str, optional): Database file used by the sqlite backend
+        clients (ClientCache, optional): Client cache used by the aws backend
+        region (str, optional): Region of the table and queue
+        table_name (str, optional): DynamoDB table used by the aws backend
+        queue_url (str, optional): SQS queue URL used by the aws backend
+        bucket (str, optional): S3 bucket the aws backend keeps oversized results in
+        key_prefix (str, optional): Key prefix for those results
+        url_expiration (int, optional): Lifetime in seconds of the presigned result URLs
+
+    Returns:
+        object: The backend
+
+    Raises:
+        ValueError: If the backend kind is unknown or its settings are missing
+    """
+    kind = (kind or 'memory').lower()
+    if kind == 'memory':
+        return MemoryBackend(visibility_timeout)
+    if kind == 'sqlite':
+        return SQLiteBackend(path, visibility_timeout)
+    if kind == 'aws':
+        if not table_name or not queue_url:
+            raise ValueError("The aws job backend needs a table name and a queue URL")
+        return AwsBackend(clients, region, table_name, queue_url, bucket, key_prefix, url_expiration)
+    raise ValueError(f"Unknown job backend: {kind}")
+
+
+class JobQueue:
+    """
+    Submit/poll job lifecycle on top of a job backend
+
+    A job moves from queued to running to succeeded or failed. Queues deliver
+    at least once, so `start` ignores jobs that have already finished and a
+    redelivered job is not processed twice.
+    """
+
+    def __init__(self, backend, ttl=86400, max_attempts=3):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+
+    def submit(self, request):
+        """
+        Store a job record and enqueue it
+
+        Args:
+            request (dict): The validated request body to process
+
+        Returns:
+            dict: The new job record
+        """
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "request": request,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + self.ttl
+        }
+        self.backend.put(job)
+        self.backend.enqueue(job['job_id'])
+        return job
+
+    def get(self, job_id):
+        """Get a job record, or None if it does not exist or has expired"""
+        job = self.backend.get(job_id)
+        if job is None or job['expires_at'] <= time.time():
+            return None
+        return job
+
+    def start(self, job_id):
+        """
+        Mark a job as running
+
+        Returns:
+            dict: The job record, or None if the job is unknown, finished, or
+                has used up its attempts (in which case it is marked failed)
+        """
+        job = self.get(job_id)
+        if job is None or job['status'] in (SUCCEEDED, FAILED):
+            return None
+        if job['attempts'] >= self.max_attempts:
+            self.fail(job_id, f"Gave up after {job['attempts']} attempts")
+            return None
+        # Progress stored by an earlier attempt is not progress of this one
+        job.pop('result', None)
+        job.pop('result_key', None)
+        job['status'] = RUNNING
+        job['attempts'] += 1
+        job['updated_at'] = time.time()
+        self.backend.put(job)
+        return job
+
+    def progress(self, job_id, body):
+        """
+        Store the partial result of a running job, e.g. the pages a crawl has finished so far
+
+        Args:
+            job_id (str): The job ID
+            body (dict): The partial response body, replaced by the final one on completion
+        """
+        job = self.backend.get(job_id)
+        if job is None or job['status'] != RUNNING:
+            return
+        job.pop('result_key', None)
+        job['result'] = body
+        job['updated_at'] = time.time()
+        self.backend.put(job)
+
+    def complete(self, job_id, status_code, body):
+        """
+        Store the outcome of a processed job
+
+        Args:
+            job_id (str): The job ID
+            status_code (int): Status code the synchronous API would have returned
+            body (dict): Response body the synchronous API would have returned
+        """
+        job = self.backend.get(job_id)
+        if job is None:
+            return
+        job.pop('result_key', None)
+        job['status'] = SUCCEEDED if status_code == 200 else FAILED
+        job['status_code'] = status_code
+        job['result'] = body
+        job['updated_at'] = time.time()
+        self.backend.put(job)
+
+    def fail(self, job_id, error):
+        """Mark a job as failed with an error message"""
+        job = self.backend.get(job_id)
+        if job is None:
+            return
+        job.pop('result_key', None)
+        job['status'] = FAILED
+        job['status_code'] = 500
+        job['result'] = {"error": "Job failed", "details": error}
+        job['updated_at'] = time.time()
+        self.backend.put(job)
+
+    def receive(self, max_jobs):
+        """Receive up to `max_jobs` queued job IDs as (job_id, receipt) pairs"""
+        return self.backend.receive(max_jobs)
+
+    def ack(self, receipt):
+        """Remove a handled job from the queue"""
+        self.backend.ack(receipt)
+
+    def clear(self):
+        """Drop all jobs and queued work"""
+        self.backend.clear()
+
+
+def public_view(job):
+    """
+    Build the polling response for a job record
+
+    Args:
+        job (dict): The job record
+
+    Returns:
+        dict: Job ID, status, timestamps and, once finished, the result, or a
+            presigned 'result_url' for a result kept in S3. A running job with
+            a partial result reports it as 'progress' or 'progress_url'
+    """
+    view = {
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "attempts": job['attempts'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at']
+    }
+    if job['status'] in (SUCCEEDED, FAILED):
+        view["status_code"] = job.get('status_code')
+        if job.get('result_url'):
+            view["result_url"] = job['result_url']
+            view["result_expires_in"] = job.get('result_expires_in')
+        else:
+            view["result"] = job.get('result')
+    elif job['status'] == RUNNING:
+        if job.get('result_url'):
+            view["progress_url"] = job['result_url']
+            view["progress_expires_in"] = job.get('result_expires_in')
+        elif job.get('result') is not None:
+            view["progress"] = job['result']
+    return view
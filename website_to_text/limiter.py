@@ -0,0 +1,89 @@
+import logging
+import random
+import threading
+
+# Configure logging
+logger = logging.getLogger()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on concurrent calls to a service that throttles
+
+    Every call that succeeds raises the limit by `increase / limit`, so a
+    fully used limit grows by about `increase` per round of calls. A throttled
+    call multiplies the limit by `decrease`. Calls that were already in flight
+    when the limit was last cut do not cut it again, so a burst of calls
+    throttled together shrinks the limit once. Shared by every thread of the
+    execution environment.
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=16, increase=1.0, decrease=0.5):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.initial_limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self.increase = increase
+        self.decrease = decrease
+        self._condition = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        """Return to the initial limit, e.g. between tests"""
+        with self._condition:
+            self.limit = float(self.initial_limit)
+            self.in_flight = 0
+            self.throttles = 0
+            self._generation = 0
+            self._condition.notify_all()
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a free slot
+
+        Args:
+            timeout (float, optional): Longest time to wait in seconds, None to wait indefinitely
+
+        Returns:
+            int: A ticket to pass to `release`, or None if no slot freed up in time
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                return None
+            self.in_flight += 1
+            return self._generation
+
+    def release(self, ticket, throttled=False):
+        """
+        Free a slot and adjust the limit from the call's outcome
+
+        Args:
+            ticket (int): The ticket returned by `acquire`
+            throttled (bool, optional): Whether the service throttled the call
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                if ticket == self._generation:
+                    self._generation += 1
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    logger.warning(f"Throttled, concurrency limit lowered to {int(self.limit)}")
+            else:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._condition.notify_all()
+
+
+def backoff_delay(attempt, base, cap, rng=random.random):
+    """
+    Pick the wait before a retry with full-jitter exponential backoff
+
+    Args:
+        attempt (int): Number of the retry, starting at 0
+        base (float): Largest wait before the first retry, in seconds
+        cap (float): Upper bound for the wait, in seconds
+        rng (callable, optional): Returns a float in [0, 1)
+
+    Returns:
+        float: Seconds to wait, uniform in [0, min(cap, base * 2 ** attempt)]
+    """
+    return rng() * min(cap, base * (2 ** attempt))
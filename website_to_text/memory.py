@@ -0,0 +1,183 @@
+import logging
+import resource
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Configure logging
+logger = logging.getLogger()
+
+PAGE_SIZE = resource.getpagesize()
+
+# Stages measured by the profiler, 'total' covering the whole request
+PROFILED_STAGES = ('fetch', 'extract', 'shape', 'serialize', 'total')
+
+MODE_FULL = 'full'
+MODE_FAST = 'fast'
+
+
+class MemoryCeilingExceeded(ValueError):
+    """Raised when a page would need more memory to extract than the ceiling allows"""
+
+
+def current_rss_bytes():
+    """
+    Get the process's current resident set size
+
+    Reads /proc/self/statm where it exists, as on Lambda, and falls back to
+    the peak RSS elsewhere.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Get the process's peak resident set size so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def ceiling_bytes(ceiling_mb, function_memory_mb, fraction):
+    """
+    Work out the memory ceiling for extractions
+
+    Args:
+        ceiling_mb (int): Configured ceiling in MB, 0 to derive it
+        function_memory_mb (str): The function's memory size in MB, as in
+            AWS_LAMBDA_FUNCTION_MEMORY_SIZE, empty outside Lambda
+        fraction (float): Share of the function's memory used as the derived ceiling
+
+    Returns:
+        int: The ceiling in bytes, or 0 if there is none
+    """
+    if ceiling_mb > 0:
+        return ceiling_mb * 1024 * 1024
+    try:
+        return int(int(function_memory_mb) * fraction * 1024 * 1024)
+    except (TypeError, ValueError):
+        return 0
+
+
+class MemoryProfiler:
+    """
+    Opt-in memory measurements around pipeline stages
+
+    For each profiled stage, records the peak of Python allocations above the
+    stage's starting point, from tracemalloc, and the change in resident set
+    size. lxml allocates its trees outside Python's allocator, so they only
+    show up in the RSS delta. tracemalloc keeps one peak for the whole process,
+    so stages running at the same time, as in a batch, disturb each other's
+    peaks; profile single requests for per-stage figures. A stage nested in
+    another, such as `serialize` in `total`, resets that peak, so the peak
+    reached so far is first handed to the enclosing stages.
+    """
+
+    def __init__(self, stages=PROFILED_STAGES):
+        self.stages = stages
+        self._open = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start tracing allocations, which slows every allocation down until the process ends"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, name, metrics):
+        """
+        Measure the enclosed block if `name` is a profiled stage
+
+        Records '<name>_peak_traced_bytes' and '<name>_rss_delta_bytes' in
+        `metrics`, keeping the largest value when a stage runs several times.
+        """
+        if name not in self.stages or not tracemalloc.is_tracing():
+            yield
+            return
+        rss_before = current_rss_bytes()
+        stage = {"peak": 0}
+        with self._lock:
+            traced_before, peak_so_far = tracemalloc.get_traced_memory()
+            for outer in self._open:
+                outer["peak"] = max(outer["peak"], peak_so_far)
+            self._open.append(stage)
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._open.remove(stage)
+                traced_peak = max(stage["peak"], tracemalloc.get_traced_memory()[1])
+            metrics.peak(f"{name}_peak_traced_bytes", max(0, traced_peak - traced_before))
+            metrics.peak(f"{name}_rss_delta_bytes", current_rss_bytes() - rss_before)
+            metrics.peak('peak_rss_bytes', peak_rss_bytes())
+
+
+class MemoryGuard:
+    """
+    Keeps extractions under a memory ceiling
+
+    Parsing a page takes a multiple of its HTML size: lxml's tree plus the
+    copies trafilatura makes while trying its fallback extractors. Before a
+    page is extracted, the guard predicts the process's memory as the current
+    RSS, plus what extractions already running have reserved, plus the page's
+    HTML size times `full_factor`. Over the ceiling, the page is extracted in
+    fast mode, without the fallback extractors, predicted with `fast_factor`;
+    if that still does not fit, the page is rejected.
+    """
+
+    def __init__(self, ceiling, full_factor=20.0, fast_factor=8.0, rss=current_rss_bytes):
+        """
+        Args:
+            ceiling (int): Memory ceiling in bytes, 0 to disable the guard
+            full_factor (float): Predicted bytes per HTML byte for a full extraction
+            fast_factor (float): Predicted bytes per HTML byte for a fast extraction
+            rss (callable, optional): Returns the current RSS in bytes
+        """
+        self.ceiling = ceiling
+        self.full_factor = full_factor
+        self.fast_factor = fast_factor
+        self.rss = rss
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reserve(self, size):
+        """
+        Choose an extraction mode for a page and hold its predicted memory for the enclosed block
+
+        Args:
+            size (int): Size of the page's HTML in bytes
+
+        Yields:
+            str: MODE_FULL or MODE_FAST
+
+        Raises:
+            MemoryCeilingExceeded: If even a fast extraction would exceed the ceiling
+        """
+        if not self.ceiling:
+            yield MODE_FULL
+            return
+        with self._lock:
+            base = self.rss() + self._reserved
+            for mode, factor in ((MODE_FULL, self.full_factor), (MODE_FAST, self.fast_factor)):
+                needed = int(size * factor)
+                if base + needed <= self.ceiling:
+                    break
+            else:
+                raise MemoryCeilingExceeded(
+                    f"Page too large to extract: {(base + needed) // 1024 // 1024} MB predicted, "
+                    f"ceiling is {self.ceiling // 1024 // 1024} MB"
+                )
+            self._reserved += needed
+        if mode == MODE_FAST:
+            logger.warning(f"Extracting {size} bytes in fast mode to stay under the memory ceiling")
+        try:
+            yield mode
+        finally:
+            with self._lock:
+                self._reserved -= needed
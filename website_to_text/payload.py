@@ -0,0 +1,117 @@
+import base64
+import gzip
+import hashlib
+import logging
+
+# Configure logging
+logger = logging.getLogger()
+
+# How the extracted content is returned to the client
+CONTENT_MODES = ('auto', 'inline', 'none', 'gzip', 's3')
+
+
+def encode_gzip(content):
+    """
+    Compress text for a JSON response
+
+    Args:
+        content (str): The text to compress
+
+    Returns:
+        str: Base64 encoded gzip of the UTF-8 text
+    """
+    return base64.b64encode(gzip.compress(content.encode('utf-8'))).decode('ascii')
+
+
+def decode_gzip(data):
+    """Reverse `encode_gzip`"""
+    return gzip.decompress(base64.b64decode(data)).decode('utf-8')
+
+
+def content_key(content, prefix=''):
+    """
+    Build the object key for offloaded content
+
+    The key is derived from the content, so repeated requests for an
+    unchanged page overwrite one object instead of creating new ones.
+
+    Args:
+        content (str): The extracted content
+        prefix (str, optional): Key prefix
+
+    Returns:
+        str: The object key
+    """
+    return f"{prefix}{hashlib.sha256(content.encode('utf-8')).hexdigest()}.md"
+
+
+def choose_mode(size, inline_max_bytes, gzip_max_bytes, can_offload):
+    """
+    Pick the cheapest way to return content of a given size
+
+    Small content is returned as is, since compressing and base64 encoding it
+    saves little. Medium content is compressed. Content too large to be worth
+    carrying in the response at all is offloaded when a bucket is available.
+
+    Args:
+        size (int): Content size in UTF-8 bytes
+        inline_max_bytes (int): Largest content returned uncompressed
+        gzip_max_bytes (int): Largest content returned compressed
+        can_offload (bool): Whether content can be written to a bucket
+
+    Returns:
+        str: 'inline', 'gzip' or 's3'
+    """
+    if size <= inline_max_bytes:
+        return 'inline'
+    if size <= gzip_max_bytes or not can_offload:
+        return 'gzip'
+    return 's3'
+
+
+def shape_content(content, mode, inline_max_bytes, gzip_max_bytes, offload=None):
+    """
+    Build the response fields that carry the extracted content
+
+    Args:
+        content (str): The extracted content
+        mode (str): One of CONTENT_MODES
+        inline_max_bytes (int): Largest content 'auto' returns uncompressed
+        gzip_max_bytes (int): Largest content 'auto' returns compressed
+        offload (callable, optional): Stores the content and returns the
+            response fields that point to it. Without it, 's3' is unavailable.
+
+    Returns:
+        dict: 'content_mode' and 'extracted_content', plus 'content_bytes' and
+            the gzip or offload fields when the content is not returned inline
+
+    Raises:
+        ValueError: If the mode is unknown, or 's3' is requested without a bucket
+    """
+    if mode not in CONTENT_MODES:
+        raise ValueError(f"content_mode must be one of: {', '.join(CONTENT_MODES)}")
+
+    size = len(content.encode('utf-8'))
+    requested = mode
+    if mode == 'auto':
+        mode = choose_mode(size, inline_max_bytes, gzip_max_bytes, offload is not None)
+
+    if mode == 'inline':
+        return {"content_mode": "inline", "extracted_content": content}
+
+    fields = {"content_mode": mode, "extracted_content": None, "content_bytes": size}
+    if mode == 's3':
+        if offload is None:
+            raise ValueError("content_mode 's3' is not available: no content bucket is configured")
+        try:
+            fields.update(offload(content))
+            return fields
+        except Exception as e:
+            if requested != 'auto':
+                raise
+            # An automatic choice falls back to returning the content compressed
+            logger.warning(f"Offloading content failed, returning it compressed: {str(e)}")
+            fields["content_mode"] = mode = 'gzip'
+    if mode == 'gzip':
+        fields["extracted_content_gzip"] = encode_gzip(content)
+    return fields
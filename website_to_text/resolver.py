@@ -0,0 +1,228 @@
+import logging
+import re
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger()
+
+# Cross-region inference profile IDs, e.g. us.amazon.nova-lite-v1:0
+GEO_PROFILE_ID = re.compile(r'^[a-z]+(-[a-z]+)?\.amazon\.')
+
+
+class ClientCache:
+    """
+    Keeps boto3 clients alive across warm Lambda invocations
+
+    Clients are keyed by service name, region and read timeout, so every
+    caller that asks for the same client gets the instance created on the
+    first request.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, service_name, region_name=None, read_timeout=None):
+        """
+        Get a cached client, creating it on first use
+
+        Args:
+            service_name (str): The AWS service name, e.g. 'bedrock-runtime'
+            region_name (str, optional): The region for the client
+            read_timeout (int, optional): Socket read timeout in seconds. Clients
+                with a read timeout make a single attempt, since botocore's own
+                retries would run past the caller's time budget.
+
+        Returns:
+            object: The boto3 client
+        """
+        key = (service_name, region_name, read_timeout)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                # boto3 is imported here rather than at module load to keep cold starts short
+                import boto3
+                from botocore.config import Config
+                kwargs = {}
+                if region_name:
+                    kwargs['region_name'] = region_name
+                if read_timeout:
+                    kwargs['config'] = Config(
+                        connect_timeout=min(read_timeout, 5),
+                        read_timeout=read_timeout,
+                        retries={'total_max_attempts': 1, 'mode': 'standard'}
+                    )
+                client = boto3.client(service_name, **kwargs)
+                self._clients[key] = client
+                self.created += 1
+            else:
+                self.reused += 1
+            return client
+
+    def clear(self):
+        """Drop all cached clients and reset the counters"""
+        with self._lock:
+            self._clients.clear()
+            self.created = 0
+            self.reused = 0
+
+
+class ProfileResolver:
+    """
+    Resolves Nova model IDs to Bedrock inference profile ARNs
+
+    Successful lookups are cached for `ttl` seconds. Failed lookups are cached
+    for `negative_ttl` seconds so a missing profile does not trigger a
+    list/create round trip on every request.
+    """
+
+    def __init__(self, clients, region, configured_arn='', default_profile_name='nova-default-profile',
+                 ttl=3600, negative_ttl=300):
+        self.clients = clients
+        self.region = region
+        self.configured_arn = configured_arn
+        self.default_profile_name = default_profile_name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def needs_profile(self, model):
+        """
+        Check whether a model ID must be mapped to an inference profile
+
+        ARNs and geo-prefixed cross-region profile IDs such as
+        `us.amazon.nova-lite-v1:0` are already invocable and pass through.
+        """
+        if model.startswith('arn:') or ':inference-profile/' in model:
+            return False
+        return "nova" in model.lower() and not GEO_PROFILE_ID.match(model)
+
+    def resolve(self, model):
+        """
+        Resolve a model ID to the identifier to pass to invoke_model
+
+        Args:
+            model (str): The model ID or inference profile ARN
+
+        Returns:
+            str: The inference profile ARN for Nova models, otherwise the model unchanged
+
+        Raises:
+            Exception: If no inference profile can be found or created
+        """
+        if not self.needs_profile(model):
+            return model
+
+        if self.configured_arn:
+            logger.info(f"Using configured inference profile ARN: {self.configured_arn}")
+            return self.configured_arn
+
+        with self._lock:
+            cached = self._lookup(model)
+            if cached is not None:
+                return self._unwrap(cached)
+
+            self.misses += 1
+            try:
+                arn = self._discover(model)
+            except Exception as e:
+                self._cache[model] = (time.monotonic() + self.negative_ttl, None, str(e))
+                raise
+            self._cache[model] = (time.monotonic() + self.ttl, arn, None)
+            return arn
+
+    def _lookup(self, model):
+        entry = self._cache.get(model)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._cache[model]
+            return None
+        if entry[1] is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def _unwrap(self, entry):
+        _, arn, error = entry
+        if arn is None:
+            raise Exception(error)
+        return arn
+
+    def _discover(self, model):
+        """Find an existing Nova inference profile or create one"""
+        bedrock_mgmt = self.clients.get('bedrock', self.region)
+        profiles = bedrock_mgmt.list_inference_profiles()
+
+        # Look for an existing Nova profile
+        for profile in profiles.get('inferenceProfiles', []):
+            if 'nova' in profile['name'].lower():
+                logger.info(f"Found existing Nova inference profile: {profile['inferenceProfileArn']}")
+                return profile['inferenceProfileArn']
+
+        # If no profile found, try to create one
+        try:
+            response = bedrock_mgmt.create_inference_profile(
+                inferenceProfileName=self.default_profile_name,
+                modelArn=f"arn:aws:bedrock:{self.region}::foundation-model/{model}",
+                provisionedModelThroughput=1
+            )
+            logger.info(f"Created new inference profile: {response['inferenceProfileArn']}")
+            return response['inferenceProfileArn']
+        except Exception as create_error:
+            logger.error(f"Failed to create inference profile: {str(create_error)}")
+            raise Exception("Nova model requires an inference profile. Please create one in the Bedrock console "
+                            "or set INFERENCE_PROFILE_ARN environment variable.")
+
+    def prewarm(self, models, read_timeout=None):
+        """
+        Create the runtime client and resolve profiles ahead of the first request
+
+        Intended to run during the Lambda init phase. Failures are logged and
+        swallowed so a prewarm problem never breaks the function's cold start.
+
+        Args:
+            models (list): Model IDs to resolve
+            read_timeout (int, optional): Read timeout of the runtime client to create,
+                so it is the same cached client that requests will ask for
+        """
+        try:
+            self.clients.get('bedrock-runtime', self.region, read_timeout=read_timeout)
+            for model in models:
+                if model:
+                    self.resolve(model)
+        except Exception as e:
+            logger.warning(f"Prewarm failed: {str(e)}")
+
+    def clear(self):
+        """Drop all cached profile lookups and reset the counters"""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+            self.negative_hits = 0
+
+    def stats(self):
+        """
+        Get cache counters for the resolver and the client cache
+
+        Returns:
+            dict: Hit, miss and client reuse counters plus the profile hit rate
+        """
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "profile_hits": self.hits,
+            "profile_negative_hits": self.negative_hits,
+            "profile_misses": self.misses,
+            "profile_hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "clients_created": self.clients.created,
+            "clients_reused": self.clients.reused
+        }
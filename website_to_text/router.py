@@ -0,0 +1,171 @@
+import json
+import logging
+
+# Configure logging
+logger = logging.getLogger()
+
+# Keyword fragments that identify a prompt's class, checked in order
+PROMPT_CLASSES = (
+    ('title', ('title', 'headline')),
+    ('analysis', ('analy', 'compare', 'evaluate', 'critique', 'assess', 'explain why')),
+    ('extract', ('key point', 'bullet', 'list ', 'extract')),
+    ('summary', ('summar', 'tl;dr', 'overview', 'gist'))
+)
+GENERAL = 'general'
+
+# Models ordered from fastest to slowest, with a rough latency model for each,
+# and rules evaluated top to bottom. The IDs are US cross-region inference
+# profiles, which are invoked directly without a profile lookup; `default_table`
+# swaps in the geography of other regions.
+DEFAULT_TABLE = {
+    "models": [
+        {"model": "us.amazon.nova-micro-v1:0", "base_latency_ms": 500, "ms_per_1k_tokens": 40},
+        {"model": "us.amazon.nova-lite-v1:0", "base_latency_ms": 700, "ms_per_1k_tokens": 70},
+        {"model": "us.amazon.nova-pro-v1:0", "base_latency_ms": 1500, "ms_per_1k_tokens": 180}
+    ],
+    "rules": [
+        {"prompt_class": "title", "model": "us.amazon.nova-micro-v1:0"},
+        {"prompt_class": "analysis", "model": "us.amazon.nova-pro-v1:0"},
+        {"max_tokens": 1500, "model": "us.amazon.nova-micro-v1:0"},
+        {"max_tokens": 6000, "model": "us.amazon.nova-lite-v1:0"},
+        {"model": "us.amazon.nova-pro-v1:0"}
+    ]
+}
+
+# Cross-region inference profile prefix of each region's geography, first match wins
+GEO_PREFIXES = (('us-gov-', 'us-gov'), ('us-', 'us'), ('eu-', 'eu'), ('ap-', 'apac'))
+
+
+def geo_prefix(region):
+    """Get the cross-region inference profile prefix for a region, or None if it has none"""
+    for region_prefix, geo in GEO_PREFIXES:
+        if (region or '').startswith(region_prefix):
+            return geo
+    return None
+
+
+def default_table(region=None):
+    """
+    Get the built-in routing table for a Bedrock region
+
+    Args:
+        region (str, optional): The region Bedrock is called in
+
+    Returns:
+        dict: DEFAULT_TABLE with its profile IDs in the region's geography,
+            e.g. `eu.amazon.nova-lite-v1:0` in eu-west-1. Regions without a
+            known geography keep the US profiles.
+    """
+    geo = geo_prefix(region)
+    if geo is None:
+        if region:
+            logger.warning(f"No cross-region inference profiles known for {region}, routing to US profiles")
+        return DEFAULT_TABLE
+    return json.loads(json.dumps(DEFAULT_TABLE).replace('"us.amazon.', f'"{geo}.amazon.'))
+
+
+class ModelThrottled(Exception):
+    """Raised when Bedrock throttles a model, so the caller can fall back to another"""
+
+
+def classify_prompt(prompt):
+    """
+    Classify a prompt by the kind of answer it asks for
+
+    Args:
+        prompt (str): The prompt
+
+    Returns:
+        str: 'title', 'analysis', 'extract', 'summary' or 'general'
+    """
+    text = f"{(prompt or '').lower()} "
+    for prompt_class, fragments in PROMPT_CLASSES:
+        if any(fragment in text for fragment in fragments):
+            return prompt_class
+    return GENERAL
+
+
+class ModelRouter:
+    """
+    Picks a model from content length, prompt class and a latency target
+
+    The first rule whose conditions all match selects a model. If the
+    caller's latency target is below that model's estimated latency, faster
+    models are tried in turn. The faster models after the selected one are
+    returned as throttling fallbacks, nearest first.
+    """
+
+    def __init__(self, table=None, region=None):
+        table = table or default_table(region)
+        self.models = [entry['model'] for entry in table['models']]
+        self.profiles = {entry['model']: entry for entry in table['models']}
+        self.rules = table['rules']
+        self._validate()
+
+    @classmethod
+    def from_config(cls, table_json='', table_path='', region=None):
+        """
+        Create a router from a JSON routing table
+
+        Args:
+            table_json (str, optional): The table as a JSON string
+            table_path (str, optional): Path to a JSON file with the table, used if table_json is empty
+            region (str, optional): Bedrock region the built-in table is adapted to
+
+        Returns:
+            ModelRouter: The router, using `default_table(region)` if neither is given
+
+        Raises:
+            ValueError: If the table cannot be parsed or is inconsistent
+        """
+        if not table_json and table_path:
+            with open(table_path, 'r', encoding='utf-8') as f:
+                table_json = f.read()
+        if not table_json:
+            return cls(region=region)
+        try:
+            return cls(json.loads(table_json))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid routing table: {str(e)}")
+
+    def _validate(self):
+        if not self.models:
+            raise ValueError("Invalid routing table: no models")
+        for rule in self.rules:
+            if rule.get('model') not in self.profiles:
+                raise ValueError(f"Invalid routing table: rule uses unknown model {rule.get('model')}")
+        if not self.rules or set(self.rules[-1]) != {'model'}:
+            raise ValueError("Invalid routing table: the last rule must match everything")
+
+    def estimate_latency_ms(self, model, tokens):
+        """Estimate a model's latency for content of the given size"""
+        profile = self.profiles[model]
+        return profile.get('base_latency_ms', 0) + profile.get('ms_per_1k_tokens', 0) * tokens / 1000.0
+
+    def _match(self, rule, tokens, prompt_class):
+        if 'prompt_class' in rule and rule['prompt_class'] != prompt_class:
+            return False
+        if 'max_tokens' in rule and tokens > rule['max_tokens']:
+            return False
+        return True
+
+    def route(self, tokens, prompt_class=GENERAL, latency_target_ms=None):
+        """
+        Choose the models to try for a request
+
+        Args:
+            tokens (int): Estimated content size in tokens
+            prompt_class (str, optional): The prompt's class
+            latency_target_ms (float, optional): The caller's latency target
+
+        Returns:
+            list: The selected model followed by its faster fallbacks
+        """
+        model = next(rule['model'] for rule in self.rules if self._match(rule, tokens, prompt_class))
+        index = self.models.index(model)
+        if latency_target_ms:
+            while index > 0 and self.estimate_latency_ms(self.models[index], tokens) > latency_target_ms:
+                index -= 1
+        selected = self.models[index]
+        logger.info(f"Routed {tokens} tokens of class {prompt_class} to {selected}")
+        return [selected] + self.models[index - 1::-1] if index > 0 else [selected]
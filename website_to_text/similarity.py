@@ -0,0 +1,182 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+FINGERPRINT_BITS = 64
+
+# Query parameters that track the visitor and never change the page
+TRACKING_PARAMS = ('gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'igshid',
+                   'ref_src', 'spm')
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+WORD = re.compile(r'\w+')
+
+
+def canonicalize_url(url):
+    """
+    Reduce a URL to the form shared by its trivial variants
+
+    Lowercases the scheme and host, drops default ports, the fragment and
+    tracking parameters, and sorts the remaining query parameters. Variants
+    that may serve different markup, such as AMP pages, are left alone and
+    caught by the content fingerprint instead.
+
+    Args:
+        url (str): The URL
+
+    Returns:
+        str: The canonical URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        host = f"{parts.username}@{host}"
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text, shingle_size=3):
+    """
+    Compute a 64-bit SimHash of a text
+
+    Every run of `shingle_size` consecutive words votes on each bit of the
+    fingerprint, so texts that share most of their word runs get fingerprints
+    that differ in few bits. Case and markdown punctuation are ignored.
+
+    Args:
+        text (str): The text
+        shingle_size (int, optional): Words per shingle
+
+    Returns:
+        int: The fingerprint, or None if the text has fewer words than a shingle
+    """
+    words = WORD.findall(text.lower())
+    if len(words) < shingle_size:
+        return None
+    hashes = [format(_hash64(' '.join(words[index:index + shingle_size])), '064b')
+              for index in range(len(words) - shingle_size + 1)]
+    # Count the set bits column by column; a bit is set when most shingles set it
+    ones = [column.count('1') for column in zip(*hashes)]
+    return sum(1 << (FINGERPRINT_BITS - 1 - bit) for bit, count in enumerate(ones) if 2 * count > len(hashes))
+
+
+def hamming_distance(a, b):
+    """Count the bits in which two fingerprints differ"""
+    return bin(a ^ b).count('1')
+
+
+def similarity(distance):
+    """Turn a Hamming distance between fingerprints into a score from 0 to 1"""
+    return round(1 - distance / FINGERPRINT_BITS, 4)
+
+
+class SimilarityIndex:
+    """
+    In-memory index of content fingerprints for near-duplicate lookups
+
+    Fingerprints are split into `max_distance + 1` bands. Two fingerprints
+    within `max_distance` bits of each other agree on at least one whole band,
+    so a lookup only compares against entries sharing a band instead of
+    scanning the index. Holds at most `max_entries`, dropping the least
+    recently used. Entries are keyed by a content digest, so indexing the same
+    content again refreshes its entry.
+    """
+
+    def __init__(self, max_distance=3, max_entries=10000):
+        self.max_distance = max(0, min(max_distance, FINGERPRINT_BITS - 1))
+        self.max_entries = max_entries
+        bands = self.max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands = [(index * width, FINGERPRINT_BITS if index == bands - 1 else (index + 1) * width)
+                       for index in range(bands)]
+        self._entries = OrderedDict()
+        self._buckets = [{} for _ in self._bands]
+        self._lock = threading.Lock()
+
+    def _band_values(self, fingerprint):
+        return [fingerprint >> start & ((1 << (end - start)) - 1) for start, end in self._bands]
+
+    def add(self, digest, fingerprint, url=None):
+        """
+        Index a piece of content
+
+        Args:
+            digest (str): Digest identifying the content
+            fingerprint (int): The content's SimHash
+            url (str, optional): Where the content came from, reported on matches
+        """
+        with self._lock:
+            self._remove(digest)
+            self._entries[digest] = (fingerprint, url)
+            for bucket, value in zip(self._buckets, self._band_values(fingerprint)):
+                bucket.setdefault(value, set()).add(digest)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, digest):
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        for bucket, value in zip(self._buckets, self._band_values(entry[0])):
+            members = bucket.get(value)
+            members.discard(digest)
+            if not members:
+                del bucket[value]
+
+    def nearest(self, fingerprint, exclude=None, exclude_url=None):
+        """
+        Find the closest indexed content within `max_distance`
+
+        Args:
+            fingerprint (int): The SimHash to look up
+            exclude (str, optional): Digest to ignore, e.g. the content itself
+            exclude_url (str, optional): URL whose entries to ignore, e.g. older
+                versions of the same page
+
+        Returns:
+            dict: 'digest', 'url', 'distance' and 'similarity' of the best
+                match, or None if nothing is close enough
+        """
+        with self._lock:
+            candidates = set()
+            for bucket, value in zip(self._buckets, self._band_values(fingerprint)):
+                candidates.update(bucket.get(value, ()))
+            candidates.discard(exclude)
+            best = None
+            for digest in candidates:
+                if exclude_url is not None and self._entries[digest][1] == exclude_url:
+                    continue
+                distance = hamming_distance(fingerprint, self._entries[digest][0])
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (digest, distance)
+            if best is None:
+                return None
+            self._entries.move_to_end(best[0])
+            return {
+                "digest": best[0],
+                "url": self._entries[best[0]][1],
+                "distance": best[1],
+                "similarity": similarity(best[1])
+            }
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            for bucket in self._buckets:
+                bucket.clear()
+
+    def __len__(self):
+        return len(self._entries)